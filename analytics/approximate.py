@@ -0,0 +1,245 @@
+"""
+Approximate reductions of a step from a stratified random sample of its chunks.
+
+Monitoring only needs the mean pressure within, say, 0.1%, not a reduction of every
+chunk of every step. The sampling units are the depth layers of the chunks (every
+chunk of the x, y decomposition cut into `layers` slabs along z) and the strata are
+the (node, depth layer) pairs: clayL is layered along z, and the chunks of a node are
+neighbours. Every round draws units at random without replacement in every stratum
+and only reads the sampled slabs, one task per sampled chunk, in one graph with one
+output (Doreisa computes one key per graph).
+
+The estimators are the stratified ones of survey sampling (Cochran, Sampling
+Techniques): the total of a stratum of N units is N times the mean of its n sampled
+units, with a variance of N^2 (1 - n / N) s^2 / n. The cell counts are known, so:
+
+    mean      total of the values / cells
+    std       from the totals of x and x^2, interval by the delta method
+    p<q>      quantile q% (e.g. p50), inverse of the estimated CDF at the bin edges,
+              interval of Woodruff (the quantiles at q -/+ z se(CDF)) widened to the
+              bins, so that the precision of a quantile is at best one bin
+
+The sample grows until the half-width of the confidence interval is below rel_error
+times the estimate, with the sizes of Neyman (n_h proportional to N_h s_h, from the
+spread of the units read so far, at least the pooled spread of the depth layer on all
+nodes), or until every unit is read (exact value). The
+units needed depend on the precision and on the spread of the field, not on the size
+of the grid (beyond the first round, `initial` units per stratum):
+
+    estimate = approximate(pressure, "mean", rel_error=1e-3, ranks_per_node=ranks_per_node())
+    print(estimate.value, estimate.low, estimate.high, estimate.sampled, estimate.units)
+"""
+
+import math
+from itertools import product
+from statistics import NormalDist
+
+import dask.array as da
+import numpy as np
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph
+
+from sketches import PRESSURE_BINS, PRESSURE_RANGE
+
+# slabs of every chunk along z, the depth strata
+DEPTH_LAYERS = 8
+# units drawn per stratum by the first round
+INITIAL_UNITS = 2
+MAX_ROUNDS = 10
+# bins of the CDF estimated for the quantiles (1 cm for the pressure)
+QUANTILE_EDGES = np.linspace(PRESSURE_RANGE[0], PRESSURE_RANGE[1], 10 * PRESSURE_BINS + 1)
+
+
+class Estimate:
+    """Value of a statistic and its confidence interval, from `sampled` of the `units` slabs."""
+
+    def __init__(self, statistic, value, low, high, sampled, units, rounds):
+        self.statistic = statistic
+        self.value = value
+        self.low = low
+        self.high = high
+        self.sampled = sampled
+        self.units = units
+        self.rounds = rounds
+
+    @property
+    def half_width(self):
+        return (self.high - self.low) / 2
+
+    def __repr__(self):
+        return (f"{self.statistic}: {self.value:.6g} [{self.low:.6g}, {self.high:.6g}] "
+                f"({self.sampled}/{self.units} units, {self.rounds} rounds)")
+
+
+def node_of(index, numblocks, ranks_per_node=None):
+    """Node of the rank publishing a chunk (rank = p + P * q, consecutive ranks per node), 0 if unknown."""
+    if not ranks_per_node:
+        return 0
+    return (index[0] + numblocks[0] * index[1]) // ranks_per_node
+
+
+def sampling_units(chunks, layers=DEPTH_LAYERS, ranks_per_node=None):
+    """
+    (stratum, block index, z slice in the block, cells) of the units of an (x, y, z)
+    array: the intersections of the chunks with `layers` slabs of the global z axis.
+    """
+    nz = sum(chunks[2])
+    bounds = [round(b * nz / layers) for b in range(layers + 1)]
+    z_starts = np.concatenate([[0], np.cumsum(chunks[2])])
+    numblocks = tuple(len(c) for c in chunks)
+    units = []
+    for index in product(*(range(n) for n in numblocks)):
+        node = node_of(index, numblocks, ranks_per_node)
+        z0, z1 = z_starts[index[2]], z_starts[index[2] + 1]
+        area = chunks[0][index[0]] * chunks[1][index[1]]
+        for layer in range(layers):
+            start, stop = max(bounds[layer], z0), min(bounds[layer + 1], z1)
+            if start < stop:
+                units.append(((node, layer), index, slice(int(start - z0), int(stop - z0)), area * int(stop - start)))
+    return units
+
+
+def _unit_stats(block, slices, edges):
+    """[sum, sum of squares, cumulated counts at the edges] of every slab of the block."""
+    rows = []
+    for s in slices:
+        values = np.asarray(block[:, :, s], dtype=float).ravel()
+        row = [values.sum(), np.dot(values, values)]
+        if edges is not None:
+            row.extend(np.searchsorted(np.sort(values), edges, side="right"))
+        rows.append(row)
+    return np.array(rows, dtype=float)
+
+
+def _gather(blocks, *stats):
+    # a dict, not a list: one object for the 0-d output
+    return dict(zip(blocks, stats))
+
+
+def sample_graph(array, units, edges=None):
+    """0-d array of {block index: stats of its units (in the order of units)}, one task per chunk read."""
+    by_block = {}
+    for unit in units:
+        by_block.setdefault(unit[1], []).append(unit[2])
+    name = "sample-" + tokenize(array.name, [(u[1], u[2].start, u[2].stop) for u in units], edges is not None)
+    layer = {}
+    for block, slices in by_block.items():
+        layer[("stats-" + name, *block)] = (_unit_stats, (array.name, *block), slices, edges)
+    layer[(name,)] = (_gather, list(by_block), *layer)
+    graph = HighLevelGraph.from_collections(name, layer, dependencies=[array])
+    return da.Array(graph, name, (), dtype=object, meta=np.empty((), dtype=object))
+
+
+def _linearized(statistic, totals, cells, edges):
+    """Value of the statistic from the estimated totals, and its gradient (for the variances)."""
+    w = np.zeros_like(totals)
+    if statistic == "mean":
+        w[0] = 1 / cells
+        return totals[0] / cells, w
+    if statistic == "std":
+        m1, m2 = totals[0] / cells, totals[1] / cells
+        std = math.sqrt(max(m2 - m1 * m1, 0.0))
+        if std > 0:
+            w[0], w[1] = -m1 / (std * cells), 1 / (2 * std * cells)
+        return std, w
+    # quantile: the CDF at the edge below the estimate
+    q = float(statistic[1:]) / 100
+    cdf = np.maximum.accumulate(totals[2:] / cells)
+    value = float(np.interp(q, cdf, edges))
+    w[2 + max(0, np.searchsorted(edges, value, side="right") - 1)] = 1 / cells
+    return value, w
+
+
+def _density(cdf, edges, value, bins=5):
+    """Slope of the CDF around value, over 2 x bins bins."""
+    i = int(np.clip(np.searchsorted(edges, value), bins, len(edges) - 1 - bins))
+    return (cdf[i + bins] - cdf[i - bins]) / (edges[i + bins] - edges[i - bins])
+
+
+def approximate(
+    array,
+    statistic="mean",
+    rel_error=1e-3,
+    confidence=0.95,
+    ranks_per_node=None,
+    layers=DEPTH_LAYERS,
+    initial=INITIAL_UNITS,
+    max_rounds=MAX_ROUNDS,
+    seed=0,
+    edges=None,
+):
+    """Estimate of a statistic ("mean", "std" or "p<q>") of an (x, y, z) array, within rel_error if possible."""
+    if statistic not in ("mean", "std") and not (statistic.startswith("p") and 0 < float(statistic[1:]) < 100):
+        raise ValueError(f"Unknown statistic {statistic!r}, expected mean, std or p<q> (e.g. p50)")
+    if statistic.startswith("p"):
+        edges = QUANTILE_EDGES if edges is None else np.asarray(edges, dtype=float)
+    else:
+        edges = None
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    units = sampling_units(array.chunks, layers, ranks_per_node)
+    cells = sum(unit[3] for unit in units)
+    rng = np.random.default_rng(seed)
+    strata = {}
+    for i, unit in enumerate(units):
+        strata.setdefault(unit[0], []).append(i)
+    # every stratum is read in a random order
+    order = {h: list(rng.permutation(members)) for h, members in strata.items()}
+    wanted = {h: min(len(members), initial) for h, members in strata.items()}
+    stats = {}
+
+    for rounds in range(1, max_rounds + 1):
+        new = [i for h, members in order.items() for i in members[: wanted[h]] if i not in stats]
+        if new:
+            gathered = sample_graph(array, [units[i] for i in new], edges).compute()
+            rows = {block: iter(block_stats) for block, block_stats in gathered.items()}
+            for i in new:
+                stats[i] = next(rows[units[i][1]])
+
+        # stratified totals and the variance of a linear combination of them
+        samples = {h: np.array([stats[i] for i in members[: wanted[h]]]) for h, members in order.items()}
+        totals = sum(len(strata[h]) * y.mean(axis=0) for h, y in samples.items())
+        value, w = _linearized(statistic, totals, cells, edges)
+        spreads = {h: (y @ w).std(ddof=1) if len(y) > 1 else 0.0 for h, y in samples.items()}
+        # a few units can look calm by chance: no stratum is assumed calmer than its depth layer on all nodes
+        pooled = {}
+        for (node, layer), y in samples.items():
+            squares, dof = pooled.get(layer, (0.0, 0))
+            pooled[layer] = (squares + (len(y) - 1) * spreads[node, layer] ** 2, dof + len(y) - 1)
+        spreads = {h: max(spread, math.sqrt(pooled[h[1]][0] / max(pooled[h[1]][1], 1))) for h, spread in spreads.items()}
+        variance = sum(
+            len(strata[h]) ** 2 * (1 - len(y) / len(strata[h])) * spreads[h] ** 2 / len(y) for h, y in samples.items()
+        )
+        half = z * math.sqrt(variance)
+        tolerance = rel_error * abs(value)
+        if edges is not None:
+            # Woodruff: half is a half-width on the CDF, the interval is widened to the edges of its bins
+            q = float(statistic[1:]) / 100
+            cdf = np.maximum.accumulate(totals[2:] / cells)
+            low, high = (float(np.interp(min(max(p, 0.0), 1.0), cdf, edges)) for p in (q - half, q + half))
+            low = float(edges[max(np.searchsorted(edges, low, side="right") - 1, 0)])
+            high = float(edges[min(np.searchsorted(edges, high), len(edges) - 1)])
+            # nothing finer than the bins
+            tolerance = max(tolerance, float(np.diff(edges).max()))
+        else:
+            low, high = value - half, value + half
+
+        done = all(len(y) == len(strata[h]) for h, y in samples.items())
+        if done or (high - low) / 2 <= tolerance or rounds == max_rounds:
+            return Estimate(statistic, value, low, high, len(stats), len(units), rounds)
+
+        # Neyman: n = (sum N_h S_h)^2 / (V + sum N_h S_h^2) for the target variance V
+        target = (tolerance / z) ** 2
+        if edges is not None:
+            # the CDF within the density at the quantile times the target on the value
+            target *= _density(cdf, edges, value) ** 2
+        weights = {h: len(strata[h]) * spreads[h] for h in samples}
+        needed = sum(weights.values()) ** 2 / (target + sum(len(strata[h]) * spreads[h] ** 2 for h in samples))
+        total_weight = sum(weights.values()) or 1.0
+        grown = {
+            h: min(len(strata[h]), max(wanted[h], math.ceil(needed * weights[h] / total_weight))) for h in samples
+        }
+        if grown == wanted:
+            # the spread was underestimated: double the strata not fully read
+            grown = {h: min(len(strata[h]), 2 * wanted[h]) for h in samples}
+        wanted = grown
@@ -0,0 +1,168 @@
+"""
+Consolidation of the rank chunks into larger blocks before the analytics.
+
+Every rank publishes one (NX/P x NY/Q x NZ) chunk per step, so a reduction has one
+task per rank. `consolidate` merges groups of fx x fy neighbouring chunks into one
+block, and `plan_factors` picks the groups so that the number of blocks matches the
+number of analytics workers instead of the number of ranks. When the ranks per node
+are known, a block never spans two nodes, so that merging does not move data
+between nodes.
+
+Chunks that are adjacent views of the same buffer are merged without copy, the
+other ones are copied once into the block.
+
+    avg = consolidated(kernels.avg, analytics_workers, ranks_per_node())
+    avg_graph = GraphCache(avg)
+"""
+
+import math
+from itertools import product
+
+import dask
+import dask.array as da
+import numpy as np
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph
+
+# dask.config key set while fn builds its graph: blocks of one node in the consolidated arrays,
+# read by analytics/reductions.py to plan the reduction trees node by node
+BLOCKS_PER_NODE = "consolidate.blocks-per-node"
+
+
+def node_block(P, Q, ranks_per_node):
+    """
+    Chunks (along x, y) published by one node, as a rectangle, or None. ParFlow numbers
+    the ranks x first (rank = p + P * q), and every node runs ranks_per_node consecutive ranks.
+    """
+    if not ranks_per_node:
+        return None
+    if ranks_per_node % P == 0:
+        return P, min(ranks_per_node // P, Q)
+    if P % ranks_per_node == 0:
+        return ranks_per_node, 1
+    return None
+
+
+def plan_factors(numblocks, target, block=None):
+    """
+    Chunks merged along every axis so that there are about target blocks (at least target if
+    possible), the blocks being as square as possible. Only x and y are merged. With block,
+    the factors divide it so that a merged block stays within one node.
+    """
+    nx, ny = numblocks[:2]
+    bx, by = block or (nx, ny)
+    candidates = [(fx, fy) for fx in range(1, bx + 1) if bx % fx == 0 or block is None
+                  for fy in range(1, by + 1) if by % fy == 0 or block is None]
+
+    def cost(factors):
+        fx, fy = factors
+        count = math.ceil(nx / fx) * math.ceil(ny / fy)
+        return (count < target, abs(count - target), max(fx, fy) / min(fx, fy), -fx * fy)
+
+    fx, fy = min(candidates, key=cost)
+    return (fx, fy) + (1,) * (len(numblocks) - 2)
+
+
+def _grid(blocks):
+    """A nested list of arrays as an object array of the same nesting (np.asarray would descend into the arrays)."""
+    shape = []
+    level = blocks
+    while isinstance(level, list):
+        shape.append(len(level))
+        level = level[0]
+    grid = np.empty(shape, dtype=object)
+    for index in product(*(range(n) for n in shape)):
+        block = blocks
+        for i in index:
+            block = block[i]
+        grid[index] = block
+    return grid
+
+
+def _zero_copy(blocks):
+    """The blocks of a nested list as one view, if they tile a region of the same buffer."""
+    grid = _grid(blocks)
+    first = grid.flat[0]
+    if first.base is None or any(
+        not isinstance(b, np.ndarray) or b.base is not first.base or b.strides != first.strides or b.ndim != grid.ndim
+        for b in grid.flat
+    ):
+        return None
+
+    # start of every row/column of blocks along each axis
+    starts = []
+    for axis in range(grid.ndim):
+        line = grid[(0,) * axis + (slice(None),) + (0,) * (grid.ndim - axis - 1)]
+        starts.append(np.cumsum([0] + [b.shape[axis] for b in line]))
+    shape = [int(s[-1]) for s in starts]
+
+    origin = first.__array_interface__["data"][0]
+    for index in product(*(range(n) for n in grid.shape)):
+        block = grid[index]
+        offset = sum(int(starts[axis][i]) * first.strides[axis] for axis, i in enumerate(index))
+        expected = tuple(int(starts[axis][i + 1] - starts[axis][i]) for axis, i in enumerate(index))
+        if block.__array_interface__["data"][0] != origin + offset or block.shape != expected:
+            return None
+
+    return np.lib.stride_tricks.as_strided(first, shape=shape, strides=first.strides, writeable=False)
+
+
+def merge_blocks(blocks):
+    """One array from a nested list of neighbouring chunks, without copy when possible."""
+    merged = _zero_copy(blocks)
+    return merged if merged is not None else np.block(blocks)
+
+
+def consolidate(array, factors):
+    """Array with the same values whose blocks merge factors[axis] chunks along every axis."""
+    if all(f == 1 for f in factors):
+        return array
+
+    groups = [
+        [tuple(range(start, min(start + f, n))) for start in range(0, n, f)]
+        for f, n in zip(factors, array.numblocks)
+    ]
+    chunks = tuple(
+        tuple(sum(axis_chunks[i] for i in group) for group in axis_groups)
+        for axis_chunks, axis_groups in zip(array.chunks, groups)
+    )
+
+    name = "consolidate-" + tokenize(array.name, factors)
+
+    def nested(group_indices, prefix=()):
+        axis = len(prefix)
+        if axis == array.ndim:
+            return (array.name, *prefix)
+        return [nested(group_indices, prefix + (i,)) for i in group_indices[axis]]
+
+    layer = {}
+    for out_index in product(*(range(len(g)) for g in groups)):
+        group_indices = [groups[axis][i] for axis, i in enumerate(out_index)]
+        layer[(name, *out_index)] = (merge_blocks, nested(group_indices))
+
+    graph = HighLevelGraph.from_collections(name, layer, dependencies=[array])
+    return da.Array(graph, name, chunks, meta=array._meta)
+
+
+def consolidated(fn, target_blocks, ranks_per_node=None):
+    """
+    fn applied on a window whose arrays are consolidated into about target_blocks blocks
+    (an int, or a callable evaluated when the graph is built). The blocks of one node are
+    set as BLOCKS_PER_NODE in dask.config while fn builds its graph (None if unknown).
+    """
+
+    def wrapped(window):
+        target = target_blocks() if callable(target_blocks) else target_blocks
+        merged = []
+        per_node = None
+        for array in window:
+            block = node_block(*array.numblocks[:2], ranks_per_node)
+            factors = plan_factors(array.numblocks, target, block)
+            merged.append(consolidate(array, factors))
+            if block:
+                per_node = (block[0] // factors[0]) * (block[1] // factors[1])
+        with dask.config.set({BLOCKS_PER_NODE: per_node}):
+            return fn(merged)
+
+    wrapped.__name__ = getattr(fn, "__name__", "consolidated")
+    return wrapped
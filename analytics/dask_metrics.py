@@ -0,0 +1,144 @@
+"""
+Task and transfer metrics of the Deisa runs, recorded by a Dask scheduler plugin.
+
+dask-report.html (performance_report) can only be read by a human. TaskMetricsPlugin
+records, for every task, one row per event in columns:
+
+    key        task key (str)
+    timestep   latest simulation step the task depends on, -1 if none
+    phase      analytics phase set by the client with set_phase (e.g. "compute")
+    worker     worker address running the task
+    action     "assign" when the task is sent to a worker, then the worker events:
+               "compute", "transfer", "disk-read", "disk-write", "deserialize"
+    start/stop event times (seconds since the epoch)
+    nbytes     result size (compute), bytes fetched from other workers (transfer),
+               bytes of the task (disk-read/disk-write)
+    local_nbytes, remote_nbytes
+               "assign" only: bytes of the dependencies already on / missing from the worker
+
+The timestep of a published chunk is read from its key (name, t, ...), the other
+tasks inherit the latest timestep of their dependencies.
+
+    install(client)
+    set_phase(client, "compute")
+    ...
+    dump(client)
+
+The file is a NumPy .npz with one array per column (METRICS_FILE in the experiment
+directory), process-timings.py loads it to report the scheduler overhead, data
+locality and transfer volume of every step.
+"""
+
+import time
+
+import cloudpickle
+import numpy as np
+from distributed.diagnostics.plugin import SchedulerPlugin
+
+METRICS_FILE = "dask-metrics.npz"
+
+COLUMNS = ["key", "timestep", "phase", "worker", "action", "start", "stop", "nbytes", "local_nbytes", "remote_nbytes"]
+
+
+class TaskMetricsPlugin(SchedulerPlugin):
+    name = "task-metrics"
+
+    def __init__(self, array_names=("global_pressure",)):
+        self.array_names = set(array_names)
+        self.phase = "compute"
+        self.timesteps = {}
+        self.remote_nbytes = {}
+        self.rows = {column: [] for column in COLUMNS}
+
+    def start(self, scheduler):
+        self.scheduler = scheduler
+
+    def timestep(self, ts):
+        """Step of a published chunk, or the latest step among the dependencies."""
+        if ts.key not in self.timesteps:
+            key = ts.key
+            if isinstance(key, tuple) and len(key) > 1 and key[0] in self.array_names:
+                self.timesteps[key] = int(key[1])
+            else:
+                self.timesteps[key] = max((self.timestep(dep) for dep in ts.dependencies), default=-1)
+        return self.timesteps[ts.key]
+
+    def _append(self, ts, worker, action, start, stop, nbytes=0, local_nbytes=0, remote_nbytes=0):
+        row = (str(ts.key), self.timestep(ts), self.phase, worker, action, start, stop, nbytes, local_nbytes, remote_nbytes)
+        for column, value in zip(COLUMNS, row):
+            self.rows[column].append(value)
+
+    def transition(self, key, start, finish, *args, stimulus_id=None, **kwargs):
+        ts = self.scheduler.tasks.get(key)
+        if ts is None:
+            return
+
+        if finish == "processing" and ts.processing_on is not None:
+            worker = ts.processing_on
+            local = sum(dep.get_nbytes() for dep in ts.dependencies if worker in dep.who_has)
+            remote = sum(dep.get_nbytes() for dep in ts.dependencies if worker not in dep.who_has)
+            self.remote_nbytes[key] = remote
+            now = time.time()
+            self._append(ts, worker.address, "assign", now, now, 0, local, remote)
+
+        elif start == "processing" and finish == "memory":
+            worker = kwargs.get("worker", "")
+            remote = self.remote_nbytes.pop(key, 0)
+            for event in kwargs.get("startstops", ()):
+                action = event["action"]
+                if action == "compute":
+                    nbytes = kwargs.get("nbytes") or 0
+                elif action == "transfer":
+                    nbytes = remote
+                else:
+                    nbytes = ts.get_nbytes()
+                self._append(ts, worker, action, event["start"], event["stop"], nbytes)
+
+    def columns(self):
+        return {column: np.asarray(values) for column, values in self.rows.items()}
+
+
+def install(client, array_names=("global_pressure",)):
+    """Register the plugin on the scheduler of the client (this module does not need to be importable there)."""
+    import dask_metrics
+
+    cloudpickle.register_pickle_by_value(dask_metrics)
+    client.register_plugin(TaskMetricsPlugin(array_names))
+
+
+def upload_modules(client, *modules):
+    """
+    Send analytics modules to the scheduler and the workers, present and future: the
+    Dask workers are started with PYTHONPATH=$DEISA_DIR and cannot import analytics/.
+    The functions of the tasks are pickled by reference (distributed only falls back
+    to cloudpickle for a registered top-level object, like the plugin above).
+    """
+    for module in modules:
+        client.upload_file(module.__file__)
+
+
+def set_phase(client, phase):
+    """Tag the next recorded events with phase."""
+
+    def _set_phase(dask_scheduler, phase):
+        dask_scheduler.plugins[TaskMetricsPlugin.name].phase = phase
+
+    client.run_on_scheduler(_set_phase, phase=phase)
+
+
+def fetch(client):
+    """The recorded columns, as a dict of NumPy arrays."""
+    return client.run_on_scheduler(lambda dask_scheduler: dask_scheduler.plugins[TaskMetricsPlugin.name].columns())
+
+
+def save(path, columns):
+    np.savez(path, **columns)
+
+
+def load(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {column: data[column] for column in data.files}
+
+
+def dump(client, path=METRICS_FILE):
+    save(path, fetch(client))
@@ -0,0 +1,331 @@
+"""
+Helpers shared by the analytics drivers (Doreisa and Deisa scripts).
+"""
+
+import functools
+import glob
+import math
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# file touched by the analytics once they are ready to receive data (see scripts/run/orchestrator.py)
+READY_FILE_ENV = "ANALYTICS_READY_FILE"
+# file touched by the orchestrator once the simulation exited
+DONE_FILE_ENV = "SIMULATION_DONE_FILE"
+# ParFlow database of the run (clayL_<x>_<y>_<nodes>_<cells>.pfidb written by clayL.tcl)
+PFIDB_ENV = "PARFLOW_PFIDB"
+# explicit number of iterations, takes precedence over the database
+ITERATIONS_ENV = "SIMULATION_ITERATIONS"
+# MPI ranks of the simulation per node (consecutive ranks, see analytics/consolidate.py)
+RANKS_PER_NODE_ENV = "SIMULATION_RANKS_PER_NODE"
+# width of the ghost layer included in the chunks published by the ranks (0: interior cells only)
+GHOST_ENV = "SIMULATION_GHOST"
+# directory of the fields written by the analytics (e.g. the pyramids of analytics/pyramid.py)
+OUTPUT_DIR_ENV = "ANALYTICS_OUTPUT_DIR"
+# pyramid bytes per written step, as a fraction of the raw field, and steps between two written steps
+PYRAMID_BUDGET_ENV = "PYRAMID_BUDGET"
+PYRAMID_EVERY_ENV = "PYRAMID_EVERY"
+# degradation levels of the Doreisa callbacks when they fall behind (analytics/shedding.py, unset: none)
+SHEDDING_ENV = "ANALYTICS_SHEDDING"
+# steps of the windows of analytics/spill.py, bytes of the steps kept in the object stores (the others
+# are spilled to disk, unset: none) and directory of the spilled chunks on the nodes (default: $TMPDIR)
+WINDOW_ENV = "ANALYTICS_WINDOW"
+SPILL_BUDGET_ENV = "ANALYTICS_SPILL_BUDGET"
+SPILL_DIR_ENV = "ANALYTICS_SPILL_DIR"
+# relative error of the approximate reductions of analytics/approximate.py (unset: exact reductions)
+APPROXIMATE_ENV = "ANALYTICS_APPROXIMATE"
+# scheduler cost of one task (seconds) for the reduction planner when it cannot be measured (Doreisa)
+TASK_OVERHEAD_ENV = "ANALYTICS_TASK_OVERHEAD"
+# results and timings of the Doreisa scripts (analytics/results_store.py), in the experiment directory by default
+RESULTS_FILE_ENV = "ANALYTICS_RESULTS_FILE"
+# comma separated quantities received by the analytics, takes precedence over the database
+QUANTITIES_ENV = "ANALYTICS_QUANTITIES"
+
+# named actor created by doreisa's run_simulation() (doreisa/head_node.py)
+DOREISA_HEAD_ACTOR = "simulation_head"
+DOREISA_NAMESPACE = "doreisa"
+
+# array published by ParFlow for every Solver.ShareInsitu* key set to True
+INSITU_QUANTITIES = {"Solver.ShareInsituPressure": "pressures", "Solver.ShareInsituSaturation": "saturations"}
+
+
+def _touch(path: str) -> None:
+    with open(path, "w") as f:
+        f.write(f"{time.time()}\n")
+
+
+def signal_ready(wait_for_head: bool = False, timeout: float = 60.0) -> None:
+    """
+    Tell the orchestrator that the analytics are ready by creating the file named by
+    $ANALYTICS_READY_FILE (nothing is done if it is not set).
+
+    Doreisa creates its head actor inside run_simulation(), which blocks, so with
+    wait_for_head the file is created from a background thread once the Doreisa head
+    actor is registered in the Ray cluster. If it is not registered within `timeout`
+    seconds the analytics failed to start: the process exits with status 1 instead.
+    """
+    path = os.environ.get(READY_FILE_ENV)
+    if not path:
+        return
+
+    if not wait_for_head:
+        _touch(path)
+        return
+
+    def wait_and_touch():
+        import ray
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                ray.get_actor(DOREISA_HEAD_ACTOR, namespace=DOREISA_NAMESPACE)
+            except Exception:
+                time.sleep(0.2)
+                continue
+            _touch(path)
+            return
+        print(f"[driver] Doreisa head actor not registered after {timeout}s, exiting", file=sys.stderr, flush=True)
+        os._exit(1)
+
+    threading.Thread(target=wait_and_touch, daemon=True).start()
+
+
+def read_pfidb(path: str) -> Dict[str, str]:
+    """
+    Read a ParFlow database written by pfwritedb: the number of keys, then for
+    every key the length of the key, the key, the length of the value and the value.
+    """
+    with open(path, "r") as f:
+        lines = f.read().splitlines()
+
+    keys = {}
+    n_keys = int(lines[0])
+    for i in range(n_keys):
+        key = lines[1 + 4 * i + 1]
+        value = lines[1 + 4 * i + 3]
+        keys[key] = value
+    return keys
+
+
+def count_iterations(keys: Dict[str, str]) -> int:
+    """
+    Number of steps ParFlow publishes for a run: the initial state at StartTime,
+    then one per dump until StopTime (clayL: StopTime 9, dumps every 1.0 -> 10 steps).
+    """
+    if keys.get("TimeStep.Type", "Constant") != "Constant":
+        raise ValueError(f"Unsupported TimeStep.Type {keys['TimeStep.Type']}, set ${ITERATIONS_ENV} instead")
+
+    start = float(keys.get("TimingInfo.StartTime", 0.0))
+    stop = float(keys["TimingInfo.StopTime"])
+    dt = float(keys["TimeStep.Value"])
+    dump = float(keys.get("TimingInfo.DumpInterval", dt))
+    # a non positive dump interval means dumps at every time step
+    interval = max(dt, dump)
+    # small tolerance for the float arithmetic of the deck (e.g. 9 * 0.1)
+    return int(math.floor((stop - start) / interval + 1e-9)) + 1
+
+
+def find_pfidb() -> Optional[str]:
+    """The database named by $PARFLOW_PFIDB, or the only .pfidb file of the current directory."""
+    if os.environ.get(PFIDB_ENV):
+        return os.environ[PFIDB_ENV]
+    candidates = glob.glob("*.pfidb")
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def deck_keys() -> Dict[str, str]:
+    """Keys of the ParFlow database of the run (see find_pfidb), empty if there is none."""
+    path = find_pfidb()
+    return read_pfidb(path) if path else {}
+
+
+def simulation_iterations() -> int:
+    """
+    Number of steps the analytics will receive, from $SIMULATION_ITERATIONS, or the
+    database named by $PARFLOW_PFIDB, or the only .pfidb file of the current directory.
+    """
+    if os.environ.get(ITERATIONS_ENV):
+        return int(os.environ[ITERATIONS_ENV])
+
+    path = find_pfidb()
+    if not path:
+        raise RuntimeError(
+            f"Cannot find the ParFlow database of the run (no single .pfidb file in {os.getcwd()}), "
+            f"set ${PFIDB_ENV} or ${ITERATIONS_ENV}"
+        )
+
+    iterations = count_iterations(read_pfidb(path))
+    print(f"[driver] {iterations} iterations expected (from {path})", flush=True)
+    return iterations
+
+
+def analytics_quantities() -> List[str]:
+    """
+    Arrays published at every step, from $ANALYTICS_QUANTITIES, or the Solver.ShareInsitu*
+    keys of the ParFlow database, pressures only if there is none.
+    """
+    if os.environ.get(QUANTITIES_ENV):
+        return [name.strip() for name in os.environ[QUANTITIES_ENV].split(",") if name.strip()]
+    keys = deck_keys()
+    names = [name for key, name in INSITU_QUANTITIES.items() if keys.get(key, "False") == "True"]
+    return names or ["pressures"]
+
+
+def ranks_per_node() -> Optional[int]:
+    """Simulation ranks per node from $SIMULATION_RANKS_PER_NODE, None if unknown."""
+    value = os.environ.get(RANKS_PER_NODE_ENV)
+    return int(value) if value else None
+
+
+def ghost_width() -> int:
+    """Ghost layer width of the published chunks from $SIMULATION_GHOST, 0 if unset."""
+    return int(os.environ.get(GHOST_ENV) or 0)
+
+
+def output_dir() -> str:
+    """Directory of the fields written by the analytics, $ANALYTICS_OUTPUT_DIR or ./analytics-output."""
+    return os.environ.get(OUTPUT_DIR_ENV) or os.path.abspath("analytics-output")
+
+
+def pyramid_budget() -> float:
+    """Pyramid bytes per written step relative to the raw field, $PYRAMID_BUDGET or 0.02."""
+    return float(os.environ.get(PYRAMID_BUDGET_ENV) or 0.02)
+
+
+def pyramid_every() -> int:
+    """A pyramid is written every $PYRAMID_EVERY steps (every step by default)."""
+    return max(1, int(os.environ.get(PYRAMID_EVERY_ENV) or 1))
+
+
+def shedding_levels() -> Optional[str]:
+    """Shedding levels from $ANALYTICS_SHEDDING (e.g. "optional,sample:2,stride:2"), None for no shedding."""
+    return os.environ.get(SHEDDING_ENV) or None
+
+
+def window_steps(default: int) -> int:
+    """Steps of the analytics window, $ANALYTICS_WINDOW or default."""
+    return max(1, int(os.environ.get(WINDOW_ENV) or default))
+
+
+def spill_budget() -> Optional[int]:
+    """Bytes of a window kept in the object stores from $ANALYTICS_SPILL_BUDGET (e.g. 2e9), None to never spill."""
+    value = os.environ.get(SPILL_BUDGET_ENV)
+    return int(float(value)) if value else None
+
+
+def spill_dir() -> Optional[str]:
+    """Directory of the spilled chunks on every node, $ANALYTICS_SPILL_DIR, None for the $TMPDIR of the node."""
+    return os.environ.get(SPILL_DIR_ENV) or None
+
+
+def approximate_error() -> Optional[float]:
+    """Relative error of the approximate reductions from $ANALYTICS_APPROXIMATE (e.g. 1e-3), None for exact ones."""
+    value = os.environ.get(APPROXIMATE_ENV)
+    return float(value) if value else None
+
+
+def task_overhead() -> Optional[float]:
+    """Task overhead of the reduction planner from $ANALYTICS_TASK_OVERHEAD, None if unset."""
+    value = os.environ.get(TASK_OVERHEAD_ENV)
+    return float(value) if value else None
+
+
+def results_file() -> str:
+    """Store of the results and timings, $ANALYTICS_RESULTS_FILE or ./analytics-results.bin."""
+    return os.environ.get(RESULTS_FILE_ENV) or os.path.abspath("analytics-results.bin")
+
+
+def analytics_workers() -> int:
+    """CPUs of the Ray cluster, i.e. the number of analytics tasks that can run at once."""
+    import ray
+
+    return max(1, int(ray.cluster_resources().get("CPU", 1)))
+
+
+def report_results(store) -> None:
+    """Flush a results store to disk and print where it is, found by utils/process-timings.py."""
+    store.close()
+    print(f"[DOREISA, LAST STEP] RESULTS: {store.path} RECORDS: {store.count}", flush=True)
+
+
+def shutdown() -> None:
+    """Flush the outputs and disconnect from Ray."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        import ray
+
+        if ray.is_initialized():
+            ray.shutdown()
+    except ImportError:
+        pass
+
+
+# held by the callbacks wrapped with track_progress, and the end time of the last one
+_callback_lock = threading.Lock()
+_last_progress = [0.0]
+
+
+def track_progress(callback: Callable) -> Callable:
+    """Wrap a simulation callback: run_until_done does not stop the analytics while they progress."""
+
+    @functools.wraps(callback)
+    def tracked(*args, **kwargs):
+        with _callback_lock:
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                _last_progress[0] = time.time()
+
+    return tracked
+
+
+def run_until_done(run: Callable[[], None], finalize: Optional[Callable[[], None]] = None, grace: float = 30.0) -> None:
+    """
+    Run the analytics (the blocking run_simulation call), then call `finalize` once
+    and shut down Ray.
+
+    If $SIMULATION_DONE_FILE is set and the simulation exits while the analytics are
+    still waiting for steps (the simulation crashed or published fewer steps than
+    expected), `finalize` is called anyway and the process exits with status 1 instead
+    of blocking forever. The analytics may still be working through a backlog of
+    published steps: they are only stopped once no callback wrapped with
+    track_progress completed for `grace` seconds, and never during one.
+    """
+    lock = threading.Lock()
+    finished = threading.Event()
+    finalized = []
+
+    def finalize_once():
+        with lock:
+            if finalized:
+                return
+            finalized.append(True)
+            if finalize is not None:
+                finalize()
+            shutdown()
+
+    def watch(path: str):
+        while not finished.is_set() and not os.path.exists(path):
+            time.sleep(0.5)
+        ended = time.time()
+        while not finished.wait(min(grace, 0.5)):
+            with _callback_lock:
+                if time.time() - max(ended, _last_progress[0]) < grace:
+                    continue
+                print(f"[driver] Simulation ended and no step completed for {grace}s, stopping", flush=True)
+                finalize_once()
+                os._exit(1)
+
+    done_file = os.environ.get(DONE_FILE_ENV)
+    if done_file:
+        threading.Thread(target=watch, args=(done_file,), daemon=True).start()
+
+    try:
+        run()
+    finally:
+        finished.set()
+        finalize_once()
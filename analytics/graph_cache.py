@@ -0,0 +1,118 @@
+"""
+Graph templates reused across the timesteps of the Doreisa callbacks.
+
+Every step, simulation_callback builds the same expression on a window with the
+same chunk layout, only the chunks (Ray object refs) change. GraphCache builds and
+optimizes the graph of the first window once (analytics/graph_opt.py), then every
+following window only swaps the input chunks into the template, by position in the
+window:
+
+    avg_graph = GraphCache(kernels.avg)
+
+    def simulation_callback(pressures, timestep):
+        avg_p = avg_graph(pressures)        # graph formation: a dict copy
+        avg_p = compute(avg_p)              # the template is already optimized
+
+The template is rebuilt when the window length, a shape, the chunks or the dtype
+of an array change. A window array must be made of its chunks only (no derived
+layer), otherwise the graph is built every step.
+
+The tasks keep the keys of the template, which is fine with the per-call Ray
+scheduler of Doreisa but not with a persistent Dask distributed scheduler.
+"""
+
+import dask
+import dask.array as da
+from dask._task_spec import Alias, DataNode, convert_legacy_graph
+from dask.core import flatten
+from dask.utils import ensure_dict
+
+from graph_opt import optimize
+
+
+def layout(window):
+    """What the template depends on: chunks and dtype of every array of the window."""
+    return tuple((a.chunks, a.dtype) for a in window)
+
+
+def _inputs(array):
+    """The chunks of a window array by block index, or None if its graph is not only chunks."""
+    dsk = convert_legacy_graph(ensure_dict(array.__dask_graph__()))
+    keys = list(flatten(array.__dask_keys__()))
+    if len(dsk) != len(keys) or any(dsk[k].dependencies & dsk.keys() for k in keys):
+        return None
+    return {k[1:]: dsk[k] for k in keys}
+
+
+def _rekey(node, key):
+    if isinstance(node, Alias):
+        return Alias(key, node.target)
+    if isinstance(node, DataNode):
+        return DataNode(key, node.value)
+    return node.substitute({}, key=key)
+
+
+class GraphTemplate:
+    """The optimized graph of an expression on one window, and where its inputs are."""
+
+    def __init__(self, fn, window, inputs):
+        exprs = fn(window)
+        self.single = not isinstance(exprs, tuple)
+        exprs = (exprs,) if self.single else exprs
+
+        self.layout = layout(window)
+        self.input_names = [a.name for a in window]
+        self.outputs = [(e.name, e.chunks, e._meta) for e in exprs]
+
+        graph = {}
+        for e in exprs:
+            graph.update(e.__dask_graph__())
+        self.graph = optimize(graph, [e.__dask_keys__() for e in exprs])
+
+        # the chunks are swapped in by instantiate, the template must not keep the first ones alive
+        self.input_keys = [
+            {index for index in chunks if (name, *index) in self.graph} for name, chunks in zip(self.input_names, inputs)
+        ]
+        for name, indices in zip(self.input_names, self.input_keys):
+            for index in indices:
+                del self.graph[(name, *index)]
+
+    def instantiate(self, inputs):
+        """Collections of the template computed on the chunks of another window."""
+        graph = dict(self.graph)
+        # the chunks culled from the template are not needed
+        for name, indices, chunks in zip(self.input_names, self.input_keys, inputs):
+            for index in indices:
+                key = (name, *index)
+                graph[key] = _rekey(chunks[index], key)
+        arrays = tuple(da.Array(graph, name, chunks, meta=meta) for name, chunks, meta in self.outputs)
+        return arrays[0] if self.single else arrays
+
+
+class GraphCache:
+    """Build fn(window) once per chunk layout, then reuse the template."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.template = None
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, window):
+        inputs = [_inputs(a) for a in window]
+        if any(i is None for i in inputs):
+            self.misses += 1
+            return self.fn(window)
+
+        if self.template is None or self.template.layout != layout(window):
+            self.template = GraphTemplate(self.fn, window, inputs)
+            self.misses += 1
+        else:
+            self.hits += 1
+        return self.template.instantiate(inputs)
+
+
+def compute(*collections, **kwargs):
+    """dask.compute without optimizing again the graph of a template."""
+    results = dask.compute(*collections, optimize_graph=False, **kwargs)
+    return results[0] if len(results) == 1 else results
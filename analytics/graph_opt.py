@@ -0,0 +1,97 @@
+"""
+Graph optimization for the in-situ Deisa analytics.
+
+The Deisa scripts used to run with dask.config.set(array_optimize=None): the default
+array optimization fuses the root layers and linear chains, which renames or absorbs
+the keys filled from outside the graph by the bridges (the chunks published by the
+ranks), so the scheduler waits on keys that no task produces anymore.
+
+`optimize` is a drop-in replacement that keeps those keys untouched:
+
+    with dask.config.set(array_optimize=graph_opt.optimize):
+        ...
+
+  1. blockwise fusion: the element-wise operations and the first-level per-chunk
+     reduction (e.g. sub -> truediv -> mean_chunk) become one task per chunk
+  2. culling: the tasks (and timesteps) the requested keys do not need are dropped
+  3. inlining of cheap getitem slices into their consumers
+  4. linear fusion of the remaining chains
+
+External keys are the keys with no dependency inside the graph (published chunks,
+futures or literal data). They are never fused, renamed, inlined or aliased away.
+"""
+
+import operator
+
+from dask._task_spec import Alias, Task, convert_legacy_graph, fuse_linear_task_spec, resolve_aliases
+from dask.array.optimization import optimize_blockwise
+from dask.core import flatten, reverse_dict
+from dask.highlevelgraph import HighLevelGraph
+from dask.utils import ensure_dict
+
+
+def external_keys(dsk):
+    """Keys of a low-level graph that depend on nothing inside the graph."""
+    return {key for key, node in dsk.items() if not (node.dependencies & dsk.keys())}
+
+
+def _is_getitem(node):
+    return isinstance(node, Task) and (node.func is operator.getitem or getattr(node.func, "__name__", "") == "getitem")
+
+
+def inline_getitems(dsk, keys):
+    """
+    Inline the getitem tasks into every dependent task, so that slicing a chunk does
+    not cost a task and an intermediate result. The requested keys are kept.
+    """
+    dependencies = {key: node.dependencies & dsk.keys() for key, node in dsk.items()}
+    dependents = reverse_dict(dependencies)
+
+    result = dict(dsk)
+    for key, node in dsk.items():
+        if key in keys or not _is_getitem(node) or len(dependencies[key]) != 1:
+            continue
+        consumers = dependents[key]
+        if not consumers or any(not isinstance(result[c], Task) or _is_getitem(result[c]) for c in consumers):
+            continue
+        for consumer in consumers:
+            result[consumer] = Task.fuse(node, result[consumer], key=consumer)
+        del result[key]
+    return result
+
+
+def optimize(dsk, keys, external=None, **kwargs):
+    """
+    Optimize the graph of an array computation without touching its external keys.
+
+    `external` adds keys to protect on top of the ones detected by external_keys.
+    Returns a low-level graph, like dask.array.optimize.
+    """
+    if not isinstance(keys, (list, set)):
+        keys = [keys]
+    keys = list(flatten(keys))
+
+    if not isinstance(dsk, HighLevelGraph):
+        dsk = HighLevelGraph.from_collections(id(dsk), dsk, dependencies=())
+
+    # the external layers are plain layers, only the Blockwise ones are fused here
+    dsk = optimize_blockwise(dsk, keys=keys)
+    dsk = dsk.cull(set(keys))
+
+    dsk = convert_legacy_graph(ensure_dict(dsk))
+    protected = set(keys) | external_keys(dsk) | set(external or ())
+
+    dependencies = {key: node.dependencies & dsk.keys() for key, node in dsk.items()}
+    dsk = resolve_aliases(dsk, protected, reverse_dict(dependencies))
+    # aliases of external keys only rename them, read the external key directly instead
+    dependents = reverse_dict({key: node.dependencies & dsk.keys() for key, node in dsk.items()})
+    for key, node in list(dsk.items()):
+        if isinstance(node, Alias) and key not in protected and node.target in protected:
+            consumers = dependents[key]
+            if all(isinstance(dsk[c], Task) for c in consumers):
+                for c in consumers:
+                    dsk[c] = dsk[c].substitute({key: node.target})
+                del dsk[key]
+
+    dsk = inline_getitems(dsk, protected)
+    return fuse_linear_task_spec(dsk, keys=protected)
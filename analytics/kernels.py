@@ -0,0 +1,78 @@
+"""
+Analytics expressions of the pressure-*.py scripts, shared with utils/analytics-bench.py.
+
+Every kernel takes the window of pressure arrays of one step (oldest first, one
+NX x NY x NZ Dask array per time step) and returns the lazy expression(s) to compute.
+The deisa-* kernels work like the Deisa scripts on the window stacked along time.
+"""
+
+import dask.array as da
+
+from sketches import Summary, sketch
+from stencils import darcy as darcy_stencils
+
+
+def avg(window):
+    """pressure-doreisa-avg.py: average pressure of the step (window of 1)."""
+    return window[0].mean()
+
+
+def derivative(window):
+    """pressure-doreisa-derivative.py: mean central difference over a window of 3."""
+    return ((window[2] - window[0]) / (2 * 2)).mean()
+
+
+def toy(window):
+    """pressure-doreisa-toy.py once the critical point is reached: mean, std, integral and derivative."""
+    return (
+        window[1].mean(),
+        window[1].std(),
+        ((window[2] + window[0] + 4 * window[1]) / 3).mean(),
+        ((window[2] - window[0]) / (2 * 2)).mean(),
+    )
+
+
+def running_mean(window):
+    """pressure-doreisa-running.py: largest cell-wise average of the pressure over the window (analytics/spill.py)."""
+    return (sum(window[1:], window[0]) / len(window)).max()
+
+
+def distribution(window):
+    """Histogram and quantile sketch of the middle step of the window (analytics/sketches.py)."""
+    return sketch(window[len(window) // 2], Summary.factory())
+
+
+def darcy(window, medium=None, ghost=0):
+    """Mean vertical Darcy flux and largest pressure gradient of the middle step (analytics/stencils.py)."""
+    flux, gradient = darcy_stencils(window[len(window) // 2], medium, ghost)
+    return flux.mean(), gradient.max()
+
+
+def deisa_avg(window):
+    """pressure-deisa-insitu-avg.py: average by time step of the (t, x, y, z) array."""
+    return da.stack(window).mean(axis=(1, 2, 3))
+
+
+def deisa_derivative(window):
+    """pressure-deisa-insitu-derivative.py: mean central difference along time."""
+    p = da.stack(window)
+    return ((p[2:] - p[:-2]) / 4).mean()
+
+
+def deisa_distribution(window):
+    """pressure-deisa.py: histogram and quantile sketch by time step of the (t, x, y, z) array."""
+    return sketch(da.stack(window), Summary.factory(), axis=(1, 2, 3))
+
+
+# name: (kernel, window size)
+KERNELS = {
+    "avg": (avg, 1),
+    "derivative": (derivative, 3),
+    "toy": (toy, 3),
+    "running-mean": (running_mean, 10),
+    "distribution": (distribution, 1),
+    "darcy": (darcy, 1),
+    "deisa-avg": (deisa_avg, 3),
+    "deisa-derivative": (deisa_derivative, 3),
+    "deisa-distribution": (deisa_distribution, 3),
+}
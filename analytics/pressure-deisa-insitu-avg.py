@@ -15,6 +15,9 @@ from dask.distributed import performance_report, wait
 import os
 import yaml
 import dask
+from graph_opt import optimize
+from dask_metrics import dump, install, set_phase
+from reductions import plan_grid
 import sys
 import time
 import numpy as np
@@ -50,17 +53,22 @@ analytics = Deisa(scheduler_file_name=scheduler_file_name,
               use_ucx=False)
 
 client = analytics.client
+# per-task timings and transfers, written to dask-metrics.npz for process-timings.py
+install(client)
 
 with performance_report(filename="dask-report.html"), dask.config.set( # type: ignore
-    array_optimize=None
+    array_optimize=optimize
 ):
     p = analytics["global_pressure", :, :, :, :]
+    # fan-in of the reduction trees for the chunk grid of one step, node-local combines first
+    plan = plan_grid(p.numblocks[1:], nb_dask_workers, mpi_size)
     analytics.ready()
 
+    set_phase(client, "avg")
     ###### AVERGARE BY TIMESTEP ######
 
     start_g = time.time()
-    sum_p = p.mean(axis = (1,2,3))
+    sum_p = p.mean(axis = (1,2,3), split_every=plan.along((1, 2, 3)))
     end_g = time.time()
     
     #Submit tasks graphs to the scheduler
@@ -75,5 +83,6 @@ with performance_report(filename="dask-report.html"), dask.config.set( # type: i
     print(f"[DEISA, LAST STEP]\nTIMINGS GRAPH: {timings_graph}\nTIMINGS COMPUTE: {timings_compute}")
     
 
+dump(client)
 analytics.wait_for_last_bridge_and_shutdown()
 
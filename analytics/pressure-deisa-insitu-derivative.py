@@ -13,6 +13,9 @@ import deisa
 from deisa import Deisa
 from dask.distributed import performance_report
 import dask
+from graph_opt import optimize
+from dask_metrics import dump, install, set_phase
+from reductions import plan_grid
 import sys
 import time
 import numpy as np
@@ -48,21 +51,26 @@ analytics = Deisa(scheduler_file_name=scheduler_file_name,
               use_ucx=False)
 
 client = analytics.client
+# per-task timings and transfers, written to dask-metrics.npz for process-timings.py
+install(client)
 
 def derivative(arr):
-    return arr[2:]-arr[:-2])/4
+    return (arr[2:] - arr[:-2]) / 4
 
 
 
 with performance_report(filename="dask-report.html"), dask.config.set( # type: ignore
-    array_optimize=None
+    array_optimize=optimize
 ):
     p = analytics["global_pressure", :, :, :, :]
+    # fan-in of the reduction trees for the chunk grid of one step, node-local combines first
+    plan = plan_grid(p.numblocks[1:], nb_dask_workers, mpi_size)
     analytics.ready()
 
+    set_phase(client, "derivative")
     start = time.time()
     d = derivative(p)
-    d = d.mean() 
+    d = d.mean(split_every=plan.along((1, 2, 3))) 
     end = time.time()
 
 
@@ -72,10 +80,11 @@ with performance_report(filename="dask-report.html"), dask.config.set( # type: i
     # derivative = ((p[timestep+1] - p[timestep-1])/(2 * 2)).mean().compute()
 
 
-    print(f"""DERIVATIVE : {derivative}, 
+    print(f"""DERIVATIVE : {d}, 
             ANALYTICS TIME : {end2 - start},
             time graph mean: {end - start},
             time compute: {end2 - start2}""", flush = True)
 
+dump(client)
 analytics.wait_for_last_bridge_and_shutdown()
 
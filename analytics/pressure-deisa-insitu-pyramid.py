@@ -0,0 +1,93 @@
+###################################################################################################
+# Copyright (c) 2020-2022 Centre national de la recherche scientifique (CNRS)
+# Copyright (c) 2020-2022 Commissariat a l'énergie atomique et aux énergies alternatives (CEA)
+# Copyright (c) 2020-2022 Institut national de recherche en informatique et en automatique (Inria)
+# Copyright (c) 2020-2022 Université Paris-Saclay
+# Copyright (c) 2020-2022 Université de Versailles Saint-Quentin-en-Yvelines
+#
+# SPDX-License-Identifier: MIT
+#
+###################################################################################################
+
+import deisa
+from deisa import Deisa
+from dask.distributed import performance_report
+import os
+import dask
+from graph_opt import optimize
+from dask_metrics import dump, install, set_phase, upload_modules
+from driver import output_dir, pyramid_budget, pyramid_every
+import pyramid
+from pyramid import level_fraction, plan_levels, write_pyramid
+import sys
+import time
+
+# Initialize Deisa
+if len(sys.argv) < 5:
+    raise Exception("Number of dask workers not set. Usage: python3 bench_deisa.py <n_dask_workers> <scheduler_file_name> <nb_mpi_workers>")
+else:
+    nb_dask_workers = int(sys.argv[1])
+    scheduler_file_name=str(sys.argv[2])
+    mpi_size = int(sys.argv[3])
+    exp_dir = str(sys.argv[4])
+
+mapping = {}
+map_file = exp_dir + "/hostfile.txt"
+with open(map_file, "r") as f:
+    lines = f.readlines()
+    for i, line in enumerate(lines):
+            hostname = line.strip()
+            if line:
+                mapping[i] = hostname + ":2000"
+
+#print(f"Analytics got mapping: {mapping}\n")
+
+def custom_mapping(size, workers_list):
+  #print("########### DEISA Custom mapping function called! ###########\n")
+  return mapping
+
+deisa.set_mapping_implementation(custom_mapping)
+analytics = Deisa(scheduler_file_name=scheduler_file_name,
+              nb_expected_dask_workers=nb_dask_workers,
+              use_ucx=False)
+
+client = analytics.client
+# per-task timings and transfers, written to dask-metrics.npz for process-timings.py
+install(client)
+# the pyramid tasks run on workers that cannot import analytics/
+upload_modules(client, pyramid)
+
+# downsampled levels written within the budget, every PYRAMID_EVERY steps
+OUTPUT_DIR = os.path.join(output_dir(), "pressures")
+FACTORS = plan_levels(pyramid_budget())
+print(f"[PYRAMID] levels {FACTORS} ({level_fraction(FACTORS):.4f} of the raw bytes) in {OUTPUT_DIR}", flush=True)
+
+with performance_report(filename="dask-report.html"), dask.config.set( # type: ignore
+    array_optimize=optimize
+):
+    p = analytics["global_pressure", :, :, :, :]
+    analytics.ready()
+
+    set_phase(client, "pyramid")
+    ###### PYRAMID OF THE SELECTED TIMESTEPS ######
+
+    start_g = time.time()
+    # every chunk is pooled and written by the worker holding it, the index file by this driver
+    steps = range(0, p.shape[0], pyramid_every()) if FACTORS else []
+    written = [write_pyramid(p[t], OUTPUT_DIR, t, FACTORS) for t in steps]
+    end_g = time.time()
+
+    start_c = time.time()
+    written = dask.compute(*written)
+    end_c = time.time()
+
+    raw = len(steps) * p.nbytes // p.shape[0]
+    print(f"[PYRAMID, {p.shape[0] - 1}] BYTES : {sum(written)} RAW : {raw}", flush=True)
+    print(f"[DEISA, 9] START : {start_g} END : {end_c} DIFF : {end_c - start_g}")
+    timings_graph = [(start_g, end_g, end_g - start_g)]
+    timings_compute = [(start_c, end_c, end_c - start_c)]
+    print(f"[DEISA, LAST STEP]\nTIMINGS GRAPH: {timings_graph}\nTIMINGS COMPUTE: {timings_compute}")
+    
+
+dump(client)
+analytics.wait_for_last_bridge_and_shutdown()
@@ -15,6 +15,14 @@ from dask.distributed import performance_report, wait
 import os
 import yaml
 import dask
+from graph_opt import optimize
+from dask_metrics import dump, install, set_phase, upload_modules
+from reductions import plan_grid
+import sketches
+from sketches import Summary, sketch
+import stencils
+from stencils import Medium, darcy
+from driver import deck_keys
 import sys
 import time
 import numpy as np
@@ -50,11 +58,17 @@ analytics = Deisa(scheduler_file_name=scheduler_file_name,
               use_ucx=False)
 
 client = analytics.client
+# per-task timings and transfers, written to dask-metrics.npz for process-timings.py
+install(client)
+# the sketch and stencil tasks run on workers that cannot import analytics/
+upload_modules(client, sketches, stencils)
 
 with performance_report(filename="dask-report.html"), dask.config.set( # type: ignore
-    array_optimize=None
+    array_optimize=optimize
 ):
     p = analytics["global_pressure", :, :, :, :]
+    # fan-in of the reduction trees for the chunk grid of one step, node-local combines first
+    plan = plan_grid(p.numblocks[1:], nb_dask_workers, mpi_size)
     analytics.ready()
     start = time.time()
 
@@ -70,19 +84,29 @@ with performance_report(filename="dask-report.html"), dask.config.set( # type: i
     timestep = 1
 
     ###### AVERGARE BY TIMESTEP ######
-    sum_p = p.sum(axis = (1,2,3))
+    sum_p = p.sum(axis = (1,2,3), split_every=plan.along((1, 2, 3)))
     ##### Std. Dev. Pressure At specific Timestep ######
-    std_p = p[timestep].std()
+    std_p = p[timestep].std(split_every=plan.split_every)
     ##### Integral over a window [0, 1, 2] ######
-    integral_p = ((p[2] + p[0] + 4 * p[1])/3).mean()
+    integral_p = ((p[2] + p[0] + 4 * p[1])/3).mean(split_every=plan.split_every)
     ##### Derivative At specific Timestep ######
-    derivative_p = ((p[timestep+1] - p[timestep-1])/(2 * 2)).mean()
+    derivative_p = ((p[timestep+1] - p[timestep-1])/(2 * 2)).mean(split_every=plan.split_every)
+    ##### Histogram and quantiles by timestep (mergeable sketches) ######
+    distribution_p = sketch(p, Summary.factory(), axis=(1, 2, 3), split_every=plan.along((1, 2, 3)))
+    ##### Darcy flux and pressure gradient at specific timestep (halos of the neighbouring chunks) ######
+    flux, gradient = darcy(p[timestep], Medium.from_keys(deck_keys()))
+    flux_p = flux.mean(split_every=plan.split_every)
+    gradient_p = gradient.max(split_every=plan.split_every)
     
+    set_phase(client, "toy")
     #Submit tasks graphs to the scheduler
     sum = sum_p.persist()
     std = std_p.persist()
     integral = integral_p.persist()
     derivative = derivative_p.persist()
+    distribution = distribution_p.persist()
+    flux = flux_p.persist()
+    gradient = gradient_p.persist()
 
     sum= sum.compute()
     #print(f"Sum of pressure per timestep: {sum}")
@@ -97,9 +121,18 @@ with performance_report(filename="dask-report.html"), dask.config.set( # type: i
 
     derivative = derivative.compute()
     #print(f"Derivative at timestep {timestep}: {derivative} in {end - start} sec")
+
+    distribution = distribution.compute()
+    for t, summary in enumerate(distribution):
+        print(f"Pressure distribution at timestep {t}: {summary.describe()}", flush=True)
+
+    flux = flux.compute()
+    gradient = gradient.compute()
+    print(f"Vertical Darcy flux at timestep {timestep}: {flux}, max. pressure gradient: {gradient}", flush=True)
     end = time.time()
     print(f"ANALYTICS TIME : {end - start} seconds")
 
 print("Done", flush=True)
+dump(client)
 analytics.wait_for_last_bridge_and_shutdown()
 
@@ -6,9 +6,37 @@ import time
 import dask.array as da
 from doreisa.head_node import init
 from doreisa.window_api import ArrayDefinition, run_simulation
+from driver import (
+    analytics_quantities,
+    analytics_workers,
+    approximate_error,
+    ranks_per_node,
+    report_results,
+    results_file,
+    run_until_done,
+    shedding_levels,
+    signal_ready,
+    simulation_iterations,
+    task_overhead,
+    track_progress,
+)
+import kernels
+from approximate import approximate
+from graph_cache import GraphCache, compute
+from consolidate import consolidated
+from quantities import batched, flatten
+from reductions import TASK_OVERHEAD, trace_executed, tree_reduction
+from results_store import COMPUTE, GRAPH, ResultStore
+from shedding import SheddingPolicy, sampled
+from functools import lru_cache
 
 init()
 
+# number of steps published by ParFlow, read from the problem deck of the run
+N_ITERATIONS = simulation_iterations()
+# arrays published by ParFlow: pressures, and saturations with Solver.ShareInsituSaturation
+QUANTITIES = analytics_quantities()
+
 def preprocess_pressures(pressures: np.ndarray) -> np.ndarray:
     """
     Remove the ghost cells from the array.
@@ -16,51 +44,94 @@ def preprocess_pressures(pressures: np.ndarray) -> np.ndarray:
     # return pressures[1:-1, 1:-1]
     return pressures
 
-result = []
-timings_graph = []
-timings_compute = []
-
-def simulation_callback(
-    pressures: list[da.Array], 
-    # saturations: list[da.Array], 
-    timestep: int
-    ):
-
-    start_g = time.time()
-
-    avg_p = pressures[0].mean()
-    # avg_s = saturations[0].mean()
-
-    end_g = time.time()
-
-    time_info = (start_g, end_g, end_g - start_g)
-    timings_graph.append(time_info)
-
-    start_c = time.time()
-
-    avg_p = avg_p.compute()
-    # avg_s = avg_s.compute()
-
-    end_c = time.time()
-
-    time_info = (start_c, end_c, end_c - start_c)
-    timings_compute.append(time_info)
-
-    print(f"[DOREISA, {timestep}] START : {start_g} END : {end_c} DIFF : {end_c - start_g}")
-
-    if timestep == 9:
-        print(f"[DOREISA, LAST STEP]\nTIMINGS GRAPH: {timings_graph}\nTIMINGS COMPUTE: {timings_compute}")
+# Doreisa cannot run the tasks of measure_task_overhead (one output key per graph, every task
+# next to its chunks): the reduction trees are planned with $ANALYTICS_TASK_OVERHEAD (e.g. from
+# the [REDUCTION, EXECUTED] times of a previous run) or the default task overhead, combining
+# the chunks of one node first
+avg_reduction = tree_reduction(
+    kernels.avg, analytics_workers, ranks_per_node(), task_overhead() or TASK_OVERHEAD
+)
+# the graph is built once, then every step only swaps the new chunks in; the rank chunks
+# are merged per node into about one block per analytics worker and reduced with a planned
+# tree, for every quantity in the same graph: one compute per step
+@lru_cache(maxsize=None)
+def avg_graph(sample: int) -> GraphCache:
+    # every sample-th chunk along x and y when the analytics lag (analytics/shedding.py)
+    if sample > 1:
+        return GraphCache(sampled(batched(avg_reduction, len(QUANTITIES)), sample))
+    return GraphCache(
+        consolidated(
+            batched(avg_reduction, len(QUANTITIES)),
+            analytics_workers,
+            ranks_per_node(),
+        )
+    )
+# with $ANALYTICS_APPROXIMATE, the averages are estimated from stratified samples of the chunks
+APPROXIMATE = approximate_error()
+# results and timings of every step, appended to a memory-mapped file (analytics/results_store.py)
+STORE = ResultStore(results_file())
+# with $ANALYTICS_SHEDDING, fewer chunks or fewer steps when the analytics fall behind the simulation
+POLICY = SheddingPolicy(shedding_levels(), store=STORE)
+
+def simulation_callback(timestep: int, **windows: list[da.Array]):
+    with POLICY.step(timestep) as decision:
+        if not decision.analyze:
+            return
+
+        start_g = time.time()
+
+        avg = None if APPROXIMATE else avg_graph(decision.sample)(flatten(windows, QUANTITIES))
+
+        end_g = time.time()
+
+        STORE.timing(timestep, GRAPH, start_g, end_g)
+
+        start_c = time.time()
+
+        if APPROXIMATE:
+            # samples grown until every average is known within APPROXIMATE (one graph per round)
+            estimates = [
+                approximate(windows[name][0], "mean", APPROXIMATE, ranks_per_node=ranks_per_node(), seed=timestep)
+                for name in QUANTITIES
+            ]
+        else:
+            # one average per quantity
+            avg = compute(avg)
+
+        end_c = time.time()
+
+        if not APPROXIMATE and decision.sample == 1:
+            # the planned tree (with the merge of the chunks per node), against its [REDUCTION, PLAN]
+            trace_executed(timestep, start_c, end_c)
+
+        STORE.timing(timestep, COMPUTE, start_c, end_c)
+
+        if APPROXIMATE:
+            for name, estimate in zip(QUANTITIES, estimates):
+                print(f"[APPROXIMATE, {timestep}] {name} {estimate}", flush=True)
+                STORE.append(timestep, f"avg:{name}", estimate.value)
+                STORE.append(timestep, f"avg-error:{name}", estimate.half_width)
+        else:
+            # averages of every sample-th chunk are not comparable with the exact ones
+            metric = "avg" if decision.sample == 1 else "avg-sampled"
+            for name, value in zip(QUANTITIES, avg):
+                STORE.append(timestep, f"{metric}:{name}", value)
+
+        print(f"[DOREISA, {timestep}] START : {start_g} END : {end_c} DIFF : {end_c - start_g}")
 
 # window of size 1
 # if you want to do the preprocessing, you need to pass it as an argument
 # to the daskarrayinfo 
 # doreisa.DaskArrayInfo("pressures", window_size=1, preprocess_pressures)
 # you should add a DaskArrayInfo for every array you will analyze
-run_simulation(
-    simulation_callback,
-    [
-        ArrayDefinition("pressures", window_size=1),
-        # ArrayDefinition("saturations", window_size=1),
-    ],
-    max_iterations=10,
+signal_ready(wait_for_head=True)
+run_until_done(
+    lambda: run_simulation(
+        track_progress(simulation_callback),
+        [
+            *(ArrayDefinition(name, window_size=1) for name in QUANTITIES),
+        ],
+        max_iterations=N_ITERATIONS,
+    ),
+    lambda: report_results(STORE),
 )
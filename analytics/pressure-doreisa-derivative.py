@@ -6,9 +6,35 @@ import time
 import dask.array as da
 from doreisa.head_node import init
 from doreisa.window_api import ArrayDefinition, run_simulation
+from driver import (
+    analytics_quantities,
+    analytics_workers,
+    ranks_per_node,
+    report_results,
+    results_file,
+    run_until_done,
+    shedding_levels,
+    signal_ready,
+    simulation_iterations,
+    task_overhead,
+    track_progress,
+)
+import kernels
+from graph_cache import GraphCache, compute
+from consolidate import consolidated
+from quantities import batched, flatten
+from reductions import TASK_OVERHEAD, trace_executed, tree_reduction
+from results_store import COMPUTE, GRAPH, ResultStore
+from shedding import SheddingPolicy, sampled
+from functools import lru_cache
 
 init()
 
+# number of steps published by ParFlow, read from the problem deck of the run
+N_ITERATIONS = simulation_iterations()
+# arrays published by ParFlow: pressures, and saturations with Solver.ShareInsituSaturation
+QUANTITIES = analytics_quantities()
+
 def preprocess_pressures(pressures: np.ndarray) -> np.ndarray:
     """
     Remove the ghost cells from the array.
@@ -16,56 +42,82 @@ def preprocess_pressures(pressures: np.ndarray) -> np.ndarray:
     # return pressures[1:-1, 1:-1]
     return pressures
 
-result = []
-timings_graph = []
-timings_compute = []
+# Doreisa cannot run the tasks of measure_task_overhead (one output key per graph, every task
+# next to its chunks): the reduction trees are planned with $ANALYTICS_TASK_OVERHEAD (e.g. from
+# the [REDUCTION, EXECUTED] times of a previous run) or the default task overhead, combining
+# the chunks of one node first
+derivative_reduction = tree_reduction(
+    kernels.derivative, analytics_workers, ranks_per_node(), task_overhead() or TASK_OVERHEAD
+)
+# the graph is built once, then every step only swaps the new chunks in; the rank chunks
+# are merged per node into about one block per analytics worker and reduced with a planned
+# tree, for every quantity in the same graph: one compute per step
+@lru_cache(maxsize=None)
+def derivative_graph(sample: int) -> GraphCache:
+    # every sample-th chunk along x and y when the analytics lag (analytics/shedding.py)
+    if sample > 1:
+        return GraphCache(sampled(batched(derivative_reduction, len(QUANTITIES)), sample))
+    return GraphCache(
+        consolidated(
+            batched(derivative_reduction, len(QUANTITIES)),
+            analytics_workers,
+            ranks_per_node(),
+        )
+    )
+# results and timings of every step, appended to a memory-mapped file (analytics/results_store.py)
+STORE = ResultStore(results_file())
+# with $ANALYTICS_SHEDDING, fewer chunks or fewer steps when the analytics fall behind the simulation
+POLICY = SheddingPolicy(shedding_levels(), store=STORE)
 
-def simulation_callback(
-    pressures: list[da.Array], 
-    # saturations: list[da.Array],
-    timestep: int
-    ):
+def simulation_callback(timestep: int, **windows: list[da.Array]):
+    with POLICY.step(timestep) as decision:
+        if not decision.analyze:
+            return
 
-    #Derivative of a specific time step
-    if timestep >= 2:
+        #Derivative of a specific time step
+        if timestep >= 2:
 
-        start_g = time.time()
+            start_g = time.time()
 
-        derivative_p = ((pressures[2] - pressures[0])/(2 * 2)).mean()
-        # derivative_s = ((saturations[2] - saturations[0])/(2 * 2)).mean()
+            derivative = derivative_graph(decision.sample)(flatten(windows, QUANTITIES))
 
-        end_g = time.time()
+            end_g = time.time()
 
-        time_info = (start_g, end_g, end_g - start_g)
-        timings_graph.append(time_info)
+            STORE.timing(timestep, GRAPH, start_g, end_g)
 
-        start_c = time.time()
+            start_c = time.time()
 
-        derivative_p = derivative_p.compute()
-        # derivative_s = derivative_s.compute()
+            # one derivative per quantity
+            derivative = compute(derivative)
 
-        end_c = time.time()
+            end_c = time.time()
 
-        time_info = (start_c, end_c, end_c - start_c)
-        timings_compute.append(time_info)
+            if decision.sample == 1:
+                # the planned tree (with the merge of the chunks per node), against its [REDUCTION, PLAN]
+                trace_executed(timestep, start_c, end_c)
 
-        result.append(derivative_p)
+            STORE.timing(timestep, COMPUTE, start_c, end_c)
 
-        print(f"[DOREISA, {timestep}] START : {start_g} END : {end_c} DIFF : {end_c - start_g}")
+            # derivatives of every sample-th chunk are not comparable with the exact ones
+            metric = "derivative" if decision.sample == 1 else "derivative-sampled"
+            for name, value in zip(QUANTITIES, derivative):
+                STORE.append(timestep, f"{metric}:{name}", value)
 
-        if timestep == 9: 
-            print(f"[DOREISA, LAST STEP]\nTIMINGS GRAPH: {timings_graph}\nTIMINGS COMPUTE: {timings_compute}")
+            print(f"[DOREISA, {timestep}] START : {start_g} END : {end_c} DIFF : {end_c - start_g}")
 
 # window of size 1
 # if you want to do the preprocessing, you need to pass it as an argument
 # to the daskarrayinfo 
 # doreisa.DaskArrayInfo("pressures", window_size=1, preprocess_pressures)
 # you should add a DaskArrayInfo for every array you will analyze
-run_simulation(
-    simulation_callback,
-    [
-        ArrayDefinition("pressures", window_size=3),
-        # ArrayDefinition("saturations", window_size=3),
-    ],
-    max_iterations=10,
+signal_ready(wait_for_head=True)
+run_until_done(
+    lambda: run_simulation(
+        track_progress(simulation_callback),
+        [
+            *(ArrayDefinition(name, window_size=3) for name in QUANTITIES),
+        ],
+        max_iterations=N_ITERATIONS,
+    ),
+    lambda: report_results(STORE),
 )
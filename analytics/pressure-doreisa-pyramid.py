@@ -0,0 +1,80 @@
+import os
+import time
+
+import dask.array as da
+from doreisa.head_node import init
+from doreisa.window_api import ArrayDefinition, run_simulation
+from driver import (
+    analytics_quantities,
+    output_dir,
+    pyramid_budget,
+    pyramid_every,
+    report_results,
+    results_file,
+    run_until_done,
+    signal_ready,
+    simulation_iterations,
+    track_progress,
+)
+from pyramid import level_fraction, plan_levels, write_pyramid
+from quantities import pack
+from results_store import COMPUTE, GRAPH, ResultStore
+
+init()
+
+# number of steps published by ParFlow, read from the problem deck of the run
+N_ITERATIONS = simulation_iterations()
+# arrays published by ParFlow: pressures, and saturations with Solver.ShareInsituSaturation
+QUANTITIES = analytics_quantities()
+# downsampled levels written within the budget, every PYRAMID_EVERY steps
+OUTPUT_DIR = output_dir()
+EVERY = pyramid_every()
+FACTORS = plan_levels(pyramid_budget())
+print(f"[PYRAMID] levels {FACTORS} ({level_fraction(FACTORS):.4f} of the raw bytes) in {OUTPUT_DIR}", flush=True)
+
+# results and timings of every step, appended to a memory-mapped file (analytics/results_store.py)
+STORE = ResultStore(results_file())
+
+def simulation_callback(timestep: int, **windows: list[da.Array]):
+
+    if timestep % EVERY or not FACTORS:
+        return
+
+    start_g = time.time()
+
+    # every chunk is pooled and written by the actor holding it, the index file by the driver
+    written = pack([
+        write_pyramid(windows[name][0], os.path.join(OUTPUT_DIR, name), timestep, FACTORS) for name in QUANTITIES
+    ])
+
+    end_g = time.time()
+
+    STORE.timing(timestep, GRAPH, start_g, end_g)
+
+    start_c = time.time()
+
+    # bytes written per quantity
+    written = written.compute()
+
+    end_c = time.time()
+
+    STORE.timing(timestep, COMPUTE, start_c, end_c)
+
+    raw = sum(windows[name][0].nbytes for name in QUANTITIES)
+    for name, nbytes in zip(QUANTITIES, written):
+        STORE.append(timestep, f"pyramid-bytes:{name}", nbytes)
+    print(f"[PYRAMID, {timestep}] BYTES : {int(written.sum())} RAW : {raw}", flush=True)
+    print(f"[DOREISA, {timestep}] START : {start_g} END : {end_c} DIFF : {end_c - start_g}")
+
+# window of size 1
+signal_ready(wait_for_head=True)
+run_until_done(
+    lambda: run_simulation(
+        track_progress(simulation_callback),
+        [
+            *(ArrayDefinition(name, window_size=1) for name in QUANTITIES),
+        ],
+        max_iterations=N_ITERATIONS,
+    ),
+    lambda: report_results(STORE),
+)
@@ -0,0 +1,86 @@
+import time
+
+import dask.array as da
+from doreisa.head_node import init
+from doreisa.window_api import ArrayDefinition, run_simulation
+from driver import (
+    analytics_quantities,
+    report_results,
+    results_file,
+    run_until_done,
+    signal_ready,
+    simulation_iterations,
+    spill_budget,
+    spill_dir,
+    track_progress,
+    window_steps,
+)
+from kernels import running_mean
+from quantities import batched
+from results_store import COMPUTE, GRAPH, ResultStore
+from spill import SpillWindow
+
+init()
+
+# number of steps published by ParFlow, read from the problem deck of the run
+N_ITERATIONS = simulation_iterations()
+# arrays published by ParFlow: pressures, and saturations with Solver.ShareInsituSaturation
+QUANTITIES = analytics_quantities()
+# running average over the last WINDOW steps; beyond SPILL_BUDGET bytes per quantity the least
+# recently used steps are spilled to the local disk of the nodes holding their chunks
+WINDOW = window_steps(10)
+WINDOWS = {name: SpillWindow(WINDOW, spill_budget(), spill_dir()) for name in QUANTITIES}
+running = batched(running_mean, len(QUANTITIES))
+
+# results and timings of every step, appended to a memory-mapped file (analytics/results_store.py)
+STORE = ResultStore(results_file())
+
+def simulation_callback(timestep: int, **windows: list[da.Array]):
+
+    # the window is kept by SpillWindow, Doreisa only hands over the new step
+    written = sum(WINDOWS[name].push(windows[name][0]) for name in QUANTITIES)
+    resident = sum(WINDOWS[name].resident_bytes for name in QUANTITIES)
+    spilled = sum(WINDOWS[name].spilled_bytes for name in QUANTITIES)
+    print(f"[SPILL, {timestep}] WRITTEN : {written} RESIDENT : {resident} SPILLED : {spilled}", flush=True)
+
+    if len(WINDOWS[QUANTITIES[0]]) < WINDOW:
+        return
+
+    start_g = time.time()
+
+    # the spilled steps are read back from disk by the tasks using them
+    value = running([array for name in QUANTITIES for array in WINDOWS[name][:]])
+
+    end_g = time.time()
+
+    STORE.timing(timestep, GRAPH, start_g, end_g)
+
+    start_c = time.time()
+
+    # one running average per quantity
+    value = value.compute()
+
+    end_c = time.time()
+
+    STORE.timing(timestep, COMPUTE, start_c, end_c)
+
+    for name, mean in zip(QUANTITIES, value):
+        STORE.append(timestep, f"running-mean:{name}", mean)
+
+    print(f"[DOREISA, {timestep}] START : {start_g} END : {end_c} DIFF : {end_c - start_g}")
+
+def run():
+    run_simulation(
+        track_progress(simulation_callback),
+        [
+            *(ArrayDefinition(name, window_size=1) for name in QUANTITIES),
+        ],
+        max_iterations=N_ITERATIONS,
+    )
+    # the spilled chunks of the last window
+    for window in WINDOWS.values():
+        window.close()
+
+# window of size 1
+signal_ready(wait_for_head=True)
+run_until_done(run, lambda: report_results(STORE))
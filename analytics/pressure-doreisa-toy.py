@@ -6,9 +6,34 @@ import time
 import dask.array as da
 from doreisa.head_node import init
 from doreisa.window_api import ArrayDefinition, run_simulation
+from driver import (
+    deck_keys,
+    ghost_width,
+    report_results,
+    results_file,
+    run_until_done,
+    shedding_levels,
+    signal_ready,
+    simulation_iterations,
+    track_progress,
+)
+from kernels import darcy, distribution
+from quantities import pack
+from results_store import COMPUTE, ResultStore
+from shedding import Decision, SheddingPolicy, sample_window
+from stencils import Medium
 
 init()
 
+# number of steps published by ParFlow, read from the problem deck of the run
+N_ITERATIONS = simulation_iterations()
+# grid spacing and soil of the deck, for the spatial stencils
+MEDIUM = Medium.from_keys(deck_keys())
+# results and timings of every step, appended to a memory-mapped file (analytics/results_store.py)
+STORE = ResultStore(results_file())
+# degrades the analytics (no critical point statistics, sampled chunks, fewer steps) when they lag
+POLICY = SheddingPolicy(shedding_levels(), store=STORE)
+
 def preprocess_pressures(pressures: np.ndarray) -> np.ndarray:
     """
     Remove the ghost cells from the array.
@@ -17,26 +42,43 @@ def preprocess_pressures(pressures: np.ndarray) -> np.ndarray:
     return pressures
 
 def simulation_callback(pressures: list[da.Array], timestep: int):
+    with POLICY.step(timestep) as decision:
+        if decision.analyze:
+            start_c = time.time()
+            analyze(pressures, timestep, decision)
+            STORE.timing(timestep, COMPUTE, start_c, time.time())
+
+def analyze(pressures: list[da.Array], timestep: int, decision: Decision):
+    # with a sample:s level the averages are estimates over every s-th chunk; the conditional
+    # statistics need the full step and are skipped (a sampled decision is never optional)
+    sampled = sample_window(pressures, decision.sample)
+    estimate = f" (sampled, every {decision.sample}th chunk)" if decision.sample > 1 else ""
+    # averages of every sample-th chunk are not comparable with the exact ones
+    metric = "avg:pressures" if decision.sample == 1 else "avg-sampled:pressures"
     if timestep < 2:
 
         # Even though the window is set to 3, we still can operate on the first two 
         # timesteps, provided that we dont need 3 steps. For example:
         # this will print for timestep 0 and 1
-        avg_p = pressures[timestep].mean().compute()
-        print(f"BEFORE FULL WINDOW: Simulation step: {timestep}\tAvg. Pressure: {avg_p}", flush=True)
+        avg_p = sampled[timestep].mean().compute()
+        print(f"BEFORE FULL WINDOW: Simulation step: {timestep}\tAvg. Pressure: {avg_p}{estimate}", flush=True)
+        STORE.append(timestep, metric, avg_p)
     else:   
         # when I have at least 3 timesteps, I recenter the calculations for the 
         # window (so it will be timestep - 1) so that my time derivatives, integral, etc. take the
         # previous and next timestep into account.
 
         # take the middle timestep of the window
-        avg_p = pressures[1].mean().compute()
-        print(f"AFTER FULL WINDOW: Simulation step: {timestep-1}\tAvg. Pressure: {avg_p}", flush=True)
+        avg_p = sampled[1].mean().compute()
+        print(f"AFTER FULL WINDOW: Simulation step: {timestep-1}\tAvg. Pressure: {avg_p}{estimate}", flush=True)
+        STORE.append(timestep - 1, metric, avg_p)
 
         # Advantage over Deisa: we can do conditional calculations!
 
         # if the average pressure is between -5.9 and -6.0, we calculate the std deviation, integral, and derivative
-        if avg_p < -5.9 and avg_p > -6.0: 
+        if avg_p < -5.9 and avg_p > -6.0 and not decision.optional:
+            print(f"Critical point reached{estimate}! Additional calculations skipped, the analytics are behind (level {decision.level})", flush=True)
+        elif avg_p < -5.9 and avg_p > -6.0: 
             print("Critical point reached! New calculating std deviation, integral, and derivative")
             std_p = pressures[1].std().compute()
 
@@ -50,12 +92,30 @@ def simulation_callback(pressures: list[da.Array], timestep: int):
             # derivative_p = ((pressures[2] - pressures[0])/(2 * 2)).compute()
             derivative_p = ((pressures[2] - pressures[0])/(2 * 2)).mean().compute()
             print(f"AFTER FULL WINDOW + ADDITIONAL CALCULATIONS: Timestep: {timestep -1}\t Avg. Pressure: {avg_p}\t Std. Dev. Pressure: {std_p}\t Integral: {integral_p}\t Derivative: {derivative_p}", flush=True)
+            STORE.append(timestep - 1, "std:pressures", std_p)
+            STORE.append(timestep - 1, "integral:pressures", integral_p)
+            STORE.append(timestep - 1, "derivative:pressures", derivative_p)
+
+            # distribution of the pressure: per-chunk histograms and quantile sketches, merged up the tree
+            summary = distribution(pressures).compute()
+            print(f"AFTER FULL WINDOW + DISTRIBUTION: Timestep: {timestep -1}\t {summary.describe()}", flush=True)
+
+            # spatial stencils: only the halos of the neighbouring chunks are exchanged (ghost layers
+            # of the chunks when the simulation publishes them); one output for a single compute
+            flux_p, gradient_p = pack(list(darcy(pressures, MEDIUM, ghost_width()))).compute()
+            print(f"AFTER FULL WINDOW + DARCY FLUX: Timestep: {timestep -1}\t Vertical Flux: {flux_p}\t Max. Gradient: {gradient_p}", flush=True)
+            STORE.append(timestep - 1, "flux:pressures", flux_p)
+            STORE.append(timestep - 1, "max-gradient:pressures", gradient_p)
     
 # window of size 3
-run_simulation(
-    simulation_callback,
-    [
-        ArrayDefinition("pressures", window_size=3),
-    ],
-    max_iterations=10,
+signal_ready(wait_for_head=True)
+run_until_done(
+    lambda: run_simulation(
+        track_progress(simulation_callback),
+        [
+            ArrayDefinition("pressures", window_size=3),
+        ],
+        max_iterations=N_ITERATIONS,
+    ),
+    lambda: report_results(STORE),
 )
\ No newline at end of file
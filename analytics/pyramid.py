@@ -0,0 +1,141 @@
+"""
+Multi-resolution pyramids of the in-situ fields, written to chunked HDF5 files.
+
+Writing the full fields is the I/O cost in situ avoids. write_pyramid keeps
+downsampled copies (block means, 2x, 4x, 8x along every axis) of selected steps:
+every chunk is pooled and written by the task that holds it, to its own compressed
+HDF5 file, so the data never goes through the driver and the writers never share a
+file (no parallel HDF5 needed):
+
+    <directory>/step-<t>/block-<i>-<j>-<k>.h5     datasets level-2, level-4, ...
+
+The driver only writes the metadata, <directory>/pyramid.h5: for every step and
+level, a virtual dataset (HDF5 VDS) mapping the block files onto the global grid,
+readable as one array once the blocks are written:
+
+    factors = plan_levels(budget=0.02)                  # coarsest levels within 2% of the raw bytes
+    written = write_pyramid(pressure, "pyramid", t, factors).compute()   # bytes written
+    h5py.File("pyramid/pyramid.h5")["step-3/level-4"][...]
+
+A level of factor f has ceil(n / f) cells per chunk of n cells along an axis: a
+window straddling two chunks is not averaged across them (exact when the chunk
+sizes are multiples of f).
+"""
+
+import math
+import os
+from itertools import product
+
+import dask.array as da
+import numpy as np
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph
+
+# downsampling factors of the pyramid levels, finest first
+LEVELS = (2, 4, 8)
+# dtype and filter of the written levels
+DTYPE = np.float32
+COMPRESSION = "lzf"
+# largest HDF5 chunk along an axis
+MAX_H5_CHUNK = 64
+INDEX_FILE = "pyramid.h5"
+
+
+def pool(block, factor):
+    """Means of block over windows of factor cells along every axis (shorter windows at the end)."""
+    for axis, n in enumerate(block.shape):
+        if n % factor == 0:
+            shape = block.shape[:axis] + (n // factor, factor) + block.shape[axis + 1 :]
+            block = block.reshape(shape).mean(axis=axis + 1)
+        else:
+            starts = np.arange(0, n, factor)
+            counts = np.diff(np.append(starts, n)).reshape([-1 if a == axis else 1 for a in range(block.ndim)])
+            block = np.add.reduceat(block, starts, axis=axis) / counts
+    return block
+
+
+def level_fraction(factors, ndim=3, itemsize=8, dtype=DTYPE):
+    """Bytes of the levels of factors relative to the raw field, before compression."""
+    return np.dtype(dtype).itemsize / itemsize * sum(1 / f**ndim for f in factors)
+
+
+def plan_levels(budget, factors=LEVELS, ndim=3, itemsize=8, dtype=DTYPE):
+    """The levels written within budget (a fraction of the raw bytes), adding the finer ones while they fit."""
+    chosen = []
+    for factor in sorted(factors, reverse=True):
+        if level_fraction(chosen + [factor], ndim, itemsize, dtype) > budget:
+            break
+        chosen.append(factor)
+    return sorted(chosen)
+
+
+def level_chunks(chunks, factor):
+    """Chunks of a level: ceil(n / factor) cells for a chunk of n cells."""
+    return tuple(tuple(math.ceil(c / factor) for c in cs) for cs in chunks)
+
+
+def block_path(directory, step, index):
+    return os.path.join(directory, f"step-{step}", "block-" + "-".join(map(str, index)) + ".h5")
+
+
+def _write_block(block, path, factors, dtype, compression):
+    """Pool block at every level (each from the previous one) and write them; the bytes written."""
+    import h5py
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    level, done = block, 1
+    with h5py.File(path, "w") as f:
+        for factor in factors:
+            # pooling by f / done the previous level is exact when the cells divide evenly
+            level = pool(level, factor // done) if factor % done == 0 else pool(block, factor)
+            done = factor
+            chunks = tuple(min(n, MAX_H5_CHUNK) for n in level.shape)
+            f.create_dataset(f"level-{factor}", data=level.astype(dtype), chunks=chunks, compression=compression)
+    return os.path.getsize(path)
+
+
+def _total(*written):
+    return int(sum(written))
+
+
+def write_index(directory, step, chunks, factors, dtype=DTYPE):
+    """Virtual datasets step-<step>/level-<f> of the index file over the block files of the step."""
+    import h5py
+
+    os.makedirs(directory, exist_ok=True)
+    with h5py.File(os.path.join(directory, INDEX_FILE), "a") as f:
+        group = f.require_group(f"step-{step}")
+        for factor in factors:
+            sizes = level_chunks(chunks, factor)
+            offsets = [np.concatenate([[0], np.cumsum(s)]) for s in sizes]
+            layout = h5py.VirtualLayout(tuple(sum(s) for s in sizes), dtype=dtype)
+            for index in product(*(range(len(s)) for s in sizes)):
+                shape = tuple(s[i] for s, i in zip(sizes, index))
+                where = tuple(slice(o[i], o[i + 1]) for o, i in zip(offsets, index))
+                # relative to the index file
+                path = os.path.relpath(block_path(directory, step, index), directory)
+                layout[where] = h5py.VirtualSource(path, f"level-{factor}", shape=shape)
+            name = f"level-{factor}"
+            if name in group:
+                del group[name]
+            group.create_virtual_dataset(name, layout, fillvalue=np.nan)
+
+
+def write_pyramid(array, directory, step, factors=LEVELS, dtype=DTYPE, compression=COMPRESSION, index=True):
+    """
+    Lazy write of the pyramid of array (one step) by the tasks holding its chunks: a 0-d
+    array of the bytes written. With index, the index file is updated now (metadata only).
+    """
+    factors = sorted(factors)
+    if index:
+        write_index(directory, step, array.chunks, factors, dtype)
+
+    name = "pyramid-" + tokenize(array.name, os.path.abspath(directory), step, factors, np.dtype(dtype).str, compression)
+    layer = {}
+    for block in product(*(range(n) for n in array.numblocks)):
+        path = os.path.abspath(block_path(directory, step, block))
+        layer[("write-" + name, *block)] = (_write_block, (array.name, *block), path, factors, dtype, compression)
+    # one output key, for Doreisa
+    layer[(name,)] = (_total, *layer)
+    graph = HighLevelGraph.from_collections(name, layer, dependencies=[array])
+    return da.Array(graph, name, (), dtype=np.int64)
@@ -0,0 +1,65 @@
+"""
+Several quantities of a step (pressure, saturation, ...) analyzed as one graph.
+
+Each quantity is published by every rank as its own chunk. batched applies a kernel
+to the window of every quantity and packs all the statistics into a single output,
+so that a step is one graph, one compute() and one gather instead of one per
+quantity (doreisa_get only accepts one output key). The chunks of the quantities of
+a rank live in the object store of its node, and every task runs where most of its
+inputs are, so the tasks of the quantities of a rank (or of a consolidated block,
+analytics/consolidate.py) run on the same node. Nothing is copied to batch them.
+
+    avg_graph = GraphCache(consolidated(batched(kernels.avg, len(QUANTITIES)), ...))
+
+    def simulation_callback(timestep, **windows):
+        window = flatten(windows, QUANTITIES)   # quantity-major: p0, p1, p2, s0, s1, s2
+        values = compute(avg_graph(window))     # one value per quantity
+
+With tuple kernels (e.g. kernels.toy), values has one row per statistic and one
+column per quantity.
+"""
+
+import dask.array as da
+import numpy as np
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph
+
+
+def pack(exprs):
+    """Scalar reductions (a list, or a list of rows) as one single-block array."""
+    rows = exprs if isinstance(exprs[0], (list, tuple)) else None
+    flat = [e for row in rows for e in row] if rows else list(exprs)
+    if any(e.ndim != 0 for e in flat):
+        raise ValueError("only scalar reductions can be packed")
+
+    name = "pack-" + tokenize(*(e.name for e in flat))
+    if rows:
+        layer = {(name, 0, 0): (np.array, [[(e.name,) for e in row] for row in rows])}
+        chunks = ((len(rows),), (len(rows[0]),))
+    else:
+        layer = {(name, 0): (np.array, [(e.name,) for e in flat])}
+        chunks = ((len(flat),),)
+    graph = HighLevelGraph.from_collections(name, layer, dependencies=flat)
+    return da.Array(graph, name, chunks, dtype=np.result_type(*(e.dtype for e in flat)))
+
+
+def flatten(windows, names):
+    """Window of every quantity of names, concatenated (quantity-major)."""
+    return [array for name in names for array in windows[name]]
+
+
+def batched(fn, n_quantities):
+    """fn applied on the window of each of n_quantities quantities (concatenated), packed in one array."""
+
+    def wrapped(window):
+        if len(window) % n_quantities:
+            raise ValueError(f"{len(window)} arrays are not a window of {n_quantities} quantities")
+        steps = len(window) // n_quantities
+        exprs = [fn(window[q * steps : (q + 1) * steps]) for q in range(n_quantities)]
+        if isinstance(exprs[0], tuple):
+            # one row per statistic
+            return pack([list(row) for row in zip(*exprs)])
+        return pack(exprs)
+
+    wrapped.__name__ = getattr(fn, "__name__", "batched")
+    return wrapped
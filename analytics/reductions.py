@@ -0,0 +1,200 @@
+"""
+Tree shape of the global reductions (mean, std, sum) of the analytics.
+
+Dask combines the per-chunk partial results with a tree of fan-in split_every along
+every reduced axis (dask.config "split_every", 4 by default), whatever the number of
+chunks, workers or nodes. plan_reduction picks split_every with a cost model of that
+tree, level by level:
+
+    level time = tasks * task_overhead + ceil(tasks / workers) * inputs cost
+
+task_overhead is the scheduler cost of one task, measured on the running scheduler
+with measure_task_overhead. An input (a partial result) costs local_input when it
+is on the node of the combine task, remote_input otherwise. When the rank layout is
+known (ranks_per_node, see analytics/consolidate.py), the fan-in along x and y
+is a divisor or a multiple of the node block, so that the first levels combine the
+chunks of one node and the following ones combine node results.
+
+    avg = tree_reduction(kernels.avg, analytics_workers, ranks_per_node())
+
+    plan = plan_grid(p.numblocks[1:], workers, ranks_per_node)   # p stacks the steps
+    p.mean(axis=(1, 2, 3), split_every=plan.along((1, 2, 3)))
+
+Every plan is printed as a [REDUCTION, PLAN] line and the time of the executed reductions
+as [REDUCTION, EXECUTED] lines (trace_executed), parsed by utils/process-timings.py to check
+the predicted time of the planned tree against the measured one.
+"""
+
+import math
+import time
+from itertools import product
+
+import dask
+
+from consolidate import BLOCKS_PER_NODE, node_block
+
+# scheduler cost of one task and cost of one partial result in a combine task, in seconds,
+# when they are not measured (order of magnitude of Dask distributed / Dask-on-Ray)
+TASK_OVERHEAD = 1e-3
+LOCAL_INPUT = 1e-5
+REMOTE_INPUT = 5e-4
+# largest fan-in tried along one axis
+MAX_SPLIT_EVERY = 64
+
+
+class ReductionPlan:
+    """split_every of a reduction and the tree it gives."""
+
+    def __init__(self, split_every, levels, tasks, predicted):
+        self.split_every = split_every
+        self.levels = levels
+        self.tasks = tasks
+        self.predicted = predicted
+
+    def along(self, axes):
+        """split_every for the same chunk grid as axes of another array (e.g. a stack of steps)."""
+        return dict(zip(axes, (self.split_every[axis] for axis in sorted(self.split_every))))
+
+    def shape(self):
+        return "x".join(str(self.split_every[axis]) for axis in sorted(self.split_every))
+
+    def trace(self, start, end, task_overhead):
+        """The plan in the [NAME, EVENT] START: END: DIFF: format of the other timings."""
+        print(
+            f"[REDUCTION, PLAN] START: {start} END: {end} DIFF: {end - start} SPLIT_EVERY: {self.shape()} "
+            f"LEVELS: {self.levels} TASKS: {self.tasks} PREDICTED: {self.predicted} OVERHEAD: {task_overhead}",
+            flush=True,
+        )
+
+
+def trace_executed(step, start, end):
+    """Measured time of the reduction of a step, in the format of the [REDUCTION, PLAN] line."""
+    print(f"[REDUCTION, EXECUTED] STEP: {step} START: {start} END: {end} DIFF: {end - start}", flush=True)
+
+
+def measure_task_overhead(n=64, compute=None):
+    """Time per task of n empty tasks on the current Dask scheduler, or run by compute(tasks) (not on Doreisa)."""
+    tasks = [dask.delayed(int)(i) for i in range(n)]
+    start = time.perf_counter()
+    if compute is None:
+        dask.compute(*tasks)
+    else:
+        compute(tasks)
+    return (time.perf_counter() - start) / n
+
+
+def tree_levels(numblocks, split_every):
+    """(tasks, inputs per task, region per task) of every level of the Dask tree, after the chunk step."""
+    depth = 1
+    for axis, f in split_every.items():
+        if numblocks[axis] > 1:
+            depth = max(depth, math.ceil(math.log(numblocks[axis], f)))
+
+    levels = []
+    sizes = list(numblocks)
+    region = [1] * len(numblocks)
+    for _ in range(depth):
+        fan_in = [min(split_every.get(axis, 1), n) for axis, n in enumerate(sizes)]
+        sizes = [math.ceil(n / f) for n, f in zip(sizes, fan_in)]
+        region = [min(r * f, n) for r, f, n in zip(region, fan_in, numblocks)]
+        levels.append((math.prod(sizes), math.prod(fan_in), tuple(region)))
+    return levels
+
+
+def reduction_cost(numblocks, split_every, workers, block=None, task_overhead=TASK_OVERHEAD,
+                   local_input=LOCAL_INPUT, remote_input=REMOTE_INPUT):
+    """Predicted time of the tree of split_every; block maps an axis to the chunks of one node along it."""
+
+    def nodes(region):
+        if block is None:
+            return None
+        return math.prod(math.ceil(region[axis] / b) for axis, b in block.items())
+
+    total = 0.0
+    previous = (1,) * len(numblocks)
+    for tasks, fan_in, region in tree_levels(numblocks, split_every):
+        if block is None:
+            # partial results land on any worker
+            local = 1 / workers
+        else:
+            # the inputs each cover nodes(previous) of the nodes(region) nodes of the task
+            local = min(1.0, nodes(previous) / nodes(region))
+        inputs = fan_in * (local * local_input + (1 - local) * remote_input)
+        total += tasks * task_overhead + math.ceil(tasks / workers) * inputs
+        previous = region
+    return total
+
+
+def _fan_ins(n, b):
+    """Fan-ins tried along an axis of n chunks, b chunks per node along it (or None)."""
+    if n == 1:
+        return [2]
+    if not b or b == 1:
+        return list(range(2, min(n, MAX_SPLIT_EVERY) + 1))
+    # groups never split a node: divisors of the node block, or whole nodes
+    divisors = [f for f in range(2, b + 1) if b % f == 0]
+    multiples = [k * b for k in range(2, n // b + 1) if k * b <= MAX_SPLIT_EVERY]
+    return sorted(set(divisors + multiples + [min(n, MAX_SPLIT_EVERY)]))
+
+
+def plan_reduction(numblocks, workers, axis=None, block=None, task_overhead=TASK_OVERHEAD, **costs):
+    """
+    Cheapest split_every for a reduction over axis (default all) of an array of numblocks.
+    block maps an axis to the chunks published by one node along it.
+    """
+    axis = tuple(range(len(numblocks))) if axis is None else tuple(axis)
+    block = {a: b for a, b in (block or {}).items() if a in axis} or None
+    reduced = [a for a in axis if numblocks[a] > 1]
+
+    best = None
+    choices = [_fan_ins(numblocks[a], (block or {}).get(a)) for a in reduced]
+    for factors in product(*choices):
+        split_every = dict.fromkeys(axis, 2)
+        split_every.update(zip(reduced, factors))
+        cost = reduction_cost(numblocks, split_every, workers, block, task_overhead, **costs)
+        # ties: the fewest tasks
+        tasks = sum(t for t, _, _ in tree_levels(numblocks, split_every))
+        if best is None or (cost, tasks) < best[0]:
+            best = ((cost, tasks), split_every)
+
+    (cost, tasks), split_every = best
+    return ReductionPlan(split_every, len(tree_levels(numblocks, split_every)), tasks, cost)
+
+
+def grid_block(numblocks, ranks_per_node, xy=(0, 1)):
+    """Node block of a chunk grid whose axes xy are the P x Q rank decomposition, as {axis: chunks}."""
+    rect = node_block(numblocks[xy[0]], numblocks[xy[1]], ranks_per_node)
+    return dict(zip(xy, rect)) if rect else None
+
+
+def plan_grid(numblocks, workers, ranks_per_node=None, task_overhead=None):
+    """Plan of a full reduction of one step (x, y, z chunk grid), traced; task_overhead is measured if None."""
+    start = time.time()
+    if task_overhead is None:
+        task_overhead = measure_task_overhead()
+    block = grid_block(numblocks, ranks_per_node)
+    plan = plan_reduction(numblocks, workers, block=block, task_overhead=task_overhead)
+    plan.trace(start, time.time(), task_overhead)
+    return plan
+
+
+def tree_reduction(fn, workers, ranks_per_node=None, task_overhead=None, axes=(0, 1, 2)):
+    """
+    fn computing its reductions with the planned split_every of the window arrays. workers
+    (an int or a callable) and task_overhead (measured if None) are read on the first call.
+    axes are the x, y, z axes of the reduced arrays, (1, 2, 3) when fn stacks the window.
+    Under analytics/consolidate.py, the layout of the merged blocks replaces ranks_per_node.
+    """
+    plans = {}
+
+    def wrapped(window):
+        numblocks = window[0].numblocks
+        per_node = dask.config.get(BLOCKS_PER_NODE, ranks_per_node)
+        if (numblocks, per_node) not in plans:
+            n = workers() if callable(workers) else workers
+            plans[numblocks, per_node] = plan_grid(numblocks, n, per_node, task_overhead)
+        with dask.config.set(split_every=plans[numblocks, per_node].along(axes)):
+            return fn(window)
+
+    wrapped.__name__ = getattr(fn, "__name__", "tree_reduction")
+    return wrapped
@@ -0,0 +1,149 @@
+"""
+Append-only store of the analytics results and timings, in a memory-mapped file.
+
+The Doreisa scripts used to keep their results and timings in lists printed at the
+end of the run: a crash lost everything, and a long run grew the heap of the driver
+and ended with one huge line. ResultStore appends fixed-width records to a
+preallocated file mapped in memory (an append is a few stores in the page cache),
+flushed to disk every sync_every records and on close, so that a crash loses the
+last records at most:
+
+    <path>          header (magic, record count, record size), then the records
+    <path>.names    the metric names, line i for metric id i
+
+A record is (step, metric, value, start, end): a result (value, no timing) or a
+timing (start, end, and end - start as value). The count is updated after the
+record, so a reader never sees a partial one. The file doubles when it is full, and
+a store reopened on an existing file appends after its records.
+
+    store = ResultStore("analytics-results.bin")
+    store.append(3, "avg:pressures", value)             # a result of step 3
+    store.timing(3, "compute", start, end)
+    records, names = read_store("analytics-results.bin")   # no copy
+    records[records["metric"] == names.index("compute")]["value"]
+"""
+
+import math
+import os
+
+import numpy as np
+
+MAGIC = b"BPRESULT"
+HEADER_BYTES = 64
+RECORD = np.dtype([("step", "<i8"), ("metric", "<i8"), ("value", "<f8"), ("start", "<f8"), ("end", "<f8")])
+# records preallocated by a new store, and records between two flushes to disk
+CAPACITY = 4096
+SYNC_EVERY = 64
+# metrics of the timings of the analytics, as in the TIMINGS GRAPH / TIMINGS COMPUTE lists
+GRAPH = "graph"
+COMPUTE = "compute"
+
+
+def _names_path(path):
+    return path + ".names"
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER_BYTES)
+    if len(header) < 24 or header[:8] != MAGIC:
+        raise ValueError(f"{path} is not a results store")
+    count, itemsize = np.frombuffer(header, dtype="<u8", count=2, offset=8)
+    if itemsize != RECORD.itemsize:
+        raise ValueError(f"{path} has records of {itemsize} bytes, expected {RECORD.itemsize}")
+    return int(count)
+
+
+def _read_names(path):
+    try:
+        with open(_names_path(path)) as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+
+class ResultStore:
+    """Appends (step, metric, value, start, end) records to a memory-mapped file."""
+
+    def __init__(self, path, capacity=CAPACITY, sync_every=SYNC_EVERY):
+        self.path = path
+        self.sync_every = sync_every
+        if os.path.exists(path):
+            self.count = _read_header(path)
+            capacity = (os.path.getsize(path) - HEADER_BYTES) // RECORD.itemsize
+        else:
+            self.count = 0
+            with open(path, "wb") as f:
+                f.write(MAGIC + np.array([0, RECORD.itemsize], dtype="<u8").tobytes())
+                f.truncate(HEADER_BYTES + capacity * RECORD.itemsize)
+        self.names = _read_names(path)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self._map(capacity)
+
+    def _map(self, capacity):
+        self.capacity = capacity
+        self.header = np.memmap(self.path, dtype="<u8", mode="r+", offset=len(MAGIC), shape=(2,))
+        self.records = np.memmap(self.path, dtype=RECORD, mode="r+", offset=HEADER_BYTES, shape=(capacity,))
+
+    def _grow(self):
+        self.sync()
+        capacity = 2 * self.capacity
+        del self.header, self.records
+        os.truncate(self.path, HEADER_BYTES + capacity * RECORD.itemsize)
+        self._map(capacity)
+
+    def metric(self, name):
+        """Id of a metric, registered in the names file the first time."""
+        if name not in self.ids:
+            with open(_names_path(self.path), "a") as f:
+                f.write(name + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def append(self, step, metric, value=math.nan, start=math.nan, end=math.nan):
+        if self.count == self.capacity:
+            self._grow()
+        self.records[self.count] = (step, self.metric(metric), value, start, end)
+        self.count += 1
+        # after the record: a reader never sees a partial one
+        self.header[0] = self.count
+        if self.count % self.sync_every == 0:
+            self.sync()
+
+    def timing(self, step, metric, start, end):
+        self.append(step, metric, end - start, start, end)
+
+    def sync(self):
+        """Flush the records, then the count, to disk."""
+        self.records.flush()
+        self.header.flush()
+
+    def close(self):
+        self.sync()
+        del self.header, self.records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_store(path):
+    """The records written to a store (a read-only view of the file, no copy) and the metric names."""
+    count = _read_header(path)
+    if count == 0:
+        return np.empty(0, dtype=RECORD), _read_names(path)
+    return np.memmap(path, dtype=RECORD, mode="r", offset=HEADER_BYTES, shape=(count,)), _read_names(path)
+
+
+def timings(records, names, metric):
+    """(start, end, diff) tuples of a timing metric, by step, like the TIMINGS GRAPH / COMPUTE lists."""
+    if metric not in names:
+        return []
+    selected = records[records["metric"] == names.index(metric)]
+    selected = selected[np.argsort(selected["step"], kind="stable")]
+    return [(float(r["start"]), float(r["end"]), float(r["value"])) for r in selected]
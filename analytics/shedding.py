@@ -0,0 +1,225 @@
+"""
+Load shedding of the Doreisa callbacks when the analytics fall behind the simulation.
+
+The callbacks process the steps one after the other. A step whose analytics take
+longer than a simulation step leaves the next steps waiting in Ray (and Doreisa
+blocks the simulation once a few steps are pending), so the analytics must keep up
+whatever the conditional statistics cost.
+
+LagMonitor estimates the backlog, the steps published but not yet analyzed, from
+the callback timings only (Doreisa does not expose its queue): a callback that had
+to wait for its step was on time, which gives the arrival of that step and, over
+several on-time steps, the simulation period. A callback that did not wait started
+late, by the time elapsed since the last on-time arrival minus the steps analyzed
+since then.
+
+SheddingPolicy degrades in the order of the configured levels while the backlog is
+above max_backlog, and recovers one level after calm on-time analyzed steps. Shedding
+is opt-in (the timings and results of a shed run are not comparable with a full one),
+the levels are cumulative ($ANALYTICS_SHEDDING, e.g. "optional,sample:2,stride:2", see
+driver.shedding_levels):
+
+    optional    skip the non-critical statistics (decision.optional is False)
+    sample:s    analyze every s-th chunk along x and y (decision.sample, see sampled)
+                in the reductions; implies optional, the stencils and distributions
+                are never computed on sampled chunks
+    stride:k    analyze every k-th step only
+
+Past the last level the step stride doubles, so that the analytics never stall the
+simulation; without levels ("none", the default) every step is fully analyzed. Every
+decision is printed as a [SHEDDING, <step>] line and, with levels, its level is
+appended to the results store as the shedding-level metric of the step:
+
+    policy = SheddingPolicy(shedding_levels(), store=STORE)
+
+    def simulation_callback(timestep, **windows):
+        with policy.step(timestep) as decision:
+            if not decision.analyze:
+                return
+            ...
+"""
+
+import math
+import time
+from contextlib import contextmanager
+
+import dask
+
+from consolidate import BLOCKS_PER_NODE
+
+# waits shorter than this (seconds) mean that the step was already there
+WAIT_TOLERANCE = 5e-3
+# weight of the last period in the average simulation period
+PERIOD_SMOOTHING = 0.3
+DEFAULT_LEVELS = "none"
+# metric of the level of every step in the results store (analytics/results_store.py)
+LEVEL_METRIC = "shedding-level"
+
+
+def parse_levels(spec):
+    """Levels of a "optional,sample:2,stride:2" specification ("none" or "" for no shedding)."""
+    levels = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item or item == "none":
+            continue
+        mode, _, value = item.partition(":")
+        if mode == "optional" and not value:
+            levels.append((mode, None))
+        elif mode in ("sample", "stride") and value.isdigit() and int(value) >= 1:
+            levels.append((mode, int(value)))
+        else:
+            raise ValueError(f"Unknown shedding level {item!r}, expected optional, sample:<s> or stride:<k>")
+    return levels
+
+
+class LagMonitor:
+    """Backlog of the steps published by the simulation and not analyzed yet, from the callback timings."""
+
+    def __init__(self, tolerance=WAIT_TOLERANCE, clock=time.time):
+        self.tolerance = tolerance
+        self.clock = clock
+        self.steps = 0
+        self.last_end = None
+        # (step, time) of the last step the analytics waited for
+        self.arrival = None
+        self.period = None
+        self.wait = None
+
+    def begin(self):
+        """Start of the callback of a step: the backlog behind it."""
+        now = self.clock()
+        self.wait = None if self.last_end is None else now - self.last_end
+        on_time = self.wait is None or self.wait > self.tolerance
+        if on_time:
+            if self.arrival is not None:
+                step, arrived = self.arrival
+                period = (now - arrived) / (self.steps - step)
+                self.period = period if self.period is None else (
+                    PERIOD_SMOOTHING * period + (1 - PERIOD_SMOOTHING) * self.period
+                )
+            self.arrival = (self.steps, now)
+            backlog = 0
+        elif self.period:
+            step, arrived = self.arrival
+            backlog = max(1, math.floor((now - arrived) / self.period) - (self.steps - step))
+        else:
+            # late, but no period yet
+            backlog = 1
+        self.steps += 1
+        return backlog
+
+    def end(self):
+        self.last_end = self.clock()
+
+
+class Decision:
+    """What the callback of a step does."""
+
+    def __init__(self, timestep, level, analyze=True, optional=True, sample=1, stride=1, backlog=0):
+        self.timestep = timestep
+        self.level = level
+        self.analyze = analyze
+        self.optional = optional
+        self.sample = sample
+        self.stride = stride
+        self.backlog = backlog
+
+    @property
+    def action(self):
+        if not self.analyze:
+            return "skip"
+        actions = [f"sample:{self.sample}"] if self.sample > 1 else []
+        if not self.optional:
+            actions.append("no-optional")
+        return "+".join(actions) or "full"
+
+
+class SheddingPolicy:
+    """Degradation level of the analytics from the backlog of LagMonitor."""
+
+    def __init__(self, levels=None, max_backlog=0, calm=3, monitor=None, store=None):
+        levels = DEFAULT_LEVELS if levels is None else levels
+        self.levels = parse_levels(levels) if isinstance(levels, str) else list(levels)
+        self.max_backlog = max_backlog
+        self.calm = calm
+        self.monitor = monitor or LagMonitor()
+        self.store = store
+        self.level = 0
+        self.on_time = 0
+        self.decisions = []
+
+    def settings(self, level):
+        """(optional, sample, stride) of a level, the stride doubling past the last level."""
+        optional, sample, stride = True, 1, 1
+        for mode, value in self.levels[:level]:
+            if mode == "optional":
+                optional = False
+            elif mode == "sample":
+                sample = value
+                # the optional statistics need the full step (stencils across neighbouring chunks)
+                optional = optional and sample == 1
+            else:
+                stride = value
+        if level > len(self.levels):
+            stride *= 2 ** (level - len(self.levels))
+        return optional, sample, stride
+
+    def decide(self, timestep, backlog):
+        analyzed = timestep % self.settings(self.level)[2] == 0
+        if backlog > self.max_backlog:
+            # a skipped step costs nothing: only the analyzed ones are behind
+            if analyzed and self.levels:
+                self.level += 1
+            self.on_time = 0
+        elif analyzed and self.level:
+            self.on_time += 1
+            if self.on_time >= self.calm:
+                self.level -= 1
+                self.on_time = 0
+        optional, sample, stride = self.settings(self.level)
+        return Decision(timestep, self.level, timestep % stride == 0, optional, sample, stride, backlog)
+
+    @contextmanager
+    def step(self, timestep):
+        """The decision for a step, to use around the whole callback."""
+        start = self.monitor.clock()
+        decision = self.decide(timestep, self.monitor.begin())
+        self.decisions.append(decision)
+        self.trace(decision, start)
+        try:
+            yield decision
+        finally:
+            self.monitor.end()
+
+    def trace(self, decision, start):
+        wait = self.monitor.wait
+        print(
+            f"[SHEDDING, {decision.timestep}] START: {start} LEVEL: {decision.level} ACTION: {decision.action} "
+            f"STRIDE: {decision.stride} BACKLOG: {decision.backlog} WAIT: {wait if wait is not None else 0.0} "
+            f"PERIOD: {self.monitor.period or 0.0}",
+            flush=True,
+        )
+        if self.store is not None and self.levels:
+            self.store.append(decision.timestep, LEVEL_METRIC, decision.level)
+
+
+def sample_window(window, sample):
+    """The window arrays reduced to every sample-th chunk along x and y."""
+    if sample == 1:
+        return window
+    return [array.blocks[::sample, ::sample] for array in window]
+
+
+def sampled(fn, sample):
+    """fn on the window arrays reduced to every sample-th chunk along x and y (fn itself if sample is 1)."""
+    if sample == 1:
+        return fn
+
+    def wrapped(window):
+        # the sampled chunks are not laid out by node: the reductions are planned without the layout
+        with dask.config.set({BLOCKS_PER_NODE: None}):
+            return fn(sample_window(window, sample))
+
+    wrapped.__name__ = getattr(fn, "__name__", "sampled")
+    return wrapped
@@ -0,0 +1,231 @@
+"""
+Mergeable summaries of the distribution of a field: fixed-bin histograms and KLL
+quantile sketches.
+
+A full sort of the distributed field is out of reach in situ. Instead every chunk is
+summarized by the first level of a Dask reduction, and the summaries are merged up
+the reduction tree (its fan-in follows dask.config "split_every", see
+analytics/reductions.py):
+
+    Histogram  counts in fixed bins, plus the values below and above the range
+    KLL        quantile sketch of Karnin, Lang and Liberty: a stack of compactors of
+               k items, whose error on a rank is about n / k, so the memory per
+               summary is O(k log(n / k)) whatever the size of the field
+    Summary    both, from the same pass
+
+sketch() returns an object Dask array of summaries, one per block of the axes that
+are not reduced, e.g. one per step of the (t, x, y, z) array of Deisa:
+
+    summaries = sketch(p, Summary.factory(), axis=(1, 2, 3)).compute()
+    summaries[t].quantiles([0.01, 0.5, 0.99])
+
+The Doreisa callbacks use kernels.distribution on the window.
+"""
+
+from functools import partial
+
+import dask.array as da
+import numpy as np
+from dask.core import flatten
+
+# bins of the pressure histograms: clayL stays between the hydrostatic head (-6 m) and 0
+PRESSURE_RANGE = (-10.0, 1.0)
+PRESSURE_BINS = 110
+# items per compactor of the KLL sketches (rank error about 1.7 / k)
+KLL_K = 200
+# quantiles printed by the analytics
+QUANTILES = (0.01, 0.5, 0.99)
+
+
+class Histogram:
+    """Counts of values in fixed bins (edges), and of the values out of the edges."""
+
+    def __init__(self, edges, counts=None, below=0, above=0):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64) if counts is None else counts
+        self.below = below
+        self.above = above
+
+    @classmethod
+    def of(cls, values, edges):
+        values = np.asarray(values).ravel()
+        counts, _ = np.histogram(values, bins=edges)
+        return cls(edges, counts, int(np.count_nonzero(values < edges[0])), int(np.count_nonzero(values > edges[-1])))
+
+    @classmethod
+    def factory(cls, bins=PRESSURE_BINS, range=PRESSURE_RANGE):
+        return partial(cls.of, edges=np.linspace(range[0], range[1], bins + 1))
+
+    @property
+    def n(self):
+        return int(self.counts.sum()) + self.below + self.above
+
+    def merge(self, others):
+        merged = Histogram(self.edges, self.counts.copy(), self.below, self.above)
+        for other in others:
+            if not np.array_equal(other.edges, self.edges):
+                raise ValueError("histograms with different bins cannot be merged")
+            merged.counts += other.counts
+            merged.below += other.below
+            merged.above += other.above
+        return merged
+
+
+class KLL:
+    """
+    KLL quantile sketch. Level h holds items of weight 2**h; a full level is sorted and
+    every other item (from a random offset) goes up one level.
+    """
+
+    def __init__(self, k=KLL_K, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def of(cls, values, k=KLL_K, seed=0):
+        sketch = cls(k, seed)
+        sketch.update(values)
+        return sketch
+
+    @classmethod
+    def factory(cls, k=KLL_K):
+        return partial(cls.of, k=k)
+
+    @property
+    def n(self):
+        return int(sum(len(items) << h for h, items in enumerate(self.levels)))
+
+    def capacity(self, h):
+        # the top level holds k items, every level below 2/3 of the one above
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - h))))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.compress()
+
+    def compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self.capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # an odd item stays at its level
+                keep, items = items[: len(items) % 2], items[len(items) % 2 :]
+                promoted = items[self.rng.integers(2) :: 2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                # the capacities change with the number of levels
+                h = 0
+                continue
+            h += 1
+
+    def merge(self, others):
+        merged = KLL(self.k, self.rng.integers(2**31))
+        merged.levels = [items.copy() for items in self.levels]
+        merged.min, merged.max = self.min, self.max
+        for other in others:
+            while len(merged.levels) < len(other.levels):
+                merged.levels.append(np.empty(0))
+            for h, items in enumerate(other.levels):
+                merged.levels[h] = np.concatenate([merged.levels[h], items])
+            merged.min = min(merged.min, other.min)
+            merged.max = max(merged.max, other.max)
+        merged.compress()
+        return merged
+
+    def quantiles(self, q):
+        """Approximate quantiles q (in [0, 1]) of the values seen."""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 1 << h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, ranks = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(ranks, np.asarray(q) * ranks[-1], side="left")
+        result = items[np.minimum(positions, len(items) - 1)]
+        # the extremes are exact
+        result = np.where(np.asarray(q) <= 0, self.min, result)
+        return np.where(np.asarray(q) >= 1, self.max, result)
+
+
+class Summary:
+    """Histogram and KLL sketch of the same values."""
+
+    def __init__(self, histogram, kll):
+        self.histogram = histogram
+        self.kll = kll
+
+    @classmethod
+    def of(cls, values, edges, k=KLL_K):
+        return cls(Histogram.of(values, edges), KLL.of(values, k))
+
+    @classmethod
+    def factory(cls, bins=PRESSURE_BINS, range=PRESSURE_RANGE, k=KLL_K):
+        return partial(cls.of, edges=np.linspace(range[0], range[1], bins + 1), k=k)
+
+    @property
+    def n(self):
+        # exact, the weights of the KLL sketch are only an estimate
+        return self.histogram.n
+
+    def merge(self, others):
+        others = list(others)
+        return Summary(self.histogram.merge(o.histogram for o in others), self.kll.merge(o.kll for o in others))
+
+    def quantiles(self, q):
+        return self.kll.quantiles(q)
+
+    def describe(self, q=QUANTILES):
+        """Quantiles q as "P01: ... P50: ... P99: ..." for the analytics logs."""
+        return " ".join(f"P{round(100 * p):02d}: {v}" for p, v in zip(q, self.quantiles(q)))
+
+
+def _chunk(x, axis, keepdims, factory):
+    """Summaries of a block, one per index of the axes that are not reduced."""
+    out = np.empty(tuple(1 if a in axis else n for a, n in enumerate(x.shape)), dtype=object)
+    for index in np.ndindex(*out.shape):
+        selection = tuple(slice(None) if a in axis else i for a, i in enumerate(index))
+        out[index] = factory(x[selection])
+    return out
+
+
+def _combine(parts, axis, keepdims, concatenate=None):
+    blocks = list(flatten(parts)) if isinstance(parts, list) else [parts]
+    out = np.empty(blocks[0].shape, dtype=object)
+    for index in np.ndindex(*out.shape):
+        out[index] = blocks[0][index].merge(b[index] for b in blocks[1:])
+    return out
+
+
+def _aggregate(parts, axis, keepdims):
+    out = _combine(parts, axis, keepdims)
+    if keepdims:
+        return out
+    out = out.reshape([n for a, n in enumerate(out.shape) if a not in axis])
+    # a full reduction computes to the summary itself, as mean() to a scalar
+    return out[()] if out.ndim == 0 else out
+
+
+def sketch(array, factory, axis=None, split_every=None):
+    """Object array of the merged summaries factory(values) over axis (default all)."""
+    axis = tuple(range(array.ndim)) if axis is None else tuple(axis)
+    ndim = array.ndim - len(axis)
+    return da.reduction(
+        array,
+        partial(_chunk, factory=factory),
+        _aggregate,
+        combine=_combine,
+        axis=axis,
+        concatenate=False,
+        split_every=split_every,
+        dtype=object,
+        meta=np.empty((0,) * ndim, dtype=object),
+    )
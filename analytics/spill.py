@@ -0,0 +1,177 @@
+"""
+Windows of tens of steps for the Doreisa callbacks, the oldest steps spilled to disk.
+
+Doreisa keeps every step of a window in the Ray object stores of the nodes holding
+its chunks (ArrayDefinition(..., window_size=n) keeps n steps alive), so the window
+length is bounded by their memory. SpillWindow keeps the window itself, from Doreisa
+windows of 1 step: the steps stay in the object stores while they fit in budget
+bytes (least recently used out first), the others are spilled, every chunk by the
+task holding it, to a .npy file on the local disk of its node ($TMPDIR, or directory):
+
+    <directory>/spill-<id>/<step array>/block-<i>-<j>-<k>.npy
+
+A spilled step is read back without copy (np.load(mmap_mode="r")) by the tasks using
+it: a spilled chunk is loaded next to the chunk of the newest step at the same
+position, published by the same rank on the same node, and the load is fused with
+the element-wise operations and the per-chunk reduction consuming it (graph_opt).
+
+    window = SpillWindow(10, budget=spill_budget())
+
+    def simulation_callback(pressures, timestep):
+        window.push(pressures[0])           # spills what no longer fits, one compute
+        value = kernels.running_mean(window[:]).compute()
+
+The newest step is never spilled (the others are read next to its chunks), and the
+files of a step are removed once it leaves the window. The chunk layout of the steps
+must not change during a run.
+"""
+
+import math
+import os
+import tempfile
+import uuid
+from collections import OrderedDict
+from itertools import product
+
+import dask.array as da
+import numpy as np
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph
+
+
+def _node_directory(directory):
+    """directory, or the temporary directory of the node running the task ($TMPDIR)."""
+    return directory or tempfile.gettempdir()
+
+
+def block_file(step, index):
+    return os.path.join(step, "block-" + "-".join(map(str, index)) + ".npy")
+
+
+def _spill_block(block, directory, path):
+    path = os.path.join(_node_directory(directory), path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, block)
+    return block.nbytes
+
+
+def _remove_block(anchor, directory, path):
+    path = os.path.join(_node_directory(directory), path)
+    os.remove(path)
+    try:
+        # the last block of the step on this node
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+    return 0
+
+
+def _load_block(anchor, directory, step, block_id=None):
+    return np.load(os.path.join(_node_directory(directory), block_file(step, block_id)), mmap_mode="r")
+
+
+def _total(*written):
+    return int(sum(written))
+
+
+class SpillWindow:
+    """The last size steps of an array, the least recently used ones spilled to disk beyond budget bytes."""
+
+    def __init__(self, size, budget=None, directory=None):
+        self.size = size
+        self.budget = math.inf if budget is None else budget
+        self.directory = directory
+        self.prefix = "spill-" + uuid.uuid4().hex[:12]
+        # names of the steps, oldest first
+        self.steps = []
+        # steps in the object stores, least recently used first
+        self.resident = OrderedDict()
+        # name: (chunks, dtype) of the steps on disk
+        self.spilled = {}
+        self.written = 0
+
+    def __len__(self):
+        return len(self.steps)
+
+    @property
+    def newest(self):
+        return self.resident[self.steps[-1]]
+
+    @property
+    def resident_bytes(self):
+        return sum(array.nbytes for array in self.resident.values())
+
+    @property
+    def spilled_bytes(self):
+        return sum(math.prod(map(sum, chunks)) * dtype.itemsize for chunks, dtype in self.spilled.values())
+
+    def push(self, array):
+        """Add the newest step, spill and remove what no longer fits: the bytes written."""
+        if self.steps and array.chunks != self.newest.chunks:
+            raise ValueError(f"The chunks of {array.name} differ from the previous steps of the window")
+        self.steps.append(array.name)
+        self.resident[array.name] = array
+
+        removed = []
+        for name in self.steps[: -self.size]:
+            self.resident.pop(name, None)
+            if self.spilled.pop(name, None):
+                removed.append(name)
+        del self.steps[: -self.size]
+
+        evicted = []
+        while self.resident_bytes > self.budget and len(self.resident) > 1:
+            name, evict = self.resident.popitem(last=False)
+            self.spilled[name] = (evict.chunks, evict.dtype)
+            evicted.append(evict)
+
+        if not evicted and not removed:
+            return 0
+        written = self._maintenance(evicted, removed).compute()
+        self.written += written
+        return written
+
+    def _maintenance(self, evicted, removed):
+        """One graph (one output key, for Doreisa) writing the evicted steps and removing the files of the removed ones."""
+        newest = self.newest
+        name = "spill-" + tokenize(self.prefix, [a.name for a in evicted], removed, newest.name)
+        layer = {}
+        for index in product(*(range(n) for n in newest.numblocks)):
+            for array in evicted:
+                path = block_file(os.path.join(self.prefix, array.name), index)
+                layer[("write-" + name, array.name, *index)] = (_spill_block, (array.name, *index), self.directory, path)
+            for step in removed:
+                path = block_file(os.path.join(self.prefix, step), index)
+                layer[("remove-" + name, step, *index)] = (_remove_block, (newest.name, *index), self.directory, path)
+        layer[(name,)] = (_total, *layer)
+        graph = HighLevelGraph.from_collections(name, layer, dependencies=[newest, *evicted])
+        return da.Array(graph, name, (), dtype=np.int64)
+
+    def _array(self, name):
+        if name in self.resident:
+            self.resident.move_to_end(name)
+            return self.resident[name]
+        chunks, dtype = self.spilled[name]
+        newest = self.newest
+        return da.map_blocks(
+            _load_block,
+            newest,
+            self.directory,
+            os.path.join(self.prefix, name),
+            dtype=dtype,
+            meta=np.empty((0,) * len(chunks), dtype=dtype),
+            name="spilled-" + tokenize(self.prefix, name, newest.name),
+        )
+
+    def __getitem__(self, item):
+        """Step(s) of the window, oldest first, the spilled ones read from disk by the tasks using them."""
+        if isinstance(item, slice):
+            return [self._array(name) for name in self.steps[item]]
+        return self._array(self.steps[item])
+
+    def close(self):
+        """Remove the files of the spilled steps."""
+        removed = [name for name in self.steps if name in self.spilled]
+        if removed:
+            self._maintenance([], removed).compute()
+        self.spilled.clear()
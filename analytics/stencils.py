@@ -0,0 +1,202 @@
+"""
+Spatial stencils (pressure gradients, Darcy flux) on the rank chunks of a step.
+
+A stencil of depth d needs the d cells of the neighbouring chunks around every chunk.
+Rechunking or concatenating the global array would move every chunk; instead
+stencil() exchanges halos between adjacent chunks only:
+
+  1. for every face of a chunk shared with a neighbour, a small task on the neighbour
+     slices the d layers of cells next to the face (the halo), so only the halo moves
+  2. one task per chunk extends the chunk with its halos (outside the domain, with a
+     linear extrapolation, i.e. one-sided differences at the domain boundary) and
+     applies the kernel, vectorized on the whole extended chunk
+
+When the ranks publish their subvectors with the ghost layer of the simulation
+(ghost > 0, see driver.ghost_width), the halos are read from the chunk itself and
+nothing is exchanged. The result has the chunks of the interior cells.
+
+Only the faces are exchanged (not the edges and corners of the halo), which is what
+the 7-point kernels below read:
+
+    gradient        derivative of the field along an axis
+    gradient_norm   norm of the gradient
+    darcy_flux      Darcy flux q = -K kr(p) (grad p + g e_z) of ParFlow along an axis,
+                    with the Van Genuchten relative permeability kr of the deck
+
+    qz = stencil(pressure, partial(darcy_flux, medium=Medium.from_keys(keys), axis=2))
+
+The halo tasks only depend on the array, the depth and the ghost width, so several
+stencils of the same array share them.
+"""
+
+from functools import partial
+from itertools import product
+
+import dask.array as da
+import numpy as np
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph
+from dask.utils import funcname
+
+
+class Medium:
+    """Grid spacing and hydraulic parameters of the domain, clayL defaults."""
+
+    def __init__(self, spacing=(1.0, 1.0, 0.025), permeability=1.0e-3, alpha=1.0, n=4.0, gravity=1.0):
+        self.spacing = tuple(float(h) for h in spacing)
+        self.permeability = permeability
+        self.alpha = alpha
+        self.n = n
+        self.gravity = gravity
+
+    @classmethod
+    def from_keys(cls, keys):
+        """Parameters of a ParFlow database (driver.read_pfidb), the defaults for the missing keys."""
+        default = cls()
+        spacing = tuple(float(keys.get(f"ComputationalGrid.D{axis}", h)) for axis, h in zip("XYZ", default.spacing))
+        return cls(
+            spacing,
+            float(keys.get("Geom.domain.Perm.Value", default.permeability)),
+            float(keys.get("Geom.domain.RelPerm.Alpha", default.alpha)),
+            float(keys.get("Geom.domain.RelPerm.N", default.n)),
+            float(keys.get("Gravity", default.gravity)),
+        )
+
+    def relative_permeability(self, pressure):
+        """Van Genuchten relative permeability of ParFlow (1 where the medium is saturated, n > 1)."""
+        m = 1 - 1 / self.n
+        head = self.alpha * np.abs(np.minimum(pressure, 0.0))
+        ahnm1 = head ** (self.n - 1)
+        # two powers per cell: opahn**m is the square of opahn**(m / 2)
+        root = (1 + ahnm1 * head) ** (m / 2)
+        return (1 - ahnm1 / (root * root)) ** 2 / root
+
+
+def _interior(ndim, depth, axis=None, shift=0):
+    """Selection of the cells of an extended block that have their full stencil, shifted along axis."""
+    return tuple(slice(depth + (shift if a == axis else 0), -depth + (shift if a == axis else 0) or None) for a in range(ndim))
+
+
+def gradient(block, spacing, axis, depth=1):
+    """Central difference along axis on the interior of the extended block."""
+    h = spacing[axis]
+    return (block[_interior(block.ndim, depth, axis, 1)] - block[_interior(block.ndim, depth, axis, -1)]) / (2 * h)
+
+
+def gradient_norm(block, spacing, depth=1):
+    return np.sqrt(sum(gradient(block, spacing, axis, depth) ** 2 for axis in range(block.ndim)))
+
+
+def darcy_flux(block, medium, axis, depth=1):
+    """Darcy flux along axis (z up) of the pressure head, cell centered."""
+    pressure = block[_interior(block.ndim, depth)]
+    grad = gradient(block, medium.spacing, axis, depth)
+    if axis == block.ndim - 1:
+        grad = grad + medium.gravity
+    return -medium.permeability * medium.relative_permeability(pressure) * grad
+
+
+def _side(ndim, axis, start, stop, ghost):
+    """Selection of layers start:stop along axis of the interior cells of a block with ghost layers."""
+    return tuple(slice(start, stop) if a == axis else slice(g, -g or None) for a, g in zip(range(ndim), ghost))
+
+
+def _halo(block, axis, side, depth, ghost):
+    """The depth layers of interior cells of a block next to its face side (0: low, 1: high) along axis."""
+    n = block.shape[axis]
+    g = ghost[axis]
+    start, stop = (g, g + depth) if side == 0 else (n - g - depth, n - g)
+    # a copy, so that the halo does not keep the whole chunk alive once sent
+    return block[_side(block.ndim, axis, start, stop, ghost)].copy()
+
+
+def _extrapolate(extended, axis, depth):
+    """Fill the depth layers of both sides of extended along axis by linear extrapolation of its inside."""
+    ndim = extended.ndim
+    # the sides along the previous axes are filled already
+    where = [slice(None)] * axis + [None] + [slice(depth, -depth)] * (ndim - axis - 1)
+
+    def layer(i):
+        where[axis] = slice(i, i + 1 or None)
+        return tuple(where)
+
+    n = extended.shape[axis] - 2 * depth
+    for edge, inside, direction in [(depth, depth + 1, -1), (-depth - 1, -depth - 2, 1)]:
+        slope = extended[layer(edge)] - extended[layer(inside)] if n > 1 else 0.0
+        for k in range(1, depth + 1):
+            extended[layer(edge + direction * k)] = extended[layer(edge)] + k * slope
+
+
+def _apply(fn, depth, ghost, block, halos):
+    """fn on the interior of block extended with halos: per axis (low, high), a halo, True (ghost layer) or None."""
+    ndim = block.ndim
+    interior = block[tuple(slice(g, -g or None) for g in ghost)]
+    inner = tuple(slice(depth, -depth) for _ in range(ndim))
+    extended = np.empty([n + 2 * depth for n in interior.shape], dtype=block.dtype)
+    extended[inner] = interior
+    for axis in range(ndim):
+        _extrapolate(extended, axis, depth)
+
+    for axis, sides in enumerate(halos):
+        for side, halo in enumerate(sides):
+            if halo is None:
+                continue
+            if halo is True:
+                n, g = block.shape[axis], ghost[axis]
+                start, stop = (g - depth, g) if side == 0 else (n - g, n - g + depth)
+                halo = block[_side(ndim, axis, start, stop, ghost)]
+            where = list(inner)
+            where[axis] = slice(0, depth) if side == 0 else slice(-depth, None)
+            extended[tuple(where)] = halo
+    return fn(extended)
+
+
+def stencil(array, fn, depth=1, ghost=0, dtype=None):
+    """
+    fn applied on every chunk extended by depth cells of its neighbours along every axis.
+    fn takes the extended block and returns its interior (a block of the chunk shape).
+    ghost is the width of the ghost layers of the chunks (an int, or one per axis).
+    """
+    ghost = (ghost,) * array.ndim if isinstance(ghost, int) else tuple(ghost)
+    if any(0 < g < depth for g in ghost):
+        raise ValueError(f"ghost layers of {ghost} cells are too thin for a stencil of depth {depth}")
+    chunks = tuple(tuple(c - 2 * g for c in cs) for cs, g in zip(array.chunks, ghost))
+    if any(c < depth for cs in chunks for c in cs):
+        raise ValueError(f"chunks of {chunks} cells are too small for a stencil of depth {depth}")
+
+    halo_name = "halo-" + tokenize(array.name, depth, ghost)
+    name = f"stencil-{funcname(fn)}-" + tokenize(halo_name, fn)
+
+    # the halos and the stencil tasks, in one layer
+    layer = {}
+    for index in product(*(range(n) for n in array.numblocks)):
+        halos = []
+        for axis, i in enumerate(index):
+            sides = []
+            for side, neighbour in enumerate((i - 1, i + 1)):
+                if not 0 <= neighbour < array.numblocks[axis]:
+                    # domain boundary: extrapolated
+                    sides.append(None)
+                elif ghost[axis]:
+                    sides.append(True)
+                else:
+                    # the neighbour sends its face on our side
+                    source = index[:axis] + (neighbour,) + index[axis + 1 :]
+                    key = (halo_name, axis, 1 - side) + source
+                    layer[key] = (_halo, (array.name, *source), axis, 1 - side, depth, ghost)
+                    sides.append(key)
+            halos.append(sides)
+        layer[(name, *index)] = (_apply, fn, depth, ghost, (array.name, *index), halos)
+
+    graph = HighLevelGraph.from_collections(name, layer, dependencies=[array])
+    return da.Array(graph, name, chunks, dtype=dtype or array.dtype)
+
+
+def darcy(array, medium=None, ghost=0):
+    """Vertical Darcy flux and gradient norm of a pressure array, sharing their halos."""
+    medium = medium or Medium()
+    return (
+        stencil(array, partial(darcy_flux, medium=medium, axis=array.ndim - 1), ghost=ghost),
+        stencil(array, partial(gradient_norm, spacing=medium.spacing), ghost=ghost),
+    )
+
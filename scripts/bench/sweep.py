@@ -0,0 +1,566 @@
+"""
+Parameter Sweep Scheduler
+
+Runs a grid of configurations (app, case, xsplit, ysplit, nodes, cells, repetitions)
+with the scripts of scripts/run/<cluster>/. Runs that need the same allocation (same
+app and node count) are packed back-to-back into one job, as long as the job fits in
+--max-walltime, instead of one sbatch per configuration.
+
+The state of every run (pending, submitted, completed, failed) is kept in a JSON
+state file, so an interrupted sweep is resumed by running the same command again.
+Repetitions whose experiment directory already exists and is valid (the files read
+by utils/process-timings.py are present and ParFlow reported its total runtime) are
+never run again. The run scripts create the experiment directories where their
+EXP_DIR line says (their $BASE_ROOTDIR), the job scripts move them to the results
+directory of the app in --workdir.
+
+Grid file (JSON, scalars or lists):
+
+    {
+      "app": ["doreisa", "deisa-insitu"],
+      "case": 0,
+      "xsplit": 10, "ysplit": 10,
+      "nodes": [1, 4, 9],
+      "cells": 240,
+      "repetitions": 3,
+      "walltime_per_run": 12,
+      "sbatch": {"partition": "dcgp_usr_prod", "qos": "normal", "account": "EUHPC_D23_125_0"}
+    }
+
+`nodes` is the number of simulation nodes (as in the experiment directory name), one
+more node is allocated for the head of the analytics apps.
+
+    python3 scripts/bench/sweep.py grid.json --backend slurm --wait
+
+The fake backend runs the jobs locally with bash, setting the SLURM_JOB_* variables,
+which is used to test the sweep logic without a scheduler (see --run-cmd).
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+BASE_ROOTDIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+# run script and results directory of every app (see scripts/bench/<cluster>/bench-*.sh)
+APPS = {
+    "parflow": ("start_multinode_parflow.sh", "experiments-parflow"),
+    "doreisa": ("start_multinode_doreisa.sh", "experiments-doreisa"),
+    "deisa-insitu": ("start_multinode_deisa_insitu.sh", "experiments-deisa-insitu"),
+}
+GRID_KEYS = ["app", "case", "xsplit", "ysplit", "nodes", "cells"]
+
+PENDING, SUBMITTED, COMPLETED, FAILED = "pending", "submitted", "completed", "failed"
+
+
+class Run(NamedTuple):
+    """One repetition of a configuration."""
+
+    app: str
+    case: int
+    xsplit: int
+    ysplit: int
+    nodes: int
+    cells: int
+    config_id: int
+    repetition: int
+
+    @property
+    def config_key(self) -> str:
+        return f"{self.app}_{self.case}_{self.xsplit}_{self.ysplit}_{self.nodes}_{self.cells}"
+
+    @property
+    def key(self) -> str:
+        return f"{self.config_key}_r{self.repetition}"
+
+    @property
+    def job_name(self) -> str:
+        # the run scripts name the experiment directory after the job, and
+        # process-timings.py recognizes parflow/deisa experiments from it
+        return self.app.split("-")[0]
+
+    @property
+    def alloc_nodes(self) -> int:
+        return self.nodes + (0 if self.app == "parflow" else 1)
+
+    @property
+    def results_dir(self) -> str:
+        return APPS[self.app][1]
+
+
+class ExperimentLayout(NamedTuple):
+    """
+    Where a run script creates the experiment directory of a run, read from its
+    EXP_DIR line: the directory (usually its $BASE_ROOTDIR, not the workdir of the
+    sweep) and the name, with the shell variables of the script.
+    """
+
+    root: str
+    name: str
+    variables: Dict[str, str]
+
+    def experiment_glob(self, run: Run, job_id: str = "*") -> str:
+        """Experiment directory names of a run, whatever the date (and job, by default)."""
+        values = dict(
+            self.variables,
+            xsplit=run.xsplit,
+            ysplit=run.ysplit,
+            nodes=run.nodes,
+            cells=run.cells,
+            SLURM_JOB_NAME=run.job_name,
+            SLURM_JOB_ID=job_id,
+            CONFIG_ID=run.config_id,
+        )
+        # unknown variables and command substitutions ($(date ...)) match anything
+        return re.sub(
+            r"\$\(.*?\)|\$\{(\w+)\}|\$(\w+)",
+            lambda m: str(values.get(m.group(1) or m.group(2), "*")),
+            self.name,
+        )
+
+
+def read_layout(script_path: str) -> ExperimentLayout:
+    """ExperimentLayout of a run script of scripts/run/<cluster>/."""
+    with open(script_path, "r") as f:
+        text = f.read()
+    variables = dict(re.findall(r'^(CASE_NAME)="?([^"\s]*)"?\s*$', text, re.M))
+    base = re.search(r'^BASE_ROOTDIR=\$\(cd -- "\$\(dirname -- "\$\{BASH_SOURCE\[0\]\}"\)/([^"]*)"', text, re.M)
+    variables["BASE_ROOTDIR"] = os.path.normpath(
+        os.path.join(os.path.dirname(os.path.abspath(script_path)), base.group(1) if base else ".")
+    )
+    exp_dir = re.search(r'^EXP_DIR=(.*)$', text, re.M)
+    if not exp_dir:
+        raise ValueError(f"{script_path} has no EXP_DIR line")
+    path = exp_dir.group(1).strip().replace('"', "")
+    root, name = os.path.split(path)
+    for var in ("BASE_ROOTDIR", "{BASE_ROOTDIR}"):
+        root = root.replace("$" + var, variables["BASE_ROOTDIR"])
+    if "$" in root:
+        raise ValueError(f"{script_path}: cannot resolve the directory of EXP_DIR={exp_dir.group(1)}")
+    return ExperimentLayout(os.path.abspath(root), name, variables)
+
+
+# --------------------------------------------------------
+# 			GRID AND RESULTS
+# --------------------------------------------------------
+
+
+def load_grid(path: str) -> Dict:
+    with open(path, "r") as f:
+        grid = json.load(f)
+    for key in GRID_KEYS:
+        if key not in grid:
+            if key == "case":
+                grid[key] = [0]
+                continue
+            raise ValueError(f"Grid is missing '{key}'")
+        if not isinstance(grid[key], list):
+            grid[key] = [grid[key]]
+    unknown = set(grid["app"]) - set(APPS)
+    if unknown:
+        raise ValueError(f"Unknown apps {sorted(unknown)}, expected some of {sorted(APPS)}")
+    grid.setdefault("repetitions", 1)
+    grid.setdefault("walltime_per_run", 12)
+    grid.setdefault("sbatch", {})
+    return grid
+
+
+def expand_grid(grid: Dict, config_ids: Dict[str, int], first_config_id: int = 0) -> List[Run]:
+    """
+    All the runs of the grid. CONFIG_IDs are stable: known configurations keep the id
+    recorded in `config_ids`, new ones get the next free id in grid order (updated in place).
+    """
+    runs = []
+    next_id = max(config_ids.values(), default=first_config_id - 1) + 1
+    for app, case, xsplit, ysplit, nodes, cells in itertools.product(*(grid[k] for k in GRID_KEYS)):
+        # the case (analytics kind) only matters for the coupled apps
+        case = 0 if app == "parflow" else int(case)
+        probe = Run(app, case, int(xsplit), int(ysplit), int(nodes), int(cells), -1, 0)
+        if probe.config_key not in config_ids:
+            config_ids[probe.config_key] = next_id
+            next_id += 1
+        for repetition in range(int(grid["repetitions"])):
+            run = probe._replace(config_id=config_ids[probe.config_key], repetition=repetition)
+            if run not in runs:
+                runs.append(run)
+    return runs
+
+
+def is_valid_experiment(exp_dir: str) -> bool:
+    """The experiment has the files read by process-timings.py and ParFlow finished."""
+    if not (glob.glob(os.path.join(exp_dir, "R-*.o")) and glob.glob(os.path.join(exp_dir, "*.out.log"))):
+        return False
+    csv_files = glob.glob(os.path.join(exp_dir, "*.out.timing.csv"))
+    if not csv_files:
+        return False
+    with open(csv_files[0], "r") as f:
+        return "Total Runtime" in f.read()
+
+
+def valid_experiments(workdir: str, run: Run, layout: ExperimentLayout) -> List[str]:
+    pattern = os.path.join(workdir, run.results_dir, layout.experiment_glob(run))
+    return sorted(d for d in glob.glob(pattern) if is_valid_experiment(d))
+
+
+def pack_runs(runs: List[Run], walltime_per_run: float, max_walltime: float, max_runs_per_job: int = 0) -> List[List[Run]]:
+    """Group runs needing the same allocation into jobs that fit in max_walltime (minutes)."""
+    per_job = max(1, int(max_walltime // walltime_per_run))
+    if max_runs_per_job > 0:
+        per_job = min(per_job, max_runs_per_job)
+
+    groups: Dict[tuple, List[Run]] = {}
+    for run in runs:
+        groups.setdefault((run.app, run.alloc_nodes), []).append(run)
+
+    jobs = []
+    for _, group in sorted(groups.items()):
+        for i in range(0, len(group), per_job):
+            jobs.append(group[i : i + per_job])
+    return jobs
+
+
+# --------------------------------------------------------
+# 			JOB SCRIPTS AND BACKENDS
+# --------------------------------------------------------
+
+
+def job_script(
+    runs: List[Run], layout: ExperimentLayout, workdir: str, status_dir: str, run_cmd: str, sbatch: Dict, minutes: int
+) -> str:
+    """
+    Bash script running the runs one after the other in a single allocation. The
+    experiment directory of a run is looked for where its run script creates it,
+    then moved to the results directory of the app in the workdir.
+    """
+    name = runs[0].job_name
+    lines = [
+        "#!/bin/bash",
+        "",
+        f"#SBATCH --job-name={name}",
+        f"#SBATCH --time={minutes // 60:02d}:{minutes % 60:02d}:00",
+        f"#SBATCH --nodes={runs[0].alloc_nodes}",
+        "#SBATCH --exclusive",
+        f"#SBATCH --output=sweep-{name}-%j.o",
+        f"#SBATCH --error=sweep-{name}-%j.e",
+    ]
+    lines += [f"#SBATCH --{key}={value}" for key, value in sbatch.items()]
+    lines += [
+        "",
+        f"cd {workdir}",
+        "JOB_ID=${SLURM_JOB_ID}",
+        "JOB_NAME=${SLURM_JOB_NAME}",
+        f"mkdir -p {status_dir} {runs[0].results_dir}",
+        "",
+    ]
+    for i, run in enumerate(runs):
+        out = f"R-$JOB_NAME-$JOB_ID-{i}"
+        cmd = run_cmd.format(**run._asdict(), base=BASE_ROOTDIR)
+        exp_glob = shlex.quote(layout.root) + "/" + layout.experiment_glob(run, job_id="${JOB_ID}")
+        lines += [
+            f"# {run.key} (CONFIG_ID {run.config_id})",
+            "start_run=$(date +%s)",
+            f"XSPLIT={run.xsplit} YSPLIT={run.ysplit} CELLS={run.cells} bash -c {shlex.quote(cmd)} >{out}.o 2>{out}.e",
+            "rc=$?",
+            f"exp=$(ls -d {exp_glob} 2>/dev/null | head -n 1)",
+            'if [ -n "$exp" ]; then',
+            f'  mv {out}.o {out}.e "$exp"/',
+            f'  mv "$exp" {run.results_dir}/ && exp={run.results_dir}/$(basename "$exp")',
+            "fi",
+            f'echo "{run.key} $rc $exp $start_run $(date +%s)" >> {status_dir}/$JOB_ID.status',
+            "",
+        ]
+    return "\n".join(lines)
+
+
+class SlurmBackend:
+    """Submits with sbatch and polls with sacct."""
+
+    TERMINAL = {"COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL", "PREEMPTED"}
+
+    def submit(self, script_path: str) -> str:
+        out = subprocess.run(["sbatch", "--parsable", script_path], capture_output=True, text=True, check=True)
+        return out.stdout.strip().split(";")[0]
+
+    def state(self, job_id: str) -> str:
+        out = subprocess.run(
+            ["sacct", "-j", job_id, "-X", "-n", "-o", "State"], capture_output=True, text=True
+        ).stdout.split()
+        if not out:
+            return "PENDING"
+        state = out[0].rstrip("+")
+        return state if state in self.TERMINAL or state in ("PENDING", "RUNNING") else "RUNNING"
+
+
+class FakeBackend:
+    """
+    Runs the job scripts locally in the background with bash, like a scheduler with
+    unlimited resources. The exit code of a job is kept in <job>.rc next to its script,
+    so the state of the jobs survives a restart of the sweep.
+    """
+
+    def __init__(self, jobs_dir: str):
+        self.jobs_dir = jobs_dir
+
+    def submit(self, script_path: str) -> str:
+        job_id = str(1000 + len(glob.glob(os.path.join(self.jobs_dir, "fake-*.pid"))))
+        with open(script_path, "r") as f:
+            name = next(l.split("=", 1)[1].strip() for l in f if l.startswith("#SBATCH --job-name="))
+        rc_file = os.path.join(self.jobs_dir, f"fake-{job_id}.rc")
+        env = dict(os.environ, SLURM_JOB_ID=job_id, SLURM_JOB_NAME=name)
+        log = open(os.path.join(self.jobs_dir, f"fake-{job_id}.log"), "w")
+        process = subprocess.Popen(
+            ["bash", "-c", f"bash {script_path}; echo $? > {rc_file}.tmp && mv {rc_file}.tmp {rc_file}"],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+        with open(os.path.join(self.jobs_dir, f"fake-{job_id}.pid"), "w") as f:
+            f.write(str(process.pid))
+        return job_id
+
+    def exit_state(self, job_id: str) -> Optional[str]:
+        rc_file = os.path.join(self.jobs_dir, f"fake-{job_id}.rc")
+        if not os.path.exists(rc_file):
+            return None
+        with open(rc_file, "r") as f:
+            return "COMPLETED" if f.read().strip() == "0" else "FAILED"
+
+    def state(self, job_id: str) -> str:
+        if self.exit_state(job_id) is not None:
+            return self.exit_state(job_id)
+        try:
+            with open(os.path.join(self.jobs_dir, f"fake-{job_id}.pid"), "r") as f:
+                pid = int(f.read())
+            # reap the process if it is our child, then check that it still exists
+            try:
+                os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                pass
+            os.kill(pid, 0)
+            return "RUNNING"
+        except (OSError, ValueError):
+            # the job may have exited since the first check
+            return self.exit_state(job_id) or "FAILED"
+
+
+# --------------------------------------------------------
+# 			SWEEP
+# --------------------------------------------------------
+
+
+class Sweep:
+    def __init__(self, grid: Dict, args, backend):
+        self.grid = grid
+        self.args = args
+        self.backend = backend
+        self.workdir = os.path.abspath(args.workdir)
+        self.state_file = os.path.abspath(args.state)
+        self.sweep_dir = os.path.splitext(self.state_file)[0]
+        self.status_dir = os.path.join(self.sweep_dir, "status")
+        self.jobs_dir = os.path.join(self.sweep_dir, "jobs")
+        os.makedirs(self.status_dir, exist_ok=True)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+        self.state = {"config_ids": {}, "runs": {}, "jobs": {}}
+        if os.path.exists(self.state_file):
+            with open(self.state_file, "r") as f:
+                self.state.update(json.load(f))
+        self.scripts_dir = os.path.abspath(args.scripts_dir or os.path.join(BASE_ROOTDIR, "scripts", "run", args.cluster))
+        self.layouts = {app: read_layout(os.path.join(self.scripts_dir, APPS[app][0])) for app in grid["app"]}
+        self.runs = expand_grid(grid, self.state["config_ids"], args.first_config_id)
+        for run in self.runs:
+            self.state["runs"].setdefault(run.key, {"status": PENDING, "attempts": 0, "job": None, "exp_dir": None})
+        self.save()
+
+    def save(self) -> None:
+        tmp = self.state_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_file)
+
+    def run_state(self, run: Run) -> Dict:
+        return self.state["runs"][run.key]
+
+    def claim_existing_results(self) -> None:
+        """Mark repetitions as completed when enough valid experiments already exist."""
+        claimed = {s["exp_dir"] for s in self.state["runs"].values() if s["exp_dir"]}
+        for run in self.runs:
+            rs = self.run_state(run)
+            if rs["status"] == COMPLETED:
+                if rs["exp_dir"] and not is_valid_experiment(os.path.join(self.workdir, rs["exp_dir"])):
+                    print(f"⚠️  {run.key}: {rs['exp_dir']} is no longer valid, running it again")
+                    rs.update(status=PENDING, exp_dir=None)
+                continue
+            if rs["status"] == SUBMITTED:
+                continue
+            for exp_dir in valid_experiments(self.workdir, run, self.layouts[run.app]):
+                rel = os.path.relpath(exp_dir, self.workdir)
+                if rel not in claimed:
+                    claimed.add(rel)
+                    rs.update(status=COMPLETED, exp_dir=rel)
+                    print(f"✅ {run.key}: found existing results in {rel}")
+                    break
+
+    def update(self) -> None:
+        """Read the per-run status lines of the submitted jobs and the state of the jobs."""
+        for job_id, job in self.state["jobs"].items():
+            if job["state"] in SlurmBackend.TERMINAL:
+                continue
+            job["state"] = self.backend.state(job_id)
+
+            reported = set()
+            status_file = os.path.join(self.status_dir, f"{job_id}.status")
+            if os.path.exists(status_file):
+                with open(status_file, "r") as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) != 5:
+                            # no experiment directory was created
+                            parts = parts[:2] + [""] + parts[2:]
+                        key, rc, exp_dir, start, end = parts
+                        reported.add(key)
+                        rs = self.state["runs"][key]
+                        if rs["status"] != SUBMITTED or rs["job"] != job_id:
+                            continue
+                        ok = rc == "0" and exp_dir and is_valid_experiment(os.path.join(self.workdir, exp_dir))
+                        rs.update(
+                            status=COMPLETED if ok else FAILED,
+                            exp_dir=exp_dir or None,
+                            start=float(start),
+                            end=float(end),
+                        )
+                        print(f"{'✅' if ok else '❌'} {key}: {'completed' if ok else f'failed (exit code {rc})'} in job {job_id}")
+
+            if job["state"] in SlurmBackend.TERMINAL:
+                # runs never reached, e.g. the job hit its time limit
+                for key in job["runs"]:
+                    rs = self.state["runs"][key]
+                    if key not in reported and rs["status"] == SUBMITTED and rs["job"] == job_id:
+                        rs["status"] = FAILED
+                        print(f"❌ {key}: not run, job {job_id} ended with {job['state']}")
+        self.save()
+
+    def pending_runs(self) -> List[Run]:
+        runs = []
+        for run in self.runs:
+            rs = self.run_state(run)
+            if rs["status"] == PENDING or (rs["status"] == FAILED and rs["attempts"] < self.args.max_attempts):
+                runs.append(run)
+        return runs
+
+    def active_jobs(self) -> int:
+        return sum(1 for job in self.state["jobs"].values() if job["state"] not in SlurmBackend.TERMINAL)
+
+    def submit(self) -> int:
+        """Submit packed jobs for the pending runs, up to --max-jobs jobs in flight."""
+        minutes_per_run = self.grid["walltime_per_run"]
+        jobs = pack_runs(self.pending_runs(), minutes_per_run, self.args.max_walltime, self.args.max_runs_per_job)
+        run_cmd = self.args.run_cmd or "bash {script} {case} {config_id}"
+
+        submitted = 0
+        for runs in jobs:
+            if self.args.max_jobs and self.active_jobs() >= self.args.max_jobs:
+                break
+            minutes = int(minutes_per_run * len(runs))
+            app = runs[0].app
+            cmds = run_cmd.replace("{script}", os.path.join(self.scripts_dir, APPS[app][0]))
+            script = job_script(runs, self.layouts[app], self.workdir, self.status_dir, cmds, self.grid["sbatch"], minutes)
+            script_path = os.path.join(self.jobs_dir, f"job-{len(self.state['jobs'])}.sh")
+            with open(script_path, "w") as f:
+                f.write(script)
+
+            if self.args.dry_run:
+                print(f"📝 Would submit {script_path}: {len(runs)} runs on {runs[0].alloc_nodes} nodes, {minutes} min")
+                continue
+
+            job_id = self.backend.submit(script_path)
+            self.state["jobs"][job_id] = {"script": script_path, "runs": [r.key for r in runs], "state": "PENDING"}
+            for run in runs:
+                rs = self.run_state(run)
+                rs.update(status=SUBMITTED, job=job_id, attempts=rs["attempts"] + 1)
+            print(f"🚀 Submitted job {job_id}: {len(runs)} runs on {runs[0].alloc_nodes} nodes, {minutes} min")
+            submitted += 1
+            self.save()
+        return submitted
+
+    def summary(self) -> Dict[str, int]:
+        counts = {PENDING: 0, SUBMITTED: 0, COMPLETED: 0, FAILED: 0}
+        for run in self.runs:
+            counts[self.run_state(run)["status"]] += 1
+        return counts
+
+    def step(self) -> bool:
+        """One scheduling round, returns True while runs are left to wait for."""
+        self.update()
+        self.claim_existing_results()
+        self.submit()
+        self.save()
+        counts = self.summary()
+        print("📊 " + " ".join(f"{k}={v}" for k, v in counts.items()))
+        return counts[SUBMITTED] > 0 or (bool(self.pending_runs()) and not self.args.dry_run)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a parameter sweep with job packing and resumable state")
+    parser.add_argument("grid", help="JSON parameter grid")
+    parser.add_argument("--state", default="sweep-state.json", help="State file (default: sweep-state.json)")
+    parser.add_argument("--backend", choices=["slurm", "fake"], default="slurm", help="Job scheduler backend")
+    parser.add_argument("--cluster", default="leonardo", help="Directory of the run scripts in scripts/run/")
+    parser.add_argument(
+        "--scripts-dir",
+        default=None,
+        help="Directory of the run scripts, read for where they create the experiments (default: scripts/run/<cluster>)",
+    )
+    parser.add_argument("--workdir", default=BASE_ROOTDIR, help="Where the runs execute and results are stored")
+    parser.add_argument("--max-walltime", type=float, default=60, help="Max minutes of one packed job (default: 60)")
+    parser.add_argument("--max-runs-per-job", type=int, default=0, help="Max runs packed in one job (0: no limit)")
+    parser.add_argument("--max-jobs", type=int, default=0, help="Max jobs in flight (0: no limit)")
+    parser.add_argument("--max-attempts", type=int, default=2, help="Attempts of a failing run (default: 2)")
+    parser.add_argument("--first-config-id", type=int, default=0, help="CONFIG_ID of the first new configuration")
+    parser.add_argument(
+        "--run-cmd",
+        default=None,
+        help="Command of one run, formatted with the run fields, {base} and {script} (the path of the run script) "
+        "(default: bash {script} {case} {config_id})",
+    )
+    parser.add_argument("--wait", action="store_true", help="Keep scheduling until every run completed or failed")
+    parser.add_argument("--poll", type=float, default=60, help="Seconds between scheduling rounds with --wait")
+    parser.add_argument("--dry-run", action="store_true", help="Write the job scripts without submitting them")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        grid = load_grid(args.grid)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    jobs_dir = os.path.join(os.path.splitext(os.path.abspath(args.state))[0], "jobs")
+    os.makedirs(jobs_dir, exist_ok=True)
+    backend = FakeBackend(jobs_dir) if args.backend == "fake" else SlurmBackend()
+    try:
+        sweep = Sweep(grid, args, backend)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    while sweep.step() and args.wait:
+        time.sleep(args.poll)
+
+    counts = sweep.summary()
+    return 0 if counts[FAILED] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+clayL Problem Deck Generator
+
+Python replacement of `tclsh clayL.tcl <xsplit> <ysplit> <nodes> <cells>` that works
+for any node count. clayL.tcl sets P = xsplit * sqrt(nodes) and Q = ysplit * sqrt(nodes),
+so the node count must be a perfect square and the subdomain shape is fixed by hand.
+
+Here the process grid P x Q x R is chosen among all the factorizations of
+nodes * ranks_per_node to minimize
+
+    cost = imbalance + halo_weight * surface_to_volume
+
+where imbalance is max/mean cells per rank - 1 and surface_to_volume the ghost cells
+over the cells of the largest subdomain. R is 1 by default, so that every rank owns
+whole columns (the NX/P x NY/Q x NZ chunks the analytics expect).
+
+The keys are read from clayL.tcl (its literal pfset lines), only the grid, topology
+and timing keys are computed, and the result is written as <name>.pfidb, the file
+ParFlow reads, in the same format as pfwritedb. Tcl is not needed.
+
+    python3 scripts/run/clayL.py --nodes 6 --ranks-per-node 100 --cells 240 --name clayL_6
+
+With --cells, the global grid follows the weak scaling of clayL.tcl (cells x cells
+columns per node): the nodes are arranged as the most square a x b grid and
+NX = cells * a, NY = cells * b. --nx/--ny set the global grid directly instead.
+"""
+
+import argparse
+import os
+import re
+import sys
+from typing import Dict, List, NamedTuple, Tuple
+
+DECK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clayL.tcl")
+
+# keys computed here instead of being read from the deck
+COMPUTED_KEYS = [
+    "Process.Topology.P",
+    "Process.Topology.Q",
+    "Process.Topology.R",
+    "ComputationalGrid.NX",
+    "ComputationalGrid.NY",
+    "ComputationalGrid.NZ",
+    "Geom.domain.Upper.X",
+    "Geom.domain.Upper.Y",
+    "Geom.domain.Upper.Z",
+    "TimingInfo.StopTime",
+]
+
+
+class Decomposition(NamedTuple):
+    """A process grid and its predicted quality."""
+
+    P: int
+    Q: int
+    R: int
+    # dimensions of the largest subdomain
+    local: Tuple[int, int, int]
+    # max/mean cells per rank - 1
+    imbalance: float
+    # ghost cells of the largest interior subdomain (ghost layer of width 1)
+    halo_cells: int
+    surface_to_volume: float
+    cost: float
+
+
+def split_sizes(n: int, parts: int) -> List[int]:
+    """Cells of every process along one axis (ParFlow gives the remainder to the first ones)."""
+    return [n // parts + (1 if i < n % parts else 0) for i in range(parts)]
+
+
+def evaluate(nx: int, ny: int, nz: int, P: int, Q: int, R: int, halo_weight: float = 1.0) -> Decomposition:
+    lx, ly, lz = -(-nx // P), -(-ny // Q), -(-nz // R)
+    largest = lx * ly * lz
+    mean = nx * ny * nz / (P * Q * R)
+    imbalance = largest / mean - 1
+
+    # an interior rank exchanges two faces along every split axis
+    halo = 0
+    if P > 1:
+        halo += 2 * ly * lz
+    if Q > 1:
+        halo += 2 * lx * lz
+    if R > 1:
+        halo += 2 * lx * ly
+    surface_to_volume = halo / largest
+    return Decomposition(
+        P=P,
+        Q=Q,
+        R=R,
+        local=(lx, ly, lz),
+        imbalance=imbalance,
+        halo_cells=halo,
+        surface_to_volume=surface_to_volume,
+        cost=imbalance + halo_weight * surface_to_volume,
+    )
+
+
+def factorizations(ranks: int, max_r: int = 1) -> List[Tuple[int, int, int]]:
+    result = []
+    for R in range(1, max_r + 1):
+        if ranks % R:
+            continue
+        rest = ranks // R
+        for P in range(1, rest + 1):
+            if rest % P == 0:
+                result.append((P, rest // P, R))
+    return result
+
+
+def rank_decompositions(
+    nx: int, ny: int, nz: int, ranks: int, max_r: int = 1, halo_weight: float = 1.0
+) -> List[Decomposition]:
+    """All the valid process grids, best first. Every rank must own at least one cell per axis."""
+    candidates = [
+        evaluate(nx, ny, nz, P, Q, R, halo_weight)
+        for P, Q, R in factorizations(ranks, max_r)
+        if P <= nx and Q <= ny and R <= nz
+    ]
+    # ties (e.g. P and Q swapped on a square grid) go to the lowest R then the lowest P
+    return sorted(candidates, key=lambda d: (round(d.cost, 12), d.R, d.P))
+
+
+def weak_scaling_grid(nodes: int, cells: int) -> Tuple[int, int]:
+    """NX, NY for cells x cells columns per node, the nodes being arranged as square as possible."""
+    a = max(d for d in range(1, int(nodes**0.5) + 1) if nodes % d == 0)
+    b = nodes // a
+    return cells * b, cells * a
+
+
+def halo_bytes(decomposition: Decomposition, ghost: int = 1, exchanges: int = 1, itemsize: int = 8) -> int:
+    """Bytes sent by the largest interior rank for `exchanges` halo updates of one float64 field."""
+    return decomposition.halo_cells * ghost * exchanges * itemsize
+
+
+# --------------------------------------------------------
+# 			DECK
+# --------------------------------------------------------
+
+
+def _tcl_value(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return text[1:-1]
+    return text
+
+
+def read_deck(path: str = DECK) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    The literal keys of a Tcl deck, and its literal `set` variables. Keys whose value
+    is an expression must be among COMPUTED_KEYS, a ValueError is raised otherwise.
+    """
+    variables = {}
+    keys = {}
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            match = re.match(r"(pfset|set)\s+(\S+)\s+(.*)$", line)
+            if not match:
+                continue
+            command, name, value = match.groups()
+            value = _tcl_value(value)
+            if command == "set":
+                if "[" not in value:
+                    variables[name] = value
+                continue
+
+            if re.fullmatch(r"\$\w+", value):
+                value = variables[value[1:]]
+            if "[" in value or "$" in value:
+                if name not in COMPUTED_KEYS:
+                    raise ValueError(f"Cannot evaluate {name} = {value} from {path}")
+                continue
+            keys[name] = value
+    return keys, variables
+
+
+def deck_keys(nx: int, ny: int, nz: int, decomposition: Decomposition, deck: str = DECK) -> Dict[str, str]:
+    keys, variables = read_deck(deck)
+    keys.update(
+        {
+            "Process.Topology.P": str(decomposition.P),
+            "Process.Topology.Q": str(decomposition.Q),
+            "Process.Topology.R": str(decomposition.R),
+            "ComputationalGrid.NX": str(nx),
+            "ComputationalGrid.NY": str(ny),
+            "ComputationalGrid.NZ": str(nz),
+            "Geom.domain.Upper.X": str(nx * float(keys["ComputationalGrid.DX"])),
+            "Geom.domain.Upper.Y": str(ny * float(keys["ComputationalGrid.DY"])),
+            "Geom.domain.Upper.Z": str(nz * float(keys["ComputationalGrid.DZ"])),
+            "TimingInfo.StopTime": str(float(variables["time"]) * float(variables["fac"])),
+        }
+    )
+    return keys
+
+
+def write_pfidb(path: str, keys: Dict[str, str]) -> None:
+    """Write the keys like pfwritedb: the number of keys, then the length and text of every key and value."""
+    with open(path, "w") as f:
+        f.write(f"{len(keys)}\n")
+        for key, value in keys.items():
+            f.write(f"{len(key)}\n{key}\n{len(value)}\n{value}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the clayL problem deck with an optimized process grid")
+    parser.add_argument("--nodes", type=int, required=True, help="Number of simulation nodes")
+    parser.add_argument("--ranks-per-node", type=int, required=True, help="MPI ranks per node")
+    parser.add_argument("--cells", type=int, default=None, help="Cells per node along x and y (weak scaling)")
+    parser.add_argument("--nx", type=int, default=None, help="Global number of cells along x")
+    parser.add_argument("--ny", type=int, default=None, help="Global number of cells along y")
+    parser.add_argument("--nz", type=int, default=240, help="Global number of cells along z (default: 240)")
+    parser.add_argument("--max-r", type=int, default=1, help="Largest split allowed along z (default: 1)")
+    parser.add_argument("--halo-weight", type=float, default=1.0, help="Weight of surface/volume against imbalance")
+    parser.add_argument("--ghost", type=int, default=1, help="Ghost layer width used for the halo bytes")
+    parser.add_argument("--exchanges-per-step", type=int, default=1, help="Halo exchanges per time step")
+    parser.add_argument("--top", type=int, default=5, help="Number of candidates to report")
+    parser.add_argument("--deck", default=DECK, help="Tcl deck to read the keys from")
+    parser.add_argument("--name", default=None, help="Write <name>.pfidb (default: only report)")
+    parser.add_argument(
+        "--share-saturation", action="store_true", help="Also publish the saturation in situ (Solver.ShareInsituSaturation)"
+    )
+    args = parser.parse_args()
+
+    if args.nx is not None and args.ny is not None:
+        nx, ny = args.nx, args.ny
+    elif args.cells is not None:
+        nx, ny = weak_scaling_grid(args.nodes, args.cells)
+    else:
+        parser.error("either --cells or both --nx and --ny are required")
+    ranks = args.nodes * args.ranks_per_node
+
+    candidates = rank_decompositions(nx, ny, args.nz, ranks, args.max_r, args.halo_weight)
+    if not candidates:
+        print(f"Error: {ranks} ranks cannot decompose a {nx}x{ny}x{args.nz} grid", file=sys.stderr)
+        return 1
+
+    print(f"🧮 Grid {nx}x{ny}x{args.nz}, {ranks} ranks ({args.nodes} nodes x {args.ranks_per_node})")
+    print(f"{'P':>5} {'Q':>5} {'R':>3} {'local':>16} {'imbalance':>10} {'surf/vol':>9} {'halo MB/step':>13}")
+    for d in candidates[: args.top]:
+        local = "x".join(str(n) for n in d.local)
+        halo_mb = halo_bytes(d, args.ghost, args.exchanges_per_step) / 1e6
+        print(f"{d.P:5d} {d.Q:5d} {d.R:3d} {local:>16} {d.imbalance:10.4f} {d.surface_to_volume:9.4f} {halo_mb:13.3f}")
+
+    best = candidates[0]
+    print(
+        f"✅ Process.Topology {best.P} x {best.Q} x {best.R}: "
+        f"{halo_bytes(best, args.ghost, args.exchanges_per_step)} halo bytes per step per rank"
+    )
+
+    if args.name:
+        keys = deck_keys(nx, ny, args.nz, best, args.deck)
+        if args.share_saturation:
+            # the analytics read the published quantities from the database (analytics/driver.py)
+            keys["Solver.ShareInsituSaturation"] = "True"
+        write_pfidb(f"{args.name}.pfidb", keys)
+        print(f"📄 Wrote {args.name}.pfidb")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
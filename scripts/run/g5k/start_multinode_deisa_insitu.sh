@@ -5,7 +5,7 @@ set -xeu
 echo RUNNING: DEISA
 
 if [[ "$#" -lt 1 ]]; then
-  echo "Error: An argument (0 or 1) must be provided."
+  echo "Error: An argument (0, 1 or 3) must be provided."
   exit 1
 fi
 
@@ -13,8 +13,10 @@ if [[ "$1" == "0" ]]; then
   APP="avg"
 elif [[ "$1" == "1" ]]; then
   APP="derivative"
+elif [[ "$1" == "3" ]]; then
+  APP="pyramid"
 else
-  echo "Error: Argument must be either 0 or 1."
+  echo "Error: Argument must be 0 (avg), 1 (derivative) or 3 (pyramid)."
   exit 1
 fi
 
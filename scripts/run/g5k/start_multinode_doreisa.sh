@@ -5,7 +5,7 @@ set -xeu
 echo RUNNING: DOREISA
 
 if [[ "$#" -lt 1 ]]; then
-  echo "Error: An argument (0 or 1) must be provided."
+  echo "Error: An argument (0 - 3) must be provided."
   exit 1
 fi
 
@@ -15,8 +15,10 @@ elif [[ "$1" == "1" ]]; then
   APP="derivative"
 elif [[ "$1" == "2" ]]; then
   APP="toy"
+elif [[ "$1" == "3" ]]; then
+  APP="pyramid"
 else
-  echo "Error: Argument must be either 0 or 1."
+  echo "Error: Argument must be 0 (avg), 1 (derivative), 2 (toy) or 3 (pyramid)."
   exit 1
 fi
 
@@ -119,6 +121,13 @@ fi
 # --------------------------------------------------------
 
 mpirun --host "${HEAD_NODE}":1 bash -c "source ./activate_env.sh $BASE_ROOTDIR && ray start --head --port=$PORT"
+
+# Object store, task and actor telemetry of every node (raylog_*.csv, raytasks_*.csv),
+# it exits once the cluster is stopped
+mpirun --host "${HEAD_NODE}":1 bash -c "source ./activate_env.sh $BASE_ROOTDIR \
+ && python3 $BASE_ROOTDIR/utils/ray-telemetry.py --address ${HEAD_ADDRESS}" \
+  2>./errors/ray-telemetry.e &
+TELEMETRY_PID=$!
 end=$(date +%s)
 echo Ray Head node started at $(expr $end - $start) seconds.
 sleep 10
@@ -126,6 +135,10 @@ sleep 10
 # 				ANALYTICS
 # --------------------------------------------------------
 
+# The analytics read the number of steps from the problem database
+CASE=${CASE_NAME}_${xsplit}_${ysplit}_${nodes}_${cells}
+tclsh ${CASE_NAME}.tcl ${xsplit} ${ysplit} ${nodes} ${cells}
+
 end=$(date +%s)
 ANALYTICS_START=$(expr "$end" - "$start")
 echo Launching Analytics at "$ANALYTICS_START" seconds.
@@ -145,9 +158,6 @@ echo AnalyticsPID $ANALYTICS_PID
 
 echo Launching Simulation...
 
-CASE=${CASE_NAME}_${xsplit}_${ysplit}_${nodes}_${cells}
-tclsh ${CASE_NAME}.tcl ${xsplit} ${ysplit} ${nodes} ${cells}
-
 if [ "$TOTAL_NODES" -gt 1 ]; then
   # ray start and connect to head node
   mpirun --host $(printf "%s:1," "${SIM_NODES[@]}" | sed 's/,$//') \
@@ -174,6 +184,10 @@ end=$(date +%s)
 wait $ANALYTICS_PID
 echo "Analytics Finished!"
 
+# The analytics exit after the last step, the cluster can be stopped right away
+mpirun --host $(printf "%s:1," "${NODES[@]}" | sed 's/,$//') bash -c "source ./activate_env.sh $BASE_ROOTDIR && ray stop"
+wait $TELEMETRY_PID || true
+
 cd "$OLDPWD"
 echo "Cleaning up.."
 set +xeu
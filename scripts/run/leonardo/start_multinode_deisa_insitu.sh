@@ -5,7 +5,7 @@ set -xeu
 echo RUNNING: DEISA
 
 if [[ "$#" -lt 2 ]]; then
-  echo "Error: A case (0 or 1) and a configuration ID (0 - N) must be provided as arguments."
+  echo "Error: A case (0 - 3) and a configuration ID (0 - N) must be provided as arguments."
   exit 1
 fi
 
@@ -15,8 +15,10 @@ elif [[ "$1" == "1" ]]; then
   APP="derivative"
 elif [[ "$1" == "2" ]]; then
   APP="toy"
+elif [[ "$1" == "3" ]]; then
+  APP="pyramid"
 else
-  echo "Error: Argument must be either 0 or 1."
+  echo "Error: Argument must be 0 (avg), 1 (derivative), 2 (toy) or 3 (pyramid)."
   exit 1
 fi
 
@@ -80,10 +82,10 @@ export PYTHONPATH=$DEISA_DIR
 SCHEFILE=scheduler.json
 
 CASE_NAME="clayL"
-xsplit=10 # Number of MPI tasks per node along the x-axis
-ysplit=10 # Number of MPI tasks per node along the y-axis
+xsplit=${XSPLIT:-10} # Number of MPI tasks per node along the x-axis
+ysplit=${YSPLIT:-10} # Number of MPI tasks per node along the y-axis
 
-cells=240 # Total number of cells along each dimension per node (square problem in x and y dimensions)
+cells=${CELLS:-240} # Total number of cells along each dimension per node (square problem in x and y dimensions)
 nodes=$N_SIM_NODES
 # HEAD NODE
 DASK_SCHEDULER_CPUS=55
@@ -156,7 +158,10 @@ source ./activate_env.sh
 
 # Start memory logger on every node - cpu 0 and 1 is dedicated only to this
 srun --cpu-bind=verbose,core --ntasks-per-node=1 --cpus-per-task=$MEM_LOG_CPUS \
-	python3 $BASE_ROOTDIR/utils/memory-logger.py --interval 30 &
+	bash -c "
+	python3 $BASE_ROOTDIR/utils/cpu-monitor.py --interval 30 &
+	python3 $BASE_ROOTDIR/utils/memory-logger.py --interval 30
+" &
 
 echo "Launching Dask Scheduler on ${HEAD_NODE}..."
 srun --cpu-bind=verbose,core --nodes=1 --nodelist=$HEAD_NODE --ntasks=1 --cpus-per-task=$DASK_SCHEDULER_CPUS \
@@ -209,7 +214,9 @@ echo Dask Workers Launched! at $(expr $end - $start) seconds.
 
 
 CASE=${CASE_NAME}_${xsplit}_${ysplit}_${nodes}_${cells}
-tclsh ${CASE_NAME}.tcl ${xsplit} ${ysplit} "${nodes}" ${cells}
+# any node count: the process grid is optimized for $nodes x $MPI_PROCESSES ranks
+python3 $BASE_ROOTDIR/scripts/run/clayL.py --nodes ${nodes} --ranks-per-node ${MPI_PROCESSES} --cells ${cells} \
+  --deck ${CASE_NAME}.tcl --name ${CASE}
 
 srun --cpu-bind=verbose,core --ntasks=$((MPI_PROCESSES * N_SIM_NODES)) --nodes=$N_SIM_NODES -x $HEAD_NODE \
 	--ntasks-per-node=$MPI_PROCESSES --cpus-per-task=1\
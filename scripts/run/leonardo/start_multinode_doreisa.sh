@@ -5,7 +5,7 @@ set -xeu
 echo RUNNING: DOREISA
 
 if [[ "$#" -lt 2 ]]; then
-  echo "Error: A case (0 or 1) and a configuration ID (0 - N) must be provided as arguments."
+  echo "Error: A case (0 - 3) and a configuration ID (0 - N) must be provided as arguments."
   exit 1
 fi
 
@@ -15,8 +15,10 @@ elif [[ "$1" == "1" ]]; then
   APP="derivative"
 elif [[ "$1" == "2" ]]; then
   APP="toy"
+elif [[ "$1" == "3" ]]; then
+  APP="pyramid"
 else
-  echo "Error: Argument must be either 0 or 1."
+  echo "Error: Argument must be 0 (avg), 1 (derivative), 2 (toy) or 3 (pyramid)."
   exit 1
 fi
 
@@ -80,10 +82,10 @@ export PYTHONPATH=$DOREISA_DIR
 
 CASE_NAME="clayL"
 
-xsplit=10 # Number of MPI tasks per node along the x-axis
-ysplit=10 # Number of MPI tasks per node along the y-axis
+xsplit=${XSPLIT:-10} # Number of MPI tasks per node along the x-axis
+ysplit=${YSPLIT:-10} # Number of MPI tasks per node along the y-axis
 
-cells=240 # Total number of cells along each dimension per node (square problem in x and y dimensions)
+cells=${CELLS:-240} # Total number of cells along each dimension per node (square problem in x and y dimensions)
 nodes=$N_SIM_NODES
 # HEAD NODE
 RAY_HEAD_CPUS=55
@@ -139,104 +141,32 @@ EOF
 HEAD_NODE_IP=$(srun --overlap --nodes=1 --nodelist=$HEAD_NODE --ntasks-per-node=1 bash -c 'ip -o -4 addr show ib0 | awk "{print \$4}" | cut -d/ -f1')
 echo "Head node IP: $HEAD_NODE_IP"
 
-# Start memory logger on every node - cpu 0 and 1 is dedicated only to this
-srun  --cpu-bind=verbose,core --ntasks-per-node=1 --cpus-per-task=$MEM_LOG_CPUS bash -c "
-    source ./activate_env.sh $BASE_ROOTDIR
-    python3 $BASE_ROOTDIR/utils/memory-logger.py --interval 30 
-"&
-
-# Start the head node -- will have 20 cores in the node
-srun  --cpu-bind=verbose,core --nodes=1 --nodelist=$HEAD_NODE --ntasks=1 --cpus-per-task=$RAY_HEAD_CPUS bash -c "
-    ulimit -n 65535
-    export OPENBLAS_NUM_THREADS=1
-    source ./activate_env.sh $BASE_ROOTDIR
-    ray start --head --num-cpus=1 --node-ip-address=$HEAD_NODE_IP --port=$PORT --disable-usage-stats --block
-" 2>./errors/ray-head.e &
-
-end=$(date +%s)
-echo Ray Head node started at $(expr $end - $start) seconds.
-
-sleep 30
 # --------------------------------------------------------
-# 				ANALYTICS
+# 	      LOGGERS, RAY, ANALYTICS AND SIMULATION
 # --------------------------------------------------------
 
-end=$(date +%s)
-ANALYTICS_START=$(expr "$end" - "$start")
-echo Launching Analytics at "$ANALYTICS_START" seconds.
-
-srun --cpu-bind=verbose,core  --nodes=1 --nodelist="${HEAD_NODE}" --ntasks=1 --cpus-per-task=$ANALYTICS_CPUS bash -c "
-	source ./activate_env.sh $BASE_ROOTDIR
-	python3 $BASE_ROOTDIR/analytics/pressure-doreisa-$APP.py
-" 2>./errors/pressure-doreisa.e &
-
-sleep 30
-
-ANALYTICS_PID=$!
-echo AnalyticsPID $ANALYTICS_PID
-
-# --------------------------------------------------------
-# 	                    SIMULATION
-# --------------------------------------------------------
-
-echo Launching Simulation...
+# The orchestrator starts every component and moves on as soon as it is ready
+# (Ray cluster size, analytics ready file) instead of sleeping. Phase timings are
+# printed as [ORCHESTRATOR, <phase>] lines and saved to orchestrator-timings.json.
 
 CASE=${CASE_NAME}_${xsplit}_${ysplit}_${nodes}_${cells}
-tclsh ${CASE_NAME}.tcl ${xsplit} ${ysplit} ${nodes} ${cells}
+# any node count: the process grid is optimized for $nodes x $MPI_PROCESSES ranks
+# SHARE_SATURATION=1 also publishes the saturation, analyzed with the pressure in the same graph
+python3 $BASE_ROOTDIR/scripts/run/clayL.py --nodes ${nodes} --ranks-per-node ${MPI_PROCESSES} --cells ${cells} \
+  --deck ${CASE_NAME}.tcl --name ${CASE} ${SHARE_SATURATION:+--share-saturation}
 NODELIST=$(printf "%s," "${SIM_NODES[@]}" | sed 's/,$//')
 
-if [ "$TOTAL_NODES" -gt 1 ]; then
-  # ray start and connect to head node
-  srun --cpu-bind=verbose,core --nodes=$N_SIM_NODES \
-  -x $HEAD_NODE --ntasks=$N_SIM_NODES --ntasks-per-node=1 --cpus-per-task=$RAY_WORKER_CPUS \
-  bash -c "
-  ulimit -n 65535
-  export OMPI_MCA_btl_tcp_if_include="ib0"
-  export OPENBLAS_NUM_THREADS=1
-  node_ip=\$(ip -o -4 addr show ib0 | awk \"{print \\\$4}\" | cut -d/ -f1)
-        echo \"Node IP: \$node_ip\"
-  source ./activate_env.sh $BASE_ROOTDIR
-  ray start --address ${HEAD_ADDRESS} --num-cpus=$RAY_WORKER_CPUS --node-ip-address=\$node_ip --block
- " 2>./errors/ray-workers.e &
-
-  end=$(date +%s)
-  echo ray started and connected to head node at $(expr $end - $start) seconds.
-  sleep 30
-fi
+source ./activate_env.sh $BASE_ROOTDIR
 
-srun --cpu-bind=verbose,core  --nodes=$N_SIM_NODES -x $HEAD_NODE \
-	--ntasks-per-node=$MPI_PROCESSES --cpus-per-task=1 \
-  	bash -c "
-		export OMPI_MCA_btl_tcp_if_include="ib0"
-		source ./activate_env.sh $BASE_ROOTDIR 
-		${PDI_INSTALL}/bin/pdirun ${PARFLOW_DIR}/bin/parflow ${CASE}
-	" 2>./errors/simulation.e
+python3 $BASE_ROOTDIR/scripts/run/orchestrator.py doreisa --app $APP \
+  --head-node $HEAD_NODE --sim-nodes $NODELIST --head-ip $HEAD_NODE_IP --port $PORT \
+  --ray-head-cpus $RAY_HEAD_CPUS --analytics-cpus $ANALYTICS_CPUS --worker-cpus $RAY_WORKER_CPUS \
+  --mem-log-cpus $MEM_LOG_CPUS --mpi-processes $MPI_PROCESSES --log-interval 30 --case $CASE \
+  || echo "Orchestrator failed, see ./errors/"
 
 end=$(date +%s)
-echo Simulation Finished! at $(expr $end - $start) seconds.
-
-# --------------------------------------------------------
-# 		WAIT FOR PROCESSES TO FINISH
-# --------------------------------------------------------
-echo "Waiting on analytics.."
-end=$(date +%s)
-wait $ANALYTICS_PID
-echo "Analytics Finished!"
+echo Simulation and Analytics Finished! at $(expr $end - $start) seconds.
 
 cd "$OLDPWD"
-echo "Cleaning up.."
-
-## NEVER BEING CALLED BECAUSE DOREISA FOR NOW IS AN INFINITE WHILE LOOP SO WE NEED TO MANUALLY KILL THE CLUSTER
-srun --nodes=1 --nodelist=$HEAD_NODE --ntasks=1  bash -c "
-	ray status --address='127.0.0.1:4242'
-" &
-
-sleep 40
-
-srun --nodes=1 --nodelist=$HEAD_NODE --ntasks=1  bash -c "
-	ray stop
-" &
-
-sleep 10
 
 set +xeu
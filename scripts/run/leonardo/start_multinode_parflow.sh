@@ -42,9 +42,9 @@ export PDI_INSTALL=${BASE_ROOTDIR}/pdi-$PDIV/install
 echo Launching Simulation...
 
 CASE_NAME="clayL"
-xsplit=10  # Number of MPI tasks per node along the x-axis
-ysplit=10  # Number of MPI tasks per node along the y-axis
-cells=240  # Total number of cells along each dimension per node (square problem in x and y dimensions)
+xsplit=${XSPLIT:-10}  # Number of MPI tasks per node along the x-axis
+ysplit=${YSPLIT:-10}  # Number of MPI tasks per node along the y-axis
+cells=${CELLS:-240}  # Total number of cells along each dimension per node (square problem in x and y dimensions)
 nodes=$TOTAL_NODES
 MPI_PROCESSES=$((xsplit * ysplit))
 
@@ -66,7 +66,9 @@ cp "$BASE_ROOTDIR"/scripts/run/clayL.tcl "$EXP_DIR"/clayL.tcl
 mkdir ./errors
 
 CASE=${CASE_NAME}_${xsplit}_${ysplit}_${nodes}_${cells}
-tclsh ${CASE_NAME}.tcl ${xsplit} ${ysplit} "${nodes}" ${cells}
+# any node count: the process grid is optimized for $nodes x $MPI_PROCESSES ranks
+python3 $BASE_ROOTDIR/scripts/run/clayL.py --nodes ${nodes} --ranks-per-node ${MPI_PROCESSES} --cells ${cells} \
+  --deck ${CASE_NAME}.tcl --name ${CASE}
 
 cat > "./activate_env.sh" << 'EOF'
 #!/usr/bin/env bash
@@ -81,6 +83,7 @@ EOF
 srun --cpu-bind=verbose,core --ntasks-per-node=1 --cpus-per-task=1 bash -c "
     export OMPI_MCA_btl_tcp_if_include="ib0"
     source ./activate_env.sh $BASE_ROOTDIR
+    python3 $BASE_ROOTDIR/utils/cpu-monitor.py --interval 30 &
     python3 $BASE_ROOTDIR/utils/memory-logger.py --interval 30 
 "&
 
@@ -0,0 +1,404 @@
+"""
+Experiment Orchestrator
+
+Starts the components of an in situ run (loggers, Ray head or Dask scheduler,
+analytics, Ray or Dask workers, simulation) and moves on to the next one as soon
+as a readiness probe passes, instead of sleeping for a fixed time:
+  - Ray head:        the GCS port accepts connections and the head node is alive
+  - Ray workers:     the cluster reports the expected number of nodes and CPUs
+  - Dask scheduler:  scheduler.json exists
+  - Dask workers:    the scheduler reports the expected number of workers
+  - analytics:       the driver created $ANALYTICS_READY_FILE (analytics/driver.py)
+
+Once the simulation exits $SIMULATION_DONE_FILE is created: the analytics driver
+stops on its own after the last step, or shortly after this file appears if some
+steps never arrive.
+
+Next to the Ray head, utils/ray-telemetry.py records the object store, task and
+actor states of every node (raylog_*.csv, raytasks_*.csv).
+
+The start, ready and end time of every phase is written to orchestrator-timings.json
+in the experiment directory and printed as [ORCHESTRATOR, <phase>] lines.
+
+With --launcher local everything runs on localhost without srun, which is used to
+test the orchestration with a local Ray cluster.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+BASE_ROOTDIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+READY_FILE = "analytics.ready"
+# touched once the simulation exited, lets the analytics stop if steps are missing
+DONE_FILE = "simulation.done"
+
+
+class Component:
+    """A launched process whose stderr goes to ./errors/<name>.e"""
+
+    def __init__(self, name: str, cmd: List[str], env: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.cmd = cmd
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        os.makedirs("errors", exist_ok=True)
+        stderr = open(os.path.join("errors", f"{self.name}.e"), "w")
+        env = dict(os.environ, **(self.env or {}))
+        print(f"[orchestrator] Launching {self.name}: {shlex.join(self.cmd)}", flush=True)
+        # own process group so that stop() also reaches the background children of bash -c
+        self.process = subprocess.Popen(self.cmd, stderr=stderr, env=env, start_new_session=True)
+
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, grace: float = 5.0) -> None:
+        if not self.running():
+            return
+        pgid = os.getpgid(self.process.pid)
+        os.killpg(pgid, signal.SIGTERM)
+        try:
+            self.process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            os.killpg(pgid, signal.SIGKILL)
+
+
+def wait_until(probe: Callable[[], bool], timeout: float, interval: float = 0.5, guard=None) -> bool:
+    """Poll `probe` until it returns True. Fails early if the `guard` component exited."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if probe():
+                return True
+        except Exception:
+            pass
+        if guard is not None and not guard.running():
+            print(f"[orchestrator] {guard.name} exited with code {guard.process.returncode}", flush=True)
+            return False
+        time.sleep(interval)
+    return False
+
+
+# --------------------------------------------------------
+# 			PROBES
+# --------------------------------------------------------
+
+
+def probe_tcp(host: str, port: int) -> bool:
+    with socket.create_connection((host, port), timeout=1.0):
+        return True
+
+
+def probe_ray_cluster(address: str, expected_nodes: int, expected_cpus: float) -> bool:
+    """The Ray cluster has at least the expected alive nodes and CPUs."""
+    import ray
+
+    if not ray.is_initialized():
+        host, port = address.rsplit(":", 1)
+        if not probe_tcp(host, int(port)):
+            return False
+        ray.init(address=address, logging_level="ERROR", log_to_driver=False)
+    alive = [n for n in ray.nodes() if n["Alive"]]
+    cpus = ray.cluster_resources().get("CPU", 0)
+    return len(alive) >= expected_nodes and cpus >= expected_cpus
+
+
+def probe_dask_workers(scheduler_file: str, expected_workers: int) -> bool:
+    """The Dask scheduler of scheduler_file reports the expected number of workers."""
+    if not os.path.exists(scheduler_file):
+        return False
+    from distributed import Client
+
+    with Client(scheduler_file=scheduler_file, timeout=5) as client:
+        return len(client.scheduler_info()["workers"]) >= expected_workers
+
+
+# --------------------------------------------------------
+# 			ORCHESTRATOR
+# --------------------------------------------------------
+
+
+class Orchestrator:
+    def __init__(self, args):
+        self.args = args
+        self.components: List[Component] = []
+        self.phases: List[Dict] = []
+        self.origin = time.time()
+
+    # ---- launch helpers
+
+    def srun(self, nodes: Optional[List[str]], ntasks_per_node: int, cpus_per_task: int, script: str) -> List[str]:
+        """Command running `script` with bash, through srun or locally."""
+        if self.args.launcher == "local":
+            return ["bash", "-c", script]
+        cmd = ["srun", "--cpu-bind=verbose,core", f"--cpus-per-task={cpus_per_task}"]
+        if nodes is not None:
+            cmd += [f"--nodes={len(nodes)}", f"--nodelist={','.join(nodes)}"]
+        cmd += [f"--ntasks-per-node={ntasks_per_node}", "bash", "-c", script]
+        return cmd
+
+    def phase(self, name: str, component: Optional[Component], probe: Optional[Callable[[], bool]],
+              timeout: Optional[float] = None, blocking: bool = False) -> bool:
+        """Start a component and wait for its probe (or for its exit if blocking)."""
+        start = time.time()
+        if component is not None:
+            component.start()
+            self.components.append(component)
+
+        ok = True
+        if blocking:
+            ok = component.process.wait() == 0
+        elif probe is not None:
+            ok = wait_until(probe, timeout or self.args.timeout, guard=component)
+        end = time.time()
+
+        self.phases.append({"phase": name, "start": start, "end": end, "diff": end - start, "ok": ok})
+        print(f"[ORCHESTRATOR, {name}] START: {start} END: {end} DIFF: {end - start} OK: {ok}", flush=True)
+        return ok
+
+    def save_timings(self) -> None:
+        with open("orchestrator-timings.json", "w") as f:
+            json.dump({"origin": self.origin, "phases": self.phases}, f, indent=2)
+
+    def teardown(self) -> None:
+        for component in reversed(self.components):
+            component.stop()
+        try:
+            import ray
+
+            if ray.is_initialized():
+                ray.shutdown()
+        except ImportError:
+            pass
+
+    # ---- common phases
+
+    def start_loggers(self) -> None:
+        a = self.args
+        script = (
+            f"python3 {BASE_ROOTDIR}/utils/cpu-monitor.py --interval {a.log_interval} & "
+            f"python3 {BASE_ROOTDIR}/utils/memory-logger.py --interval {a.log_interval}"
+        )
+        nodes = None if a.launcher == "local" else [a.head_node] + a.sim_nodes
+        self.phase("loggers", Component("loggers", self.srun(nodes, 1, a.mem_log_cpus, script)), None)
+
+    def run_simulation(self) -> bool:
+        a = self.args
+        if a.sim_cmd is not None:
+            script = a.sim_cmd
+        else:
+            script = (
+                "export OMPI_MCA_btl_tcp_if_include=ib0; "
+                f"{os.environ.get('PDI_INSTALL', '')}/bin/pdirun {os.environ.get('PARFLOW_DIR', '')}/bin/parflow {a.case}"
+            )
+        nodes = None if a.launcher == "local" else a.sim_nodes
+        ok = self.phase(
+            "simulation", Component("simulation", self.srun(nodes, a.mpi_processes, 1, script)), None, blocking=True
+        )
+        with open(DONE_FILE, "w") as f:
+            f.write(f"{time.time()}\n")
+        return ok
+
+    def analytics_env(self) -> Dict[str, str]:
+        """Environment telling the analytics driver about the run (see analytics/driver.py)."""
+        env = {
+            "ANALYTICS_READY_FILE": os.path.abspath(READY_FILE),
+            "SIMULATION_DONE_FILE": os.path.abspath(DONE_FILE),
+            "SIMULATION_RANKS_PER_NODE": str(self.args.mpi_processes),
+        }
+        if self.args.case is not None and os.path.exists(f"{self.args.case}.pfidb"):
+            env["PARFLOW_PFIDB"] = os.path.abspath(f"{self.args.case}.pfidb")
+        return env
+
+    def wait_analytics(self, analytics: Component) -> bool:
+        """
+        Wait for the analytics driver to exit on its own after the simulation: the driver
+        stops once its steps stop progressing (driver.run_until_done), a driver still
+        working through queued steps is not killed unless --analytics-timeout is set.
+        """
+        start = time.time()
+        try:
+            ok = analytics.process.wait(timeout=self.args.analytics_timeout) == 0
+        except subprocess.TimeoutExpired:
+            print("[orchestrator] Analytics did not exit in time, stopping it", flush=True)
+            ok = False
+        end = time.time()
+        self.phases.append({"phase": "analytics_drain", "start": start, "end": end, "diff": end - start, "ok": ok})
+        print(f"[ORCHESTRATOR, analytics_drain] START: {start} END: {end} DIFF: {end - start} OK: {ok}", flush=True)
+        return ok
+
+    # ---- workflows
+
+    def run_doreisa(self) -> bool:
+        a = self.args
+        address = f"{a.head_ip}:{a.port}"
+        n_sim = len(a.sim_nodes)
+        self.start_loggers()
+
+        # the telemetry collector shares the head task, it connects once the head is up
+        head_script = (
+            "ulimit -n 65535 || true; export OPENBLAS_NUM_THREADS=1; "
+            f"python3 {BASE_ROOTDIR}/utils/ray-telemetry.py --address {address} --interval {a.log_interval} "
+            "2>./errors/ray-telemetry.e & "
+            f"ray start --head --num-cpus=1 --node-ip-address={a.head_ip} --port={a.port} "
+            "--disable-usage-stats --block"
+        )
+        head = Component("ray-head", self.srun(self.head_nodes(), 1, a.ray_head_cpus, head_script))
+        if not self.phase("ray_head", head, lambda: probe_ray_cluster(address, 1, 1)):
+            return False
+
+        analytics_script = a.analytics_cmd or f"python3 {BASE_ROOTDIR}/analytics/pressure-doreisa-{a.app}.py"
+        analytics = Component(
+            "pressure-doreisa",
+            self.srun(self.head_nodes(), 1, a.analytics_cpus, analytics_script),
+            env=self.analytics_env(),
+        )
+        if not self.phase("analytics", analytics, lambda: os.path.exists(READY_FILE)):
+            return False
+
+        worker_script = (
+            "ulimit -n 65535 || true; export OMPI_MCA_btl_tcp_if_include=ib0; export OPENBLAS_NUM_THREADS=1; "
+            + (
+                # one emulated simulation node per local Ray node
+                f"for i in $(seq {n_sim}); do ray start --address {address} --num-cpus={a.worker_cpus} --block & done; wait"
+                if a.launcher == "local"
+                else "node_ip=$(ip -o -4 addr show ib0 | awk '{print $4}' | cut -d/ -f1); "
+                f"ray start --address {address} --num-cpus={a.worker_cpus} --node-ip-address=$node_ip --block"
+            )
+        )
+        workers = Component(
+            "ray-workers", self.srun(None if a.launcher == "local" else a.sim_nodes, 1, a.worker_cpus, worker_script)
+        )
+        expected_cpus = 1 + n_sim * a.worker_cpus
+        if not self.phase("ray_workers", workers, lambda: probe_ray_cluster(address, 1 + n_sim, expected_cpus)):
+            return False
+
+        import ray
+
+        ray.shutdown()
+
+        ok = self.run_simulation()
+        return self.wait_analytics(analytics) and ok
+
+    def run_deisa(self) -> bool:
+        a = self.args
+        n_sim = len(a.sim_nodes)
+        self.start_loggers()
+
+        scheduler = Component(
+            "scheduler",
+            self.srun(self.head_nodes(), 1, a.ray_head_cpus, f"dask scheduler --scheduler-file ./{a.scheduler_file}"),
+        )
+        if not self.phase("dask_scheduler", scheduler, lambda: os.path.exists(a.scheduler_file)):
+            return False
+
+        analytics_script = a.analytics_cmd or (
+            f"python3 {BASE_ROOTDIR}/analytics/pressure-deisa-insitu-{a.app}.py "
+            f"{n_sim} {a.scheduler_file} {a.mpi_processes} {os.getcwd()}"
+        )
+        analytics = Component(
+            "pressure-deisa",
+            self.srun(self.head_nodes(), 1, a.analytics_cpus, analytics_script),
+            env=self.analytics_env(),
+        )
+        # Deisa waits for its workers itself: the analytics are ready once they are launched
+        self.phase("analytics", analytics, None)
+
+        worker_script = (
+            f"dask worker --worker-port 2000 --scheduler-file ./{a.scheduler_file} "
+            f"--local-directory ./workers --nworkers 1 --nthreads {a.worker_cpus}"
+        )
+        workers = Component(
+            "dask-workers", self.srun(None if a.launcher == "local" else a.sim_nodes, 1, a.worker_cpus, worker_script)
+        )
+        if not self.phase("dask_workers", workers, lambda: probe_dask_workers(a.scheduler_file, n_sim)):
+            return False
+
+        ok = self.run_simulation()
+        return self.wait_analytics(analytics) and ok
+
+    def head_nodes(self) -> Optional[List[str]]:
+        return None if self.args.launcher == "local" else [self.args.head_node]
+
+    def run(self) -> bool:
+        try:
+            ok = self.run_doreisa() if self.args.framework == "doreisa" else self.run_deisa()
+        finally:
+            self.teardown()
+            if self.args.framework == "doreisa":
+                start = time.time()
+                stop_cmd = self.srun(self.head_nodes(), 1, 1, "ray stop")
+                subprocess.run(stop_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                end = time.time()
+                self.phases.append({"phase": "teardown", "start": start, "end": end, "diff": end - start, "ok": True})
+            self.save_timings()
+        return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Launch an in situ experiment with readiness probes")
+    parser.add_argument("framework", choices=["doreisa", "deisa"], help="Analytics framework")
+    parser.add_argument("--app", default="avg", choices=["avg", "derivative", "toy", "pyramid"], help="Analytics to run")
+    parser.add_argument("--launcher", choices=["slurm", "local"], default="slurm", help="Launch with srun or locally")
+    parser.add_argument("--exp-dir", default=".", help="Experiment directory (default: current directory)")
+    parser.add_argument("--head-node", default=None, help="Head node hostname (slurm)")
+    parser.add_argument("--sim-nodes", default=None, help="Comma-separated simulation nodes (slurm)")
+    parser.add_argument("--num-sim-nodes", type=int, default=1, help="Number of emulated simulation nodes (local)")
+    parser.add_argument("--head-ip", default=None, help="IP of the Ray head (default: 127.0.0.1 locally)")
+    parser.add_argument("--port", type=int, default=4242, help="Ray head port (default: 4242)")
+    parser.add_argument("--scheduler-file", default="scheduler.json", help="Dask scheduler file")
+    parser.add_argument("--ray-head-cpus", type=int, default=55, help="CPUs of the Ray head / Dask scheduler task")
+    parser.add_argument("--analytics-cpus", type=int, default=56, help="CPUs of the analytics driver task")
+    parser.add_argument("--worker-cpus", type=int, default=11, help="CPUs of each Ray / Dask worker")
+    parser.add_argument("--mem-log-cpus", type=int, default=1, help="CPUs of the loggers")
+    parser.add_argument("--mpi-processes", type=int, default=100, help="MPI ranks per simulation node")
+    parser.add_argument("--log-interval", type=int, default=30, help="Interval of the memory and CPU loggers")
+    parser.add_argument("--case", default=None, help="ParFlow case name (clayL_<x>_<y>_<nodes>_<cells>)")
+    parser.add_argument("--analytics-cmd", default=None, help="Override the analytics command (shell)")
+    parser.add_argument("--sim-cmd", default=None, help="Override the simulation command (shell)")
+    parser.add_argument("--timeout", type=float, default=300, help="Timeout of each readiness probe (seconds)")
+    parser.add_argument(
+        "--analytics-timeout",
+        type=float,
+        default=None,
+        help="Max time left to the analytics to exit after the simulation (default: no limit, the driver stops "
+        "once its steps stop progressing)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.launcher == "local":
+        args.head_node = socket.gethostname()
+        args.sim_nodes = [f"local{i}" for i in range(args.num_sim_nodes)]
+        args.head_ip = args.head_ip or "127.0.0.1"
+    else:
+        if args.head_node is None or args.sim_nodes is None or args.head_ip is None:
+            parser.error("--head-node, --sim-nodes and --head-ip are required with --launcher slurm")
+        args.sim_nodes = args.sim_nodes.split(",")
+    if args.case is None and args.sim_cmd is None:
+        parser.error("--case is required unless --sim-cmd is given")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.chdir(args.exp_dir)
+    for path in (READY_FILE, DONE_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+    ok = Orchestrator(args).run()
+    print(f"[orchestrator] {'Done' if ok else 'FAILED'}", flush=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
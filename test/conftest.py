@@ -0,0 +1,30 @@
+import contextlib
+import importlib.util
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def isolated_client(tmp_path):
+    """A client of one worker process that cannot import analytics/, like the Deisa workers."""
+    distributed = pytest.importorskip("distributed")
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONPATH"}
+    with contextlib.ExitStack() as stack:
+        cluster = stack.enter_context(
+            distributed.LocalCluster(
+                n_workers=0, processes=False, protocol="tcp", host="127.0.0.1", dashboard_address=None
+            )
+        )
+        command = [sys.executable, "-m", "distributed.cli.dask_worker", cluster.scheduler_address, "--nthreads", "1"]
+        worker = subprocess.Popen(
+            command + ["--no-dashboard"], cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        stack.callback(worker.wait)
+        stack.callback(worker.terminate)
+        client = stack.enter_context(distributed.Client(cluster))
+        client.wait_for_workers(1, timeout=60)
+        assert not any(client.run(lambda: importlib.util.find_spec("sketches") is not None).values())
+        yield client
@@ -0,0 +1,62 @@
+import csv
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+BENCH_PATH = os.path.abspath("./utils/analytics-bench.py")
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import kernels  # noqa: E402
+
+
+def load_bench():
+    spec = importlib.util.spec_from_file_location("analytics_bench", BENCH_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_step_array_matches_clayL_chunking():
+    bench = load_bench()
+    assert bench.process_grid(100) == (10, 10)
+    assert bench.process_grid(6) == (3, 2)
+
+    leaves = [np.full((4, 4, 8), float(r)) for r in range(6)]
+    array = bench.step_array("pressures-0", leaves, 3, 2, 4, 8)
+    assert array.shape == (12, 8, 8)
+    assert array.chunks == ((4, 4, 4), (4, 4), (8,))
+    # chunk (i, j) belongs to rank i * Q + j
+    assert array[4:8, 4:8, :].compute().max() == 3.0
+
+
+def test_kernels_match_numpy():
+    bench = load_bench()
+    rng = np.random.default_rng(0)
+    steps = [rng.uniform(size=(8, 8, 4)) for _ in range(3)]
+    window = [bench.step_array(f"p{t}", [s[i * 4 : i * 4 + 4, j * 4 : j * 4 + 4] for i in range(2) for j in range(2)], 2, 2, 4, 4) for t, s in enumerate(steps)]
+
+    assert np.isclose(kernels.avg(window[:1]).compute(), steps[0].mean())
+    assert np.isclose(kernels.derivative(window).compute(), ((steps[2] - steps[0]) / 4).mean())
+    assert np.allclose(kernels.deisa_avg(window).compute(), [s.mean() for s in steps])
+    assert np.isclose(kernels.deisa_derivative(window).compute(), ((steps[2] - steps[0]) / 4).mean())
+
+
+def test_sweep_writes_timings_plotter_columns(tmp_path):
+    bench = load_bench()
+    results = bench.run_sweep(
+        ["avg", "toy"], ["threads"], [1, 2], [4, 6], [4], nz=8, steps=2, runs=2, output_dir=str(tmp_path)
+    )
+    assert set(results) == {(k, "threads", w) for k in ["avg", "toy"] for w in [1, 2]}
+
+    with open(tmp_path / "toy_threads_2w" / "experiment-timings.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 4
+    assert [r["experiment_id"] for r in rows] == ["0", "0", "1", "1"]
+    assert [r["num_ranks"] for r in rows] == ["4", "4", "6", "6"]
+    for r in rows:
+        assert r["num_steps"] == "2"
+        assert float(r["avg_graph_compute_time"]) > 0
+        total = 2 * (float(r["avg_graph_formation_time"]) + float(r["avg_graph_compute_time"]))
+        assert np.isclose(float(r["total_analytics_time"]), total)
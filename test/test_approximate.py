@@ -0,0 +1,75 @@
+import os
+import sys
+
+import dask
+import dask.array as da
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import approximate  # noqa: E402
+
+
+def field(P=8, Q=8, cells=6, nz=80, seed=0):
+    """A layered column with noise and a lateral trend, published as P x Q chunks."""
+    rng = np.random.default_rng(seed)
+    values = (np.linspace(-6, 0, nz)[None, None, :] + 0.05 * rng.standard_normal((P * cells, Q * cells, nz))
+              + 0.2 * np.sin(np.arange(P * cells) / 7)[:, None, None])
+    name = f"pressures-{P}-{seed}"
+    chunks = {(name, p, q, 0): values[p * cells : (p + 1) * cells, q * cells : (q + 1) * cells] for p in range(P)
+              for q in range(Q)}
+    return values, da.Array(chunks, name, chunks=((cells,) * P, (cells,) * Q, (nz,)), dtype=float)
+
+
+def test_estimates_are_within_their_bounds():
+    values, array = field()
+    exact = {"mean": values.mean(), "std": values.std(), "p50": np.median(values), "p99": np.quantile(values, 0.99)}
+    with dask.config.set(scheduler="sync"):
+        for statistic, rel_error in [("mean", 3e-3), ("std", 3e-3), ("p50", 1e-3), ("p99", 1e-3)]:
+            hits = 0
+            for seed in range(10):
+                estimate = approximate.approximate(array, statistic, rel_error, ranks_per_node=16, seed=seed)
+                assert estimate.sampled < estimate.units == 8 * 8 * approximate.DEPTH_LAYERS
+                # the quantiles are known within a bin at best
+                bin_width = np.diff(approximate.QUANTILE_EDGES).max() if statistic[0] == "p" else 0
+                assert estimate.half_width <= max(rel_error * abs(estimate.value), bin_width) + 1e-12
+                hits += estimate.low <= exact[statistic] <= estimate.high
+            assert hits >= 8
+
+        # everything is read for an unreachable bound
+        estimate = approximate.approximate(array, "mean", 1e-9)
+        assert estimate.sampled == estimate.units and np.isclose(estimate.value, values.mean())
+        assert estimate.half_width == 0
+
+    with pytest.raises(ValueError):
+        approximate.approximate(array, "max")
+
+
+def test_cost_follows_the_precision():
+    with dask.config.set(scheduler="sync"):
+        sampled = {}
+        for P in (8, 16):
+            _, array = field(P, P)
+            for rel_error in (1e-2, 3e-3):
+                sampled[P, rel_error] = approximate.approximate(array, "mean", rel_error, ranks_per_node=2 * P).sampled
+    assert sampled[8, 3e-3] > 2 * sampled[8, 1e-2]
+    # 4 times the chunks, not 4 times the reads
+    assert sampled[16, 3e-3] < 3 * sampled[8, 3e-3]
+
+
+def test_only_the_sampled_slabs_are_read():
+    _, array = field(4, 4, nz=40)
+    units = approximate.sampling_units(array.chunks, layers=4, ranks_per_node=8)
+    # 2 nodes x 4 depth layers, 8 chunks each
+    assert len(units) == 64 and len({u[0] for u in units}) == 8
+    assert {(u[2].start, u[2].stop) for u in units} == {(0, 10), (10, 20), (20, 30), (30, 40)}
+
+    chosen = [units[0], units[3], units[40]]
+    sample = approximate.sample_graph(array, chosen)
+    graph = dict(sample.__dask_graph__())
+    stats = [key for key in graph if key[0].startswith("stats-")]
+    # one task per chunk read, one output for the whole round
+    assert sorted(key[1:] for key in stats) == sorted({chosen[0][1], chosen[2][1]})
+    gathered = sample.compute(scheduler="sync")
+    assert gathered[chosen[0][1]].shape == (2, 2)
@@ -0,0 +1,48 @@
+import importlib.util
+import os
+
+BENCH_PATH = os.path.abspath("./utils/bench-tools.py")
+
+
+def load_bench():
+    spec = importlib.util.spec_from_file_location("bench_tools", BENCH_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_synthetic_experiments_are_parsed_by_the_tools(tmp_path):
+    bench = load_bench()
+    exp_dirs = [bench.generate_experiment(tmp_path / "experiments", 16, 4, 2, 50, config_id=i, seed=i) for i in range(2)]
+
+    process_timings = bench.load_tool("process-timings")
+    processor = process_timings.BatchExperimentProcessor(str(tmp_path / "experiments"))
+    processor.process_all_experiments()
+    assert [(r.experiment_id, r.num_ranks, r.num_steps) for r in processor.results] == [(0, 16, 4), (1, 16, 4)]
+    assert all(r.avg_graph_compute_time is not None for r in processor.results)
+
+    rows = bench.run_benchmarks(16, 4, 2, mem_samples=50, runs=2, repeat=1, workdir=str(tmp_path / "bench"))
+    phases = {(r["tool"], r["phase"]) for r in rows}
+    assert phases == {
+        ("process-timings", "parse"),
+        ("process-timings", "aggregate"),
+        ("timeline-plotter", "parse"),
+        ("timeline-plotter", "plot"),
+        ("memory-plotter", "parse"),
+        ("memory-plotter", "aggregate"),
+        ("memory-plotter", "plot"),
+    }
+    assert all(r["seconds"] >= 0 and r["peak_mb"] is not None for r in rows)
+
+    results = tmp_path / "results.csv"
+    bench.save_results(rows, str(results), "abc1234", "baseline")
+    assert bench.compare_results(rows, bench.load_results(str(results)), "baseline", threshold=10.0)
+    assert exp_dirs[0].name.endswith("_0")
+
+
+def test_timeline_plotter_handles_more_steps_than_colors(tmp_path):
+    bench = load_bench()
+    exp_dir = bench.generate_experiment(tmp_path / "experiments", 4, 12, 1, 10)
+    results = bench.bench_timeline_plotter(exp_dir, repeat=1, memory=False, workdir=str(tmp_path))
+    assert set(results) == {"parse", "plot"}
+    assert os.path.exists(tmp_path / "timeline.html")
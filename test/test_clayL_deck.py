@@ -0,0 +1,68 @@
+import importlib.util
+import os
+import re
+import sys
+
+DECK_PATH = os.path.abspath("./scripts/run/clayL.py")
+TCL_PATH = os.path.abspath("./scripts/run/clayL.tcl")
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import driver  # noqa: E402
+
+
+def load_deck():
+    spec = importlib.util.spec_from_file_location("clayL_deck", DECK_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_square_node_counts_match_clayL_tcl():
+    deck = load_deck()
+    # clayL.tcl 10 10 4 240: P = Q = 10 * sqrt(4), NX = NY = 480
+    nx, ny = deck.weak_scaling_grid(4, 240)
+    assert (nx, ny) == (480, 480)
+    best = deck.rank_decompositions(nx, ny, 240, 4 * 100)[0]
+    assert (best.P, best.Q, best.R) == (20, 20, 1)
+    assert best.local == (24, 24, 240)
+    assert best.imbalance == 0
+    # 4 faces of 24 x 240 ghost cells, float64
+    assert deck.halo_bytes(best) == 4 * 24 * 240 * 8
+
+
+def test_non_square_node_counts_keep_cubic_columns():
+    deck = load_deck()
+    for nodes in [2, 3, 5, 6]:
+        nx, ny = deck.weak_scaling_grid(nodes, 240)
+        assert nx * ny == nodes * 240 * 240
+        best = deck.rank_decompositions(nx, ny, 240, nodes * 100)[0]
+        assert best.local == (24, 24, 240), nodes
+        assert best.imbalance == 0
+
+
+def test_uneven_ranks_minimize_imbalance_and_halo():
+    deck = load_deck()
+    candidates = deck.rank_decompositions(240, 240, 240, 112)
+    best = candidates[0]
+    assert best.P * best.Q == 112
+    assert best.cost == min(c.cost for c in candidates)
+    # the most elongated split is never chosen
+    assert (best.P, best.Q) not in [(1, 112), (112, 1)]
+
+
+def test_pfidb_has_the_keys_of_the_tcl_deck(tmp_path):
+    deck = load_deck()
+    best = deck.rank_decompositions(480, 240, 240, 200)[0]
+    keys = deck.deck_keys(480, 240, 240, best)
+    deck.write_pfidb(str(tmp_path / "clayL_2.pfidb"), keys)
+
+    with open(TCL_PATH) as f:
+        tcl_keys = set(re.findall(r"^pfset\s+(\S+)", f.read(), re.M))
+    read = driver.read_pfidb(str(tmp_path / "clayL_2.pfidb"))
+    assert set(read) == tcl_keys
+    assert read["Process.Topology.P"] == "20" and read["Process.Topology.Q"] == "10"
+    assert read["Geom.domain.Upper.X"] == "480.0"
+    assert read["GeomInput.Names"] == "domain_input"
+    assert read["Geom.domain.Patches"] == "left right front back bottom top"
+    assert read["Contaminants.Names"] == ""
+    assert driver.count_iterations(read) == 10
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import dask
+import dask.array as da
+import numpy as np
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import consolidate  # noqa: E402
+import graph_cache  # noqa: E402
+import kernels  # noqa: E402
+
+
+def step(t, P=4, Q=6, cells=3, nz=2):
+    """One published step of a P x Q decomposition, chunk (p, q) holding t * (1 + rank)."""
+    name = f"pressures-{t}"
+    chunks = {
+        (name, p, q, 0): np.full((cells, cells, nz), t * (1.0 + q * P + p)) for p in range(P) for q in range(Q)
+    }
+    return da.Array(chunks, name, chunks=((cells,) * P, (cells,) * Q, (nz,)), dtype=float)
+
+
+def test_plan_keeps_blocks_within_a_node():
+    assert consolidate.node_block(4, 6, 8) == (4, 2)
+    assert consolidate.node_block(8, 6, 4) == (4, 1)
+    assert consolidate.node_block(4, 6, 3) is None
+    assert consolidate.node_block(4, 6, None) is None
+
+    assert consolidate.plan_factors((4, 6, 1), 6, (4, 2)) == (2, 2, 1)
+    # 24 chunks for 4 workers, at most one node (4 x 2 chunks) per block
+    factors = consolidate.plan_factors((4, 6, 1), 4, (4, 2))
+    assert 4 % factors[0] == 0 and 2 % factors[1] == 0
+    assert consolidate.plan_factors((4, 6, 1), 100) == (1, 1, 1)
+
+
+def test_adjacent_views_are_merged_without_copy():
+    buffer = np.arange(4 * 6 * 2, dtype=float).reshape(4, 6, 2)
+    views = [[[buffer[:2, :3]], [buffer[:2, 3:]]], [[buffer[2:, :3]], [buffer[2:, 3:]]]]
+    merged = consolidate.merge_blocks(views)
+    assert np.shares_memory(merged, buffer) and not merged.flags.writeable
+    assert np.array_equal(merged, buffer)
+
+    copies = [[[buffer[:2, :3].copy()], [buffer[:2, 3:].copy()]]]
+    merged = consolidate.merge_blocks(copies)
+    assert not np.shares_memory(merged, buffer) and np.array_equal(merged, buffer[:2])
+
+
+def test_consolidated_kernels_match_and_cut_tasks():
+    window = [step(t) for t in range(3)]
+    for fn in [kernels.avg, kernels.derivative, kernels.toy]:
+        merged = consolidate.consolidated(fn, 4, ranks_per_node=8)
+        assert np.allclose(dask.compute(merged(window))[0], dask.compute(fn(window))[0]), fn.__name__
+
+    array = consolidate.consolidate(window[0], (4, 2, 1))
+    assert array.numblocks == (1, 3, 1)
+    assert np.array_equal(array.compute(), window[0].compute())
+    assert len(dict(array.sum().__dask_graph__())) < len(dict(window[0].sum().__dask_graph__()))
+
+
+def test_consolidation_is_part_of_the_cached_graph():
+    cache = graph_cache.GraphCache(consolidate.consolidated(kernels.derivative, lambda: 3, ranks_per_node=8))
+    for t in range(2, 5):
+        window = [step(s) for s in range(t - 2, t + 1)]
+        assert np.isclose(graph_cache.compute(cache(window)), dask.compute(kernels.derivative(window))[0])
+    assert (cache.misses, cache.hits) == (1, 2)
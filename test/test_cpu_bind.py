@@ -0,0 +1,25 @@
+import importlib.util
+import os
+
+import numpy as np
+
+
+def load_tool(name):
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.abspath(f"./utils/{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_stream_kernels_report_every_bandwidth():
+    bind = load_tool("test-cpu-bind")
+    n = 3 * bind.TRIAD_BLOCK + 5
+    a, b, c = np.full(n, 1.0), np.full(n, 2.0), np.zeros(n)
+    bandwidth = bind.stream_kernels(a, b, c, duration=0.05)
+    assert set(bandwidth) == {"copy", "scale", "add", "triad"}
+    assert all(value > 0 for value in bandwidth.values())
+
+    # the blocked triad covers the whole array, the partial last block included
+    b, c = np.arange(n, dtype=float), np.full(n, 2.0)
+    bind.triad(a, b, c, 3.0)
+    assert np.array_equal(a, b + 3.0 * c)
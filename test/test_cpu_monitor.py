@@ -0,0 +1,67 @@
+import importlib.util
+import os
+from collections import namedtuple
+
+CtxSwitches = namedtuple("CtxSwitches", ["voluntary", "involuntary"])
+
+
+def load_tool(name):
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.abspath(f"./utils/{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_thread(proc_root, pid, tid, state, processor, migrations=None, comm="python3 worker"):
+    """/proc/<pid>/task/<tid>/stat (processor is field 39) and sched, as written by the kernel."""
+    task = proc_root / str(pid) / "task" / str(tid)
+    task.mkdir(parents=True, exist_ok=True)
+    fields = [state] + ["0"] * 35 + [str(processor)] + ["0"] * 13
+    (task / "stat").write_text(f"{tid} ({comm}) {' '.join(fields)}\n")
+    if migrations is not None:
+        (task / "sched").write_text(f"{comm} ({tid}, #threads: 2)\nse.exec_start : 1.0\nse.nr_migrations : {migrations}\n")
+
+
+class FakeProcess:
+    def __init__(self, pid, ctx):
+        self.pid = pid
+        self.ctx = ctx
+
+    def num_ctx_switches(self):
+        return self.ctx
+
+
+def test_read_threads_parses_proc(tmp_path):
+    monitor = load_tool("cpu-monitor")
+    # a command name with spaces and a parenthesis, and a thread without scheduler statistics
+    write_thread(tmp_path, 42, 42, "R", 3, migrations=7, comm="ray::Worker) x")
+    write_thread(tmp_path, 42, 43, "S", 12)
+    (tmp_path / "42" / "task" / "44").mkdir()
+    assert monitor.read_threads(42, str(tmp_path)) == {42: ("R", 3, 7), 43: ("S", 12, None)}
+
+
+def test_tracker_reports_migrations_and_oversubscription_per_interval(tmp_path):
+    monitor = load_tool("cpu-monitor")
+    tracker = monitor.ProcessTracker(str(tmp_path))
+    process = FakeProcess(42, CtxSwitches(100, 10))
+    write_thread(tmp_path, 42, 42, "R", 0, migrations=5)
+    write_thread(tmp_path, 42, 43, "R", 1)
+    # first sample: no previous counters
+    assert tracker.sample(process) == (0, 0, 0, 2)
+
+    # thread 42: 3 more migrations of the kernel counter, thread 43 moved to another CPU,
+    # thread 44 is new (not counted)
+    process.ctx = CtxSwitches(130, 14)
+    write_thread(tmp_path, 42, 42, "R", 2, migrations=8)
+    write_thread(tmp_path, 42, 43, "R", 5)
+    write_thread(tmp_path, 42, 44, "R", 1)
+    migrations, voluntary, involuntary, runnable = tracker.sample(process)
+    assert (migrations, voluntary, involuntary, runnable) == (4, 30, 4, 3)
+
+    # 3 runnable threads on 2 CPUs, 1 on 4 CPUs
+    cpusets = {frozenset({0, 1}): runnable, frozenset({2, 3, 4, 5}): 1}
+    assert monitor.oversubscribed(cpusets) == [(frozenset({0, 1}), 3)]
+    assert monitor.format_cpuset({5, 1, 3}) == "1 3 5"
+
+    tracker.forget(set())
+    assert tracker.prev_threads == {} and tracker.prev_ctx == {}
@@ -0,0 +1,56 @@
+import importlib.util
+
+spec = importlib.util.spec_from_file_location("cpu_planner", "./utils/cpu-planner.py")
+cpu_planner = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cpu_planner)
+
+
+def make_sysfs(root, sockets=2, numa_per_socket=2, cores_per_numa=8, smt=2):
+    """Fake /sys/devices/system tree; SMT siblings are numbered after all first threads."""
+    physical = sockets * numa_per_socket * cores_per_numa
+    (root / "cpu").mkdir(parents=True)
+    (root / "cpu" / "online").write_text(f"0-{physical * smt - 1}\n")
+    for numa in range(sockets * numa_per_socket):
+        first = numa * cores_per_numa
+        cores = list(range(first, first + cores_per_numa))
+        node_cpus = [c + t * physical for t in range(smt) for c in cores]
+        node_dir = root / "node" / f"node{numa}"
+        node_dir.mkdir(parents=True)
+        node_dir.joinpath("cpulist").write_text(cpu_planner.format_cpu_list(node_cpus))
+        for cpu in node_cpus:
+            core = cpu % physical
+            base = root / "cpu" / f"cpu{cpu}"
+            (base / "topology").mkdir(parents=True)
+            (base / "cache" / "index3").mkdir(parents=True)
+            (base / "topology" / "physical_package_id").write_text(str(numa // numa_per_socket))
+            (base / "topology" / "core_id").write_text(str(core))
+            (base / "topology" / "thread_siblings_list").write_text(f"{core},{core + physical}")
+            (base / "cache" / "index3" / "shared_cpu_list").write_text(cpu_planner.format_cpu_list(node_cpus))
+    return str(root)
+
+
+def test_cpu_list_round_trip():
+    assert cpu_planner.parse_cpu_list("0-3,8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+    assert cpu_planner.format_cpu_list([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+
+
+def test_components_start_on_separate_domains(tmp_path):
+    """With spare cores, the analytics components do not share a NUMA domain with ParFlow."""
+    cpus = cpu_planner.read_topology(make_sysfs(tmp_path))
+    assert len(cpus) == 64
+
+    plan = cpu_planner.plan_partition(cpus, [("memory_logger", 1), ("ray_worker", 7), ("parflow", 16)])
+    numa_of = {c.cpu: c.numa for c in cpus}
+
+    assert len(plan["parflow"]) == 16
+    assert {numa_of[c] for c in plan["ray_worker"]}.isdisjoint({numa_of[c] for c in plan["parflow"]})
+    assert {numa_of[c] for c in plan["memory_logger"]}.isdisjoint({numa_of[c] for c in plan["parflow"]})
+    # SMT siblings are not used by default
+    assert all(c < 32 for cpus_ in plan.values() for c in cpus_)
+
+
+def test_rest_takes_remaining_cores(tmp_path):
+    cpus = cpu_planner.read_topology(make_sysfs(tmp_path))
+    plan = cpu_planner.plan_partition(cpus, [("memory_logger", 1), ("ray_worker", 3), ("parflow", None)])
+    assert len(plan["parflow"]) == 28
+    assert len(set(sum(plan.values(), []))) == 32
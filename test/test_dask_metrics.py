@@ -0,0 +1,86 @@
+import csv
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+
+def load_tool(name):
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.abspath(f"./utils/{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_plugin_records_tasks_by_timestep(tmp_path):
+    distributed = pytest.importorskip("distributed")
+    import dask
+    import dask.array as da
+
+    import dask_metrics
+    import graph_opt
+
+    with distributed.LocalCluster(n_workers=2, threads_per_worker=1, dashboard_address=None) as cluster:
+        with distributed.Client(cluster) as client:
+            dask_metrics.install(client)
+            workers = list(client.scheduler_info()["workers"])
+            chunks = {
+                ("global_pressure", t, r, 0, 0): client.scatter(np.full((1, 4, 4, 4), float(t)), workers=[workers[r]])
+                for t in range(3)
+                for r in range(2)
+            }
+            p = da.Array(chunks, "global_pressure", chunks=((1,) * 3, (4, 4), (4,), (4,)), dtype=float)
+
+            dask_metrics.set_phase(client, "derivative")
+            # as in the Deisa scripts, the published keys must survive optimization to be tagged
+            with dask.config.set(array_optimize=graph_opt.optimize):
+                assert ((p[2:] - p[:-2]) / 4).mean().compute() == 0.5
+            dask_metrics.dump(client, str(tmp_path / dask_metrics.METRICS_FILE))
+
+    columns = dask_metrics.load(str(tmp_path / dask_metrics.METRICS_FILE))
+    assert set(columns) == set(dask_metrics.COLUMNS)
+    assert set(columns["phase"]) == {"derivative"}
+    assert {"assign", "compute"} <= set(columns["action"])
+    # the chunks of step 1 are not needed, the aggregate depends on step 2
+    assert set(columns["timestep"]) == {0, 2}
+    assert all(columns["stop"] >= columns["start"])
+
+
+def test_process_timings_reports_task_metrics(tmp_path):
+    bench = load_tool("bench-tools")
+    exp_dir = bench.generate_experiment(tmp_path / "experiments", 4, 3, 1, 10, config_id=0, seed=0)
+
+    def row(key, step, action, start, stop, nbytes=0, local=0, remote=0):
+        return (key, step, "compute", "tcp://w0", action, start, stop, nbytes, local, remote)
+
+    rows = [
+        row("a", 0, "assign", 0.0, 0.0, local=300, remote=100),
+        row("a", 0, "transfer", 1.0, 1.5, nbytes=100),
+        row("a", 0, "compute", 2.0, 3.0, nbytes=8),
+        row("b", 1, "assign", 0.0, 0.0, local=100),
+        row("b", 1, "compute", 0.25, 1.0, nbytes=8),
+        row("b", 1, "disk-write", 1.0, 1.1, nbytes=64),
+    ]
+    names = ["key", "timestep", "phase", "worker", "action", "start", "stop", "nbytes", "local_nbytes", "remote_nbytes"]
+    np.savez(exp_dir / "dask-metrics.npz", **{name: np.asarray(values) for name, values in zip(names, zip(*rows))})
+
+    process_timings = load_tool("process-timings")
+    processor = process_timings.BatchExperimentProcessor(str(tmp_path / "experiments"))
+    processor.process_all_experiments()
+    output = tmp_path / "timings.csv"
+    processor.save_results_to_csv(str(output))
+
+    with open(output) as f:
+        (result,) = list(csv.DictReader(f))
+    # a: 2.0 - 0.0 - 0.5 of transfer, b: 0.25
+    assert float(result["avg_scheduler_overhead"]) == pytest.approx(0.875)
+    assert float(result["avg_scheduler_overhead_step_0"]) == pytest.approx(1.5)
+    assert float(result["locality_hit_rate"]) == pytest.approx(0.8)
+    assert float(result["locality_hit_rate_step_1"]) == 1.0
+    assert float(result["transfer_bytes_step_0"]) == 100
+    assert float(result["spill_bytes"]) == 64
+    assert result["avg_graph_compute_time"] != ""
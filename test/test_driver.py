@@ -0,0 +1,129 @@
+import os
+import subprocess
+import sys
+
+ANALYTICS_DIR = os.path.abspath("./analytics")
+sys.path.insert(0, ANALYTICS_DIR)
+
+import driver  # noqa: E402
+import results_store  # noqa: E402
+
+
+def write_pfidb(path, keys):
+    lines = [str(len(keys))]
+    for key, value in keys.items():
+        lines += [str(len(key)), key, str(len(value)), value]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_iterations_are_read_from_the_clayL_database(tmp_path, monkeypatch):
+    pfidb = tmp_path / "clayL_10_10_4_240.pfidb"
+    write_pfidb(
+        pfidb,
+        {
+            "Process.Topology.P": "20",
+            "TimingInfo.StartTime": "0.0",
+            "TimingInfo.StopTime": "9.0",
+            "TimingInfo.DumpInterval": "1.0",
+            "TimeStep.Type": "Constant",
+            "TimeStep.Value": "1.",
+            "Solver.Nonlinear.PrintFlag": "LowVerbosity",
+        },
+    )
+    assert driver.read_pfidb(str(pfidb))["Process.Topology.P"] == "20"
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(driver.ITERATIONS_ENV, raising=False)
+    monkeypatch.delenv(driver.PFIDB_ENV, raising=False)
+    # former hard-coded max_iterations=10 / last timestep 9
+    assert driver.simulation_iterations() == 10
+
+    monkeypatch.setenv(driver.ITERATIONS_ENV, "25")
+    assert driver.simulation_iterations() == 25
+
+
+def test_analytics_stop_when_the_simulation_ended_early(tmp_path):
+    """A driver still waiting for steps after the simulation exited flushes its timings and exits."""
+    done = tmp_path / "simulation.done"
+    done.write_text("0\n")
+    store = tmp_path / "analytics-results.bin"
+    script = (
+        f"import sys, time; sys.path.insert(0, {ANALYTICS_DIR!r}); import driver, results_store; "
+        f"store = results_store.ResultStore({str(store)!r}); store.timing(0, results_store.GRAPH, 0.0, 1.0); "
+        "driver.run_until_done(lambda: time.sleep(60), lambda: driver.report_results(store), grace=0.5)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env={**os.environ, driver.DONE_FILE_ENV: str(done)},
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+    assert result.returncode == 1
+    assert f"RESULTS: {store} RECORDS: 1" in result.stdout
+    records, names = results_store.read_store(str(store))
+    assert results_store.timings(records, names, results_store.GRAPH) == [(0.0, 1.0, 1.0)]
+
+
+def test_analytics_catching_up_after_the_simulation_ended_are_not_stopped(tmp_path):
+    """Steps still completing after the simulation exited restart the grace period."""
+    done = tmp_path / "simulation.done"
+    done.write_text("0\n")
+    script = (
+        f"import sys, time; sys.path.insert(0, {ANALYTICS_DIR!r}); import driver; steps = []; "
+        "callback = driver.track_progress(lambda timestep: (time.sleep(0.3), steps.append(timestep))); "
+        "driver.run_until_done(lambda: [callback(timestep=t) for t in range(8)], "
+        "lambda: print('STEPS', len(steps)), grace=0.5)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env={**os.environ, driver.DONE_FILE_ENV: str(done)},
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+    # 8 steps of 0.3 s, well after the grace period of 0.5 s
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "STEPS 8" in result.stdout and "stopping" not in result.stdout
+
+
+def test_quantities_follow_the_shared_arrays_of_the_database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(driver.QUANTITIES_ENV, raising=False)
+    monkeypatch.delenv(driver.PFIDB_ENV, raising=False)
+    assert driver.analytics_quantities() == ["pressures"]
+
+    write_pfidb(tmp_path / "clayL.pfidb", {"Solver.ShareInsituPressure": "True", "Solver.ShareInsituSaturation": "True"})
+    assert driver.analytics_quantities() == ["pressures", "saturations"]
+
+    monkeypatch.setenv(driver.QUANTITIES_ENV, "saturations")
+    assert driver.analytics_quantities() == ["saturations"]
+
+
+def test_ready_is_signalled_once_the_doreisa_head_actor_exists(tmp_path):
+    """Another named actor is not the Doreisa head, and no head at the timeout is a failure."""
+    ready = tmp_path / "analytics.ready"
+    script = (
+        f"import os, sys, time; sys.path.insert(0, {ANALYTICS_DIR!r}); import driver, ray; "
+        "ray.init(num_cpus=1, include_dashboard=False, logging_level='ERROR'); "
+        "Actor = ray.remote(num_cpus=0)(type('Actor', (), {'ping': lambda self: 0})); "
+        "other = Actor.options(name='other').remote(); ray.get(other.ping.remote()); "
+        "driver.signal_ready(wait_for_head=True, timeout=float(sys.argv[1])); time.sleep(2); "
+        "print('READY BEFORE HEAD', os.path.exists(os.environ[driver.READY_FILE_ENV]), flush=True); "
+        "head = Actor.options(name=driver.DOREISA_HEAD_ACTOR, namespace=driver.DOREISA_NAMESPACE).remote(); "
+        "time.sleep(3); print('READY', os.path.exists(os.environ[driver.READY_FILE_ENV]), flush=True)"
+    )
+    for timeout, returncode, output in [(30, 0, "READY BEFORE HEAD False\nREADY True"), (1, 1, "")]:
+        result = subprocess.run(
+            [sys.executable, "-c", script, str(timeout)],
+            # the local Ray cluster writes its auth token in $HOME/.ray, not shared with the other tests
+            env={**os.environ, "HOME": str(tmp_path), driver.READY_FILE_ENV: str(ready)},
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        assert result.returncode == returncode, result.stdout + result.stderr
+        assert result.stdout.strip() == output
+        assert ready.exists() == (returncode == 0)
+        ready.unlink(missing_ok=True)
+    assert "head actor not registered" in result.stderr
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import dask
+import dask.array as da
+import numpy as np
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import graph_cache  # noqa: E402
+import kernels  # noqa: E402
+
+
+def step(t, ranks=2, cells=4, nz=3):
+    """One published step: ranks x ranks chunks holding t * (1 + rank)."""
+    name = f"pressures-{t}"
+    chunks = {(name, i, j, 0): np.full((cells, cells, nz), t * (1.0 + i * ranks + j)) for i in range(ranks) for j in range(ranks)}
+    return da.Array(chunks, name, chunks=((cells,) * ranks, (cells,) * ranks, (nz,)), dtype=float)
+
+
+def test_template_is_reused_across_steps():
+    for fn in [kernels.avg, kernels.derivative, kernels.toy]:
+        cache = graph_cache.GraphCache(fn)
+        window_size = 1 if fn is kernels.avg else 3
+        for t in range(window_size - 1, 6):
+            window = [step(s) for s in range(t - window_size + 1, t + 1)]
+            result = graph_cache.compute(cache(window))
+            expected = dask.compute(fn(window))[0]
+            assert np.allclose(result, expected), (fn.__name__, t)
+        assert (cache.misses, cache.hits) == (1, 6 - window_size)
+
+
+def test_template_does_not_keep_the_chunks():
+    cache = graph_cache.GraphCache(kernels.avg)
+    cache([step(1)])
+    values = [getattr(node, "value", None) for node in cache.template.graph.values()]
+    assert not any(isinstance(v, np.ndarray) and v.size > 1 for v in values)
+
+
+def test_new_chunk_layout_rebuilds_the_template():
+    cache = graph_cache.GraphCache(kernels.derivative)
+    assert graph_cache.compute(cache([step(t) for t in range(3)])) == np.mean([(2 - 0) * (1 + r) / 4 for r in range(4)])
+    template = cache.template
+
+    window = [step(t, ranks=3, cells=2) for t in range(3)]
+    assert np.isclose(graph_cache.compute(cache(window)), dask.compute(kernels.derivative(window))[0])
+    assert cache.template is not template
+    assert cache.misses == 2
+
+
+def test_derived_window_arrays_are_built_every_step():
+    cache = graph_cache.GraphCache(kernels.avg)
+    for t in range(3):
+        assert graph_cache.compute(cache([step(t) * 2])) == 2 * t * 2.5
+    assert cache.template is None and cache.misses == 3
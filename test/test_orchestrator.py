@@ -0,0 +1,76 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ANALYTICS_DIR = os.path.abspath("./analytics")
+ORCHESTRATOR_PATH = os.path.abspath("./scripts/run/orchestrator.py")
+
+
+def load_orchestrator():
+    spec = importlib.util.spec_from_file_location("orchestrator", ORCHESTRATOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_local_doreisa_run_uses_readiness_probes(tmp_path):
+    """Run the Doreisa workflow on a local Ray cluster with stand-in analytics and simulation."""
+    pytest.importorskip("ray")
+    analytics = f"python3 -c 'import sys; sys.path.insert(0, \"{ANALYTICS_DIR}\"); from driver import signal_ready; signal_ready()'"
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "./scripts/run/orchestrator.py",
+            "doreisa",
+            "--launcher", "local",
+            "--exp-dir", str(tmp_path),
+            "--worker-cpus", "1",
+            "--log-interval", "1",
+            "--timeout", "120",
+            "--analytics-cmd", analytics,
+            "--sim-cmd", "sleep 1",
+        ],
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, f"Orchestrator failed: {result.stdout}\n{result.stderr}"
+
+    with open(tmp_path / "orchestrator-timings.json") as f:
+        phases = {p["phase"]: p for p in json.load(f)["phases"]}
+
+    for name in ["ray_head", "analytics", "ray_workers", "simulation", "analytics_drain"]:
+        assert phases[name]["ok"], f"Phase {name} failed"
+    # the analytics signal readiness right away, far below the former fixed 30s sleep
+    assert phases["analytics"]["diff"] < 30
+    assert (tmp_path / "analytics.ready").exists()
+    # the telemetry collector runs with the Ray head
+    assert list(tmp_path.glob("raylog_*.csv"))
+
+
+def test_analytics_draining_after_the_simulation_are_not_killed(tmp_path, monkeypatch):
+    """Without --analytics-timeout the driver decides when to stop, however long it drains."""
+    orchestrator = load_orchestrator()
+    monkeypatch.chdir(tmp_path)
+    args = orchestrator.parse_args(["doreisa", "--launcher", "local", "--sim-cmd", "true"])
+    assert args.analytics_timeout is None
+
+    analytics = orchestrator.Component("analytics", ["sleep", "2"])
+    analytics.start()
+    runner = orchestrator.Orchestrator(args)
+    assert runner.wait_analytics(analytics)
+    assert runner.phases[-1]["phase"] == "analytics_drain" and runner.phases[-1]["diff"] >= 2
+
+    # an explicit limit still stops a driver that does not exit
+    args = orchestrator.parse_args(["doreisa", "--launcher", "local", "--sim-cmd", "true", "--analytics-timeout", "0.5"])
+    analytics = orchestrator.Component("analytics", ["sleep", "30"])
+    analytics.start()
+    try:
+        assert not orchestrator.Orchestrator(args).wait_analytics(analytics)
+    finally:
+        analytics.stop()
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import dask
+import dask.array as da
+import h5py
+import numpy as np
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import dask_metrics  # noqa: E402
+import driver  # noqa: E402
+import pyramid  # noqa: E402
+
+
+def step(values, P, Q):
+    """values published as the P x Q chunks of the ranks (the chunk sizes may differ)."""
+    xs, ys = np.array_split(np.arange(values.shape[0]), P), np.array_split(np.arange(values.shape[1]), Q)
+    chunks = {("pressures-3", p, q, 0): values[x[0] : x[-1] + 1, y[0] : y[-1] + 1] for p, x in enumerate(xs)
+              for q, y in enumerate(ys)}
+    sizes = (tuple(len(x) for x in xs), tuple(len(y) for y in ys), (values.shape[2],))
+    return da.Array(chunks, "pressures-3", chunks=sizes, dtype=values.dtype)
+
+
+def test_pool_and_levels_within_budget():
+    values = np.arange(8 * 6 * 4, dtype=float).reshape(8, 6, 4)
+    assert np.allclose(pyramid.pool(values, 2), values.reshape(4, 2, 3, 2, 2, 2).mean(axis=(1, 3, 5)))
+    # shorter windows at the end of an axis
+    assert np.allclose(pyramid.pool(values, 4)[:, -1], values[:, 4:].reshape(2, 4, 2, 1, 4).mean(axis=(1, 2, 4)))
+
+    assert pyramid.plan_levels(1.0) == [2, 4, 8]
+    assert pyramid.plan_levels(0.02) == [4, 8]
+    assert pyramid.plan_levels(1e-4) == []
+    assert pyramid.level_fraction([4, 8]) <= 0.02
+
+
+def test_every_chunk_writes_its_own_pyramid(tmp_path, monkeypatch):
+    # hydrostatic column: smooth along z, like the clayL pressures
+    rng = np.random.default_rng(0)
+    values = np.linspace(-6, 0, 48)[None, None, :] + 1e-3 * rng.standard_normal((40, 36, 48))
+    array = step(values, 4, 3)
+    directory = tmp_path / "pressures"
+
+    written = pyramid.write_pyramid(array, str(directory), 3, [2, 4, 8])
+    graph = dict(written.__dask_graph__())
+    writes = [key for key in graph if key[0].startswith("write-")]
+    assert len(writes) == 12 and all(graph[key][1] == (array.name, *key[1:]) for key in writes)
+    # only the bytes written are gathered
+    assert written.compute(scheduler="threads") > 0
+    assert sorted(os.listdir(directory / "step-3")) == sorted(
+        f"block-{p}-{q}-0.h5" for p in range(4) for q in range(3)
+    )
+
+    with h5py.File(directory / pyramid.INDEX_FILE) as f:
+        for factor in [2, 4, 8]:
+            level = f[f"step-3/level-{factor}"][...]
+            sizes = pyramid.level_chunks(array.chunks, factor)
+            assert level.shape == tuple(sum(s) for s in sizes)
+            # 10 x 12 chunks: the 8x level has windows of 2 and 4 cells at the end of the chunks
+            expected = array.map_blocks(pyramid.pool, factor, chunks=sizes).compute()
+            assert np.allclose(level, expected, atol=1e-5)
+
+
+def test_written_bytes_stay_within_budget(tmp_path, monkeypatch):
+    monkeypatch.setenv(driver.PYRAMID_BUDGET_ENV, "0.02")
+    monkeypatch.delenv(driver.PYRAMID_EVERY_ENV, raising=False)
+    factors = pyramid.plan_levels(driver.pyramid_budget())
+    assert factors == [4, 8] and driver.pyramid_every() == 1
+
+    # 4 x 3 clayL-sized chunks of a hydrostatic field
+    rng = np.random.default_rng(0)
+    values = np.linspace(-6, 0, 240)[None, None, :] + 1e-3 * rng.standard_normal((96, 72, 240))
+    with dask.config.set(scheduler="threads"):
+        total = pyramid.write_pyramid(step(values, 4, 3), str(tmp_path), 0, factors).compute()
+    assert total < driver.pyramid_budget() * values.nbytes
+
+
+def test_pyramid_is_written_by_workers_without_analytics(tmp_path, isolated_client):
+    values = np.linspace(-6, 0, 16)[None, None, :] + np.zeros((12, 9, 16))
+    directory = tmp_path / "pressures"
+
+    # as in pressure-deisa-insitu-pyramid.py
+    dask_metrics.upload_modules(isolated_client, pyramid)
+    written = pyramid.write_pyramid(step(values, 4, 3), str(directory), 0, [2, 4])
+    # a task the worker cannot unpickle is retried forever, not raised
+    assert isolated_client.compute(written).result(timeout=60) > 0
+    assert len(os.listdir(directory / "step-0")) == 12
+    with h5py.File(directory / pyramid.INDEX_FILE) as f:
+        assert np.allclose(f["step-0/level-4"][0, 0], pyramid.pool(values, 4)[0, 0])
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import dask
+import dask.array as da
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import consolidate  # noqa: E402
+import graph_cache  # noqa: E402
+import kernels  # noqa: E402
+import quantities  # noqa: E402
+
+
+def step(quantity, t, P=4, Q=6, cells=3, nz=2):
+    """One published step of a quantity, chunk (p, q) holding its value times t * (1 + rank)."""
+    name = f"{quantity}-{t}"
+    scale = {"pressures": -1.0, "saturations": 0.5}[quantity]
+    chunks = {
+        (name, p, q, 0): np.full((cells, cells, nz), scale * t * (1.0 + q * P + p)) for p in range(P) for q in range(Q)
+    }
+    return da.Array(chunks, name, chunks=((cells,) * P, (cells,) * Q, (nz,)), dtype=float)
+
+
+def windows(t, size, names=("pressures", "saturations")):
+    return {name: [step(name, s) for s in range(t - size + 1, t + 1)] for name in names}
+
+
+def test_all_quantities_are_computed_with_one_output():
+    names = ["pressures", "saturations"]
+    for fn, size in [(kernels.avg, 1), (kernels.derivative, 3), (kernels.toy, 3)]:
+        w = windows(3, size)
+        packed = quantities.batched(fn, 2)(quantities.flatten(w, names))
+        assert len(packed.__dask_keys__()) == 1
+        expected = np.array(dask.compute(*(fn(w[name]) for name in names)))
+        assert np.allclose(packed.compute(), expected.T if expected.ndim == 2 else expected), fn.__name__
+
+
+def test_batched_quantities_reuse_the_cached_graph():
+    names = ["pressures", "saturations"]
+    cache = graph_cache.GraphCache(consolidate.consolidated(quantities.batched(kernels.derivative, 2), 4, 8))
+    for t in range(2, 5):
+        w = windows(t, 3)
+        values = graph_cache.compute(cache(quantities.flatten(w, names)))
+        assert np.allclose(values, [dask.compute(kernels.derivative(w[name]))[0] for name in names])
+    assert (cache.misses, cache.hits) == (1, 2)
+
+    with pytest.raises(ValueError):
+        quantities.batched(kernels.derivative, 2)(quantities.flatten(w, names)[:5])
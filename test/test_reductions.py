@@ -0,0 +1,96 @@
+import csv
+import importlib.util
+import os
+import sys
+
+import dask.array as da
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import consolidate  # noqa: E402
+import kernels  # noqa: E402
+import reductions  # noqa: E402
+
+
+def load_tool(name):
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.abspath(f"./utils/{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def tree_tasks(array):
+    """Partial and aggregate tasks of a reduction graph."""
+    return sum(1 for key in dict(array.__dask_graph__()) if "partial" in key[0] or "aggregate" in key[0])
+
+
+def test_tree_levels_match_dask():
+    x = da.ones((40, 24, 3), chunks=(2, 2, 3))
+    for split_every in [{0: 2, 1: 2, 2: 2}, {0: 4, 1: 3, 2: 2}, {0: 7, 1: 5, 2: 2}, {0: 20, 1: 12, 2: 2}]:
+        total = x.sum(split_every=split_every)
+        assert total.compute() == x.size
+        assert sum(tasks for tasks, _, _ in reductions.tree_levels(x.numblocks, split_every)) == tree_tasks(total)
+
+
+def test_plan_combines_within_nodes_first():
+    # 40 x 40 ranks, 80 ranks per node: one node is 40 x 2 chunks
+    block = reductions.grid_block((40, 40, 1), 80)
+    assert block == {0: 40, 1: 2}
+    plan = reductions.plan_reduction((40, 40, 1), 64, block=block)
+    assert 40 % plan.split_every[0] == 0 and 2 % plan.split_every[1] == 0
+    default = dict.fromkeys(range(3), 2)
+    assert plan.predicted < reductions.reduction_cost((40, 40, 1), default, 64, block)
+
+    # without a layout, partial results are spread: fewer levels than the default tree
+    plan = reductions.plan_reduction((40, 40, 1), 64)
+    assert all(f >= 2 for f in plan.split_every.values())
+    assert plan.levels < len(reductions.tree_levels((40, 40, 1), default))
+    assert plan.along((1, 2, 3)) == {axis + 1: f for axis, f in plan.split_every.items()}
+
+
+def test_tree_reduction_traces_the_plan(tmp_path, capsys):
+    chunks = {("p", i, j, 0): np.full((2, 2, 3), 1.0 + i) for i in range(8) for j in range(6)}
+    window = [da.Array(chunks, "p", chunks=((2,) * 8, (2,) * 6, (3,)), dtype=float)]
+    avg = reductions.tree_reduction(kernels.avg, 4, task_overhead=1e-3)
+    assert avg(window).compute() == pytest.approx(4.5)
+    avg(window)
+    reductions.trace_executed(3, 10.0, 10.5)
+    reductions.trace_executed(4, 11.0, 11.25)
+    out = capsys.readouterr().out.splitlines()
+    (line,) = [line for line in out if line.startswith("[REDUCTION, PLAN]")]
+    executed = [line for line in out if line.startswith("[REDUCTION, EXECUTED]")]
+
+    bench = load_tool("bench-tools")
+    exp_dir = bench.generate_experiment(tmp_path / "experiments", 4, 3, 1, 10, config_id=0, seed=0)
+    (r_file,) = exp_dir.glob("R-*.o")
+    with open(r_file, "a") as f:
+        f.write("\n".join([line, *executed]) + "\n")
+
+    process_timings = load_tool("process-timings")
+    processor = process_timings.BatchExperimentProcessor(str(tmp_path / "experiments"))
+    processor.process_all_experiments()
+    output = tmp_path / "timings.csv"
+    processor.save_results_to_csv(str(output))
+    with open(output) as f:
+        (result,) = list(csv.DictReader(f))
+    assert result["reduction_split_every"] in line
+    assert float(result["reduction_task_overhead"]) == 1e-3
+    assert int(result["reduction_levels"]) >= 1
+    # the measured time of the reductions next to the predicted one
+    assert int(result["reduction_executed_steps"]) == 2
+    assert float(result["reduction_executed_time"]) == pytest.approx(0.375)
+
+
+def test_consolidated_reductions_are_planned_with_the_merged_layout(capsys):
+    # 8 x 12 ranks, 16 ranks per node (8 x 2 chunks), merged 2 x 2 into 4 x 6 blocks: 4 x 1 blocks per node
+    chunks = {("p", i, j, 0): np.full((2, 2, 3), 1.0 + i) for i in range(8) for j in range(12)}
+    window = [da.Array(chunks, "p", chunks=((2,) * 8, (2,) * 12, (3,)), dtype=float)]
+    avg = reductions.tree_reduction(kernels.avg, 24, ranks_per_node=16, task_overhead=1e-3)
+    assert consolidate.consolidated(avg, 24, ranks_per_node=16)(window).compute() == pytest.approx(4.5)
+
+    (line,) = [line for line in capsys.readouterr().out.splitlines() if line.startswith("[REDUCTION, PLAN]")]
+    expected = reductions.plan_reduction((4, 6, 1), 24, block={0: 4, 1: 1}, task_overhead=1e-3)
+    # the 16 ranks per node applied to the merged blocks would put the whole grid on one node
+    assert f"SPLIT_EVERY: {expected.shape()} " in line and expected.shape() == "4x3x2"
@@ -0,0 +1,74 @@
+import importlib.util
+import math
+import os
+import statistics
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import results_store  # noqa: E402
+
+
+def load_tool(name):
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.abspath(f"./utils/{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_store_appends_grows_and_reopens(tmp_path):
+    path = str(tmp_path / "analytics-results.bin")
+    store = results_store.ResultStore(path, capacity=4, sync_every=3)
+    for step in range(10):
+        store.timing(step, results_store.GRAPH, step, step + 0.5)
+        store.append(step, "avg:pressures", -6.0 - step)
+    # the file doubles when it is full: 4 -> 8 -> 16 -> 32 records
+    assert store.capacity == 32
+    assert os.path.getsize(path) == results_store.HEADER_BYTES + 32 * results_store.RECORD.itemsize
+
+    # readable before close, e.g. after a crash: every record counted is complete
+    records, names = results_store.read_store(path)
+    assert len(records) == 20 and names == ["graph", "avg:pressures"]
+    store.close()
+
+    # reopened, the store appends after its records
+    with results_store.ResultStore(path) as store:
+        store.timing(10, results_store.COMPUTE, 10.0, 10.25)
+        assert store.count == 21
+
+    records, names = results_store.read_store(path)
+    # no copy: a read-only view of the file
+    assert isinstance(records, np.memmap) and not records.flags.writeable
+    assert names == ["graph", "avg:pressures", "compute"]
+    averages = records[records["metric"] == names.index("avg:pressures")]
+    assert np.array_equal(averages["step"], np.arange(10))
+    assert np.array_equal(averages["value"], -6.0 - np.arange(10)) and np.isnan(averages["start"]).all()
+    assert results_store.timings(records, names, "compute") == [(10.0, 10.25, 0.25)]
+    assert results_store.timings(records, names, "graph")[3] == (3.0, 3.5, 0.5)
+    assert results_store.timings(records, names, "unknown") == []
+
+    (tmp_path / "other.bin").write_bytes(b"not a store")
+    with pytest.raises(ValueError):
+        results_store.read_store(str(tmp_path / "other.bin"))
+
+
+def test_process_timings_reads_the_store(tmp_path):
+    bench = load_tool("bench-tools")
+    exp_dir = bench.generate_experiment(tmp_path / "experiments", 4, 3, 1, 10, config_id=0, seed=0)
+    with results_store.ResultStore(str(exp_dir / "analytics-results.bin")) as store:
+        for step in range(3):
+            store.timing(step, results_store.GRAPH, 100.0 + step, 100.0 + step + 0.01 * (step + 1))
+            store.timing(step, results_store.COMPUTE, 200.0 + step, 200.0 + step + 0.1 * (step + 1))
+            store.append(step, "avg:pressures", -6.0)
+
+    process_timings = load_tool("process-timings")
+    processor = process_timings.BatchExperimentProcessor(str(tmp_path / "experiments"))
+    processor.process_all_experiments()
+    (result,) = processor.results
+    # the timings of the store, not the TIMINGS lists of the output
+    assert math.isclose(result.avg_graph_formation_time, statistics.mean([0.01, 0.02, 0.03]))
+    assert math.isclose(result.avg_graph_compute_time, statistics.mean([0.1, 0.2, 0.3]))
+    assert math.isclose(result.total_analytics_time, 0.66)
@@ -0,0 +1,56 @@
+import importlib.util
+import math
+
+import numpy as np
+import pandas as pd
+
+spec = importlib.util.spec_from_file_location("scaling_model", "./utils/scaling-model.py")
+scaling_model = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(scaling_model)
+
+
+def make_timings(tmp_path):
+    """Strong and weak scaling runs following T = 2 + 1e-5 * W/p + 0.5 * log2(p)."""
+    rows = []
+    for nodes in [1, 4, 9, 16]:
+        for cells in [120, 240]:
+            ranks = nodes * 100
+            work = (cells * math.isqrt(nodes)) ** 2 * 240
+            runtime = 2 + 1e-5 * work / ranks + 0.5 * math.log2(ranks)
+            rows.append(
+                {
+                    "experiment_name": f"clayL_10_10_{nodes}_{cells}_doreisa_1_x_0",
+                    "experiment_id": 0,
+                    "num_ranks": ranks,
+                    "num_steps": 10,
+                    "simulation_total_runtime": runtime,
+                }
+            )
+    csv_file = tmp_path / "experiment-timings.csv"
+    pd.DataFrame(rows).to_csv(csv_file, index=False)
+    return csv_file
+
+
+def test_fit_recovers_loglinear_model(tmp_path):
+    """The log-linear model is selected and its coefficients recovered from noiseless data."""
+    df = scaling_model.load_timings(str(make_timings(tmp_path)))
+    # chosen by AICc among the amdahl, gustafson and loglinear fits
+    model = scaling_model.fit_all(df)["simulation_total_runtime"]
+    assert model.name == "loglinear"
+
+    coefficients = dict(zip(model.columns, model.coefficients))
+    assert np.isclose(coefficients["serial"], 2)
+    assert np.isclose(coefficients["work_per_rank"], 1e-5)
+    assert np.isclose(coefficients["log2_ranks"], 0.5)
+
+
+def test_predict_untested_configuration(tmp_path):
+    """Predictions of an untested node count match the generating model."""
+    df = scaling_model.load_timings(str(make_timings(tmp_path)))
+    models = scaling_model.fit_all(df)
+
+    config = scaling_model.Config.from_cells_per_node(25, 100, 240)
+    predictions = scaling_model.predict(models["simulation_total_runtime"], [config])
+
+    expected = 2 + 1e-5 * config.global_cells / config.num_ranks + 0.5 * math.log2(config.num_ranks)
+    assert np.isclose(predictions["simulation_total_runtime_predicted"].iloc[0], expected, rtol=1e-3)
@@ -0,0 +1,121 @@
+import csv
+import importlib.util
+import os
+import sys
+
+import dask.array as da
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import graph_cache  # noqa: E402
+import kernels  # noqa: E402
+import quantities  # noqa: E402
+import results_store  # noqa: E402
+import shedding  # noqa: E402
+
+
+def load_tool(name):
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.abspath(f"./utils/{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run(policy, clock, cost, steps=40, period=1.0):
+    """Steps published every period, analyzed one after the other; the lag of the last step."""
+    for t in range(steps):
+        clock.now = max(clock.now, t * period)
+        with policy.step(t) as decision:
+            clock.now += cost(decision)
+    return clock.now - (steps - 1) * period
+
+
+def test_policy_keeps_up_with_the_simulation(tmp_path, capsys):
+    # full analytics: 1.8 periods, 1.2 without the optional statistics, 0.5 sampled
+    def cost(decision):
+        if not decision.analyze:
+            return 0.0
+        return 0.5 if decision.sample > 1 else 1.2 if not decision.optional else 1.8
+
+    clock = Clock()
+    store = results_store.ResultStore(str(tmp_path / "analytics-results.bin"))
+    policy = shedding.SheddingPolicy(
+        "optional,sample:2,stride:2", monitor=shedding.LagMonitor(clock=clock), store=store
+    )
+    # the last step done within two periods of its publication (its own analytics included)
+    assert run(policy, clock, cost) < 2.0
+    assert policy.monitor.period == pytest.approx(1.0)
+    assert max(d.backlog for d in policy.decisions) <= 1
+    assert {d.action for d in policy.decisions} >= {"full", "no-optional", "sample:2+no-optional"}
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith("[SHEDDING, ")]
+    assert len(lines) == 40
+
+    # the level of every step is in the store, to tell the shed steps apart
+    store.close()
+    records, names = results_store.read_store(store.path)
+    levels = records[records["metric"] == names.index(shedding.LEVEL_METRIC)]
+    assert levels["step"].tolist() == list(range(40))
+    assert levels["value"].tolist() == [d.level for d in policy.decisions]
+
+    # without shedding (the default), the lag grows with every step and nothing is recorded
+    clock = Clock()
+    store = results_store.ResultStore(str(tmp_path / "none.bin"))
+    policy = shedding.SheddingPolicy(monitor=shedding.LagMonitor(clock=clock), store=store)
+    assert run(policy, clock, cost) > 30
+    assert {d.action for d in policy.decisions} == {"full"} and store.count == 0
+
+    # nothing is fast enough: the stride doubles past the last level instead of stalling
+    clock = Clock()
+    policy = shedding.SheddingPolicy("optional", monitor=shedding.LagMonitor(clock=clock))
+    assert run(policy, clock, lambda d: 3.5 if d.analyze else 0.0, steps=64) < 8
+    assert max(d.stride for d in policy.decisions) >= 4
+
+    bench = load_tool("bench-tools")
+    exp_dir = bench.generate_experiment(tmp_path / "experiments", 4, 3, 1, 10, config_id=0, seed=0)
+    (r_file,) = exp_dir.glob("R-*.o")
+    with open(r_file, "a") as f:
+        f.write("\n".join(lines) + "\n")
+
+    process_timings = load_tool("process-timings")
+    processor = process_timings.BatchExperimentProcessor(str(tmp_path / "experiments"))
+    processor.process_all_experiments()
+    output = tmp_path / "timings.csv"
+    processor.save_results_to_csv(str(output))
+    with open(output) as f:
+        (result,) = list(csv.DictReader(f))
+    assert int(result["shedding_max_level"]) >= 2
+    assert int(result["shedding_sampled_steps"]) > 0
+
+
+def test_sampled_kernels_reuse_their_graph():
+    def step(t, ranks=4, cells=2, nz=3):
+        name = f"pressures-{t}"
+        chunks = {(name, i, j, 0): np.full((cells, cells, nz), t + i * ranks + j, dtype=float)
+                  for i in range(ranks) for j in range(ranks)}
+        return da.Array(chunks, name, chunks=((cells,) * ranks, (cells,) * ranks, (nz,)), dtype=float)
+
+    cache = graph_cache.GraphCache(shedding.sampled(quantities.batched(kernels.avg, 1), 2))
+    for t in range(3):
+        (value,) = graph_cache.compute(cache([step(t)]))
+        # chunks (0, 0), (0, 2), (2, 0), (2, 2)
+        assert value == pytest.approx(t + np.mean([0, 2, 8, 10]))
+    assert (cache.misses, cache.hits) == (1, 2)
+    assert shedding.sampled(kernels.avg, 1) is kernels.avg
+
+    assert shedding.parse_levels("optional, sample:4,stride:3") == [("optional", None), ("sample", 4), ("stride", 3)]
+    with pytest.raises(ValueError):
+        shedding.parse_levels("sample:0")
+    # the optional statistics (stencils, distributions) are never computed on sampled chunks
+    policy = shedding.SheddingPolicy("sample:2,stride:2")
+    assert [policy.settings(level) for level in range(3)] == [(True, 1, 1), (False, 2, 1), (False, 2, 2)]
+    assert shedding.SheddingPolicy("sample:1").settings(1) == (True, 1, 1)
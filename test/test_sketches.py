@@ -0,0 +1,83 @@
+import os
+import pickle
+import sys
+
+import dask
+import dask.array as da
+import numpy as np
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import dask_metrics  # noqa: E402
+import graph_opt  # noqa: E402
+import kernels  # noqa: E402
+import sketches  # noqa: E402
+
+
+def rank_error(values, estimates, q):
+    """Distance between the ranks of the estimates and the requested ranks, as a fraction of the values."""
+    values = np.sort(values.ravel())
+    return np.abs(np.searchsorted(values, estimates) / values.size - np.asarray(q))
+
+
+def test_merged_sketches_match_the_whole_field():
+    rng = np.random.default_rng(1)
+    values = rng.normal(-3, 1, (40, 40, 60))
+    summary = sketches.sketch(da.from_array(values, chunks=(4, 4, 60)), sketches.Summary.factory()).compute()
+
+    histogram = summary.histogram
+    assert np.array_equal(histogram.counts, np.histogram(values, bins=histogram.edges)[0])
+    assert summary.n == values.size
+    assert histogram.below + histogram.above == np.count_nonzero((values < -10) | (values > 1))
+
+    q = [0.01, 0.25, 0.5, 0.75, 0.99]
+    assert np.all(rank_error(values, summary.quantiles(q), q) < 0.02)
+    assert summary.quantiles([0, 1]).tolist() == [values.min(), values.max()]
+    # bounded memory, whatever the number of merged chunks
+    assert sum(len(level) for level in summary.kll.levels) < 0.01 * values.size
+    # the summaries travel between workers
+    assert np.array_equal(pickle.loads(pickle.dumps(summary)).quantiles(q), summary.quantiles(q))
+
+    other = sketches.Histogram.of(values, np.linspace(0, 1, 3))
+    try:
+        histogram.merge([other])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("histograms with different bins were merged")
+
+
+def test_deisa_distribution_by_timestep():
+    rng = np.random.default_rng(2)
+    steps = [rng.uniform(-6.5 + t, -5.5 + t, (12, 12, 8)) for t in range(3)]
+    window = [da.from_array(s, chunks=(3, 4, 8)) for s in steps]
+
+    with dask.config.set(array_optimize=graph_opt.optimize):
+        summaries = kernels.deisa_distribution(window).compute()
+        (planned,) = dask.compute(
+            sketches.sketch(da.stack(window), sketches.Summary.factory(), axis=(1, 2, 3), split_every={1: 4, 2: 3, 3: 2})
+        )
+    assert summaries.shape == planned.shape == (3,)
+    for s, summary, other in zip(steps, summaries, planned):
+        assert summary.n == other.n == s.size
+        assert np.array_equal(summary.histogram.counts, other.histogram.counts)
+        assert np.all(rank_error(s, summary.quantiles(sketches.QUANTILES), sketches.QUANTILES) < 0.02)
+    assert kernels.distribution(window).compute().histogram.counts.sum() == steps[1].size
+    assert summaries[1].describe().startswith("P01: ")
+
+
+def test_sketches_run_on_workers_without_analytics(isolated_client):
+    values = np.random.default_rng(3).normal(-3, 1, (3, 8, 6, 5))
+    p = da.from_array(values, chunks=(1, 4, 3, 5))
+    expected = sketches.sketch(p, sketches.Summary.factory(), axis=(1, 2, 3)).compute(scheduler="sync")
+
+    # as in pressure-deisa.py
+    dask_metrics.upload_modules(isolated_client, sketches)
+    distribution = sketches.sketch(p, sketches.Summary.factory(), axis=(1, 2, 3), split_every={1: 2, 2: 2})
+    with dask.config.set(array_optimize=graph_opt.optimize):
+        # a task the worker cannot unpickle is retried forever, not raised
+        distribution = isolated_client.compute(distribution).result(timeout=60)
+
+    for summary, reference in zip(distribution, expected):
+        assert summary.n == reference.n
+        assert np.array_equal(summary.histogram.counts, reference.histogram.counts)
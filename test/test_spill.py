@@ -0,0 +1,84 @@
+import os
+import sys
+
+import dask
+import dask.array as da
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import graph_opt  # noqa: E402
+import kernels  # noqa: E402
+import spill  # noqa: E402
+
+
+def step(t, P=4, Q=3, cells=3, nz=5):
+    """Step t published as P x Q chunks, like the arrays of Doreisa."""
+    values = np.random.default_rng(t).uniform(-6.5, -5.5, (P * cells, Q * cells, nz))
+    name = f"pressures_{t}"
+    chunks = {(name, p, q, 0): values[p * cells : (p + 1) * cells, q * cells : (q + 1) * cells] for p in range(P)
+              for q in range(Q)}
+    return values, da.Array(chunks, name, chunks=((cells,) * P, (cells,) * Q, (nz,)), dtype=float)
+
+
+def files(directory):
+    return sorted(os.path.relpath(os.path.join(root, f), directory) for root, _, fs in os.walk(directory) for f in fs)
+
+
+def test_window_spills_beyond_its_budget(tmp_path):
+    steps = [step(t) for t in range(7)]
+    nbytes = steps[0][0].nbytes
+    window = spill.SpillWindow(4, budget=2 * nbytes, directory=str(tmp_path))
+
+    with dask.config.set(scheduler="threads"):
+        for t, (values, array) in enumerate(steps):
+            written = window.push(array)
+            # the window only grows to 2 resident steps, then one step is spilled per push
+            assert written == (nbytes if t >= 2 else 0)
+            assert window.resident_bytes <= 2 * nbytes
+
+        assert len(window) == 4 and list(window.resident) == ["pressures_5", "pressures_6"]
+        assert window.spilled_bytes == 2 * nbytes and window.written == 5 * nbytes
+        # the steps that left the window are removed from the disk
+        assert files(tmp_path) == sorted(
+            os.path.join(window.prefix, f"pressures_{t}", f"block-{p}-{q}-0.npy")
+            for t in (3, 4) for p in range(4) for q in range(3)
+        )
+
+        arrays = window[:]
+        expected = sum(values for values, _ in steps[3:]) / 4
+        assert np.isclose(kernels.running_mean(arrays).compute(), expected.max())
+        assert np.allclose(arrays[0].compute(), steps[3][0])
+
+        # touched steps are used last: pressures_6 (not pressures_5) is spilled by the next push
+        window[2]
+        window.push(step(7)[1])
+        assert list(window.resident) == ["pressures_5", "pressures_7"]
+
+        window.close()
+    assert files(tmp_path) == []
+
+    with pytest.raises(ValueError):
+        window.push(step(8, cells=2)[1])
+
+
+def test_spilled_chunks_are_read_where_they_are_used(tmp_path):
+    window = spill.SpillWindow(3, budget=0, directory=str(tmp_path))
+    with dask.config.set(scheduler="threads"):
+        for t in range(3):
+            window.push(step(t)[1])
+    assert list(window.resident) == ["pressures_2"]
+
+    expr = kernels.running_mean(window[:])
+    graph = graph_opt.optimize(expr.__dask_graph__(), expr.__dask_keys__())
+    # the loads are fused with the sum and the per-chunk max, next to the chunk of the newest step
+    assert not [key for key in graph if key[0].startswith("spilled-")]
+    fused = [key for key, node in graph.items() if any(dep[0] == "pressures_2" for dep in node.dependencies)]
+    assert len(fused) == 12
+    for key in fused:
+        assert "chunk_max" in key[0] and graph[key].dependencies == {("pressures_2", *key[1:])}
+
+    chunk = spill._load_block(None, str(tmp_path), os.path.join(window.prefix, "pressures_0"), block_id=(1, 2, 0))
+    assert isinstance(chunk, np.memmap)
+    assert np.array_equal(chunk, step(0)[0][3:6, 6:9])
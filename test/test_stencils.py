@@ -0,0 +1,106 @@
+import os
+import sys
+from functools import partial
+
+import dask
+import dask.array as da
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath("./analytics"))
+
+import dask_metrics  # noqa: E402
+import graph_opt  # noqa: E402
+import kernels  # noqa: E402
+import stencils  # noqa: E402
+
+MEDIUM = stencils.Medium()
+
+
+def field(shape=(12, 18, 10), seed=0):
+    return np.random.default_rng(seed).uniform(-6.5, -5.5, shape)
+
+
+def with_ghosts(values, P, Q, ghost=1):
+    """The P x Q chunks of values published with their ghost layers (any value outside the domain)."""
+    padded = np.pad(values, ghost, constant_values=1e6)
+    nx, ny = values.shape[0] // P, values.shape[1] // Q
+    chunks = {
+        ("ghosted", p, q, 0): padded[p * nx : (p + 1) * nx + 2 * ghost, q * ny : (q + 1) * ny + 2 * ghost]
+        for p in range(P)
+        for q in range(Q)
+    }
+    sizes = ((nx + 2 * ghost,) * P, (ny + 2 * ghost,) * Q, (values.shape[2] + 2 * ghost,))
+    return da.Array(chunks, "ghosted", chunks=sizes, dtype=float)
+
+
+def test_stencils_match_the_global_field():
+    values = field()
+    array = da.from_array(values, chunks=(3, 6, 10))
+    ghosted = with_ghosts(values, 4, 3)
+    expected = [np.gradient(values, h, axis=axis) for axis, h in enumerate(MEDIUM.spacing)]
+
+    for axis in range(3):
+        fn = partial(stencils.gradient, spacing=MEDIUM.spacing, axis=axis)
+        assert np.allclose(stencils.stencil(array, fn).compute(), expected[axis])
+        result = stencils.stencil(ghosted, fn, ghost=1)
+        assert result.chunks == array.chunks
+        # the ghost layers are used inside the domain, never outside
+        assert np.allclose(result.compute(), expected[axis])
+
+    flux = stencils.stencil(array, partial(stencils.darcy_flux, medium=MEDIUM, axis=2)).compute()
+    kr = MEDIUM.relative_permeability(values)
+    assert np.allclose(flux, -MEDIUM.permeability * kr * (expected[2] + 1))
+    assert np.all((kr > 0) & (kr < 1)) and MEDIUM.relative_permeability(np.array(0.5)) == 1
+
+    with pytest.raises(ValueError):
+        stencils.stencil(array, fn, depth=4)
+
+
+def test_halos_are_only_exchanged_between_neighbours():
+    array = da.from_array(field(), chunks=(3, 6, 10))
+    flux, gradient = stencils.darcy(array)
+    graph = dict((flux.sum() + gradient.max()).__dask_graph__())
+    halos = [key for key in graph if key[0].startswith("halo-")]
+    # one per face shared by two chunks of the 4 x 3 grid, shared by both stencils
+    assert len(halos) == 2 * (3 * 3 + 4 * 2)
+    for key in flux.__dask_keys__()[1][1]:
+        index, task = key[1:], graph[key]
+        neighbours = {tuple(h[3:]) for sides in task[5] for h in sides if h is not None}
+        assert task[4] == (array.name, *index)
+        assert all(sum(abs(a - b) for a, b in zip(n, index)) == 1 for n in neighbours)
+
+    ghosted = with_ghosts(field(), 4, 3)
+    graph = dict(stencils.stencil(ghosted, partial(stencils.gradient_norm, spacing=MEDIUM.spacing), ghost=1).dask)
+    assert not [key for key in graph if key[0].startswith("halo-")]
+
+
+def test_darcy_kernel_on_a_deisa_step():
+    # the (t, x, y, z) array of Deisa: the published chunks of 3 steps of a 4 x 3 decomposition
+    steps = [field(seed=t) for t in range(3)]
+    chunks = {("deisa", t, p, q, 0): s[None, 3 * p : 3 * p + 3, 6 * q : 6 * q + 6] for t, s in enumerate(steps)
+              for p in range(4) for q in range(3)}
+    p = da.Array(chunks, "deisa", chunks=((1,) * 3, (3,) * 4, (6,) * 3, (10,)), dtype=float)
+    with dask.config.set(array_optimize=graph_opt.optimize):
+        flux, gradient = dask.compute(*kernels.darcy([p[0], p[1], p[2]]))
+    expected = [np.gradient(steps[1], h, axis=axis) for axis, h in enumerate(MEDIUM.spacing)]
+    kr = MEDIUM.relative_permeability(steps[1])
+    assert np.isclose(flux, (-MEDIUM.permeability * kr * (expected[2] + 1)).mean())
+    assert np.isclose(gradient, np.sqrt(sum(g**2 for g in expected)).max())
+
+    medium = stencils.Medium.from_keys({"ComputationalGrid.DZ": "0.5", "Geom.domain.RelPerm.N": "2."})
+    assert medium.spacing == (1.0, 1.0, 0.5) and medium.n == 2.0 and medium.alpha == MEDIUM.alpha
+
+
+def test_stencils_run_on_workers_without_analytics(isolated_client):
+    values = field()
+    array = da.from_array(values, chunks=(3, 6, 10))
+    expected = [g.compute(scheduler="sync") for g in stencils.darcy(array, MEDIUM)]
+
+    # as in pressure-deisa.py
+    dask_metrics.upload_modules(isolated_client, stencils)
+    flux, gradient = stencils.darcy(array, MEDIUM)
+    with dask.config.set(array_optimize=graph_opt.optimize):
+        # a task the worker cannot unpickle is retried forever, not raised
+        flux, gradient = (future.result(timeout=60) for future in isolated_client.compute([flux, gradient]))
+    assert np.allclose(flux, expected[0]) and np.allclose(gradient, expected[1])
@@ -0,0 +1,102 @@
+import importlib.util
+import json
+import os
+
+SWEEP_PATH = os.path.abspath("./scripts/bench/sweep.py")
+
+# stand-in for scripts/run/<cluster>/start_multinode_*.sh: writes the files of a valid
+# experiment in its $BASE_ROOTDIR, like the run scripts, not in the workdir of the sweep
+FAKE_RUN = """
+set -e
+BASE_ROOTDIR=$(cd -- "$(dirname -- "${BASH_SOURCE[0]}")/../../.." && pwd)
+CASE_NAME="clayL"
+xsplit=$1
+ysplit=$2
+nodes=$3
+cells=$4
+CONFIG_ID=$5
+[ -f $BASE_ROOTDIR/fail-$CONFIG_ID ] && exit 1
+EXP_DIR=$BASE_ROOTDIR/"${CASE_NAME}_${xsplit}_${ysplit}_${nodes}_${cells}_${SLURM_JOB_NAME}_${SLURM_JOB_ID}_$(date +%Y%m%d_%H%M%S%N)_$CONFIG_ID"
+mkdir "$EXP_DIR"
+echo "CONFIG_ID : $CONFIG_ID" > "$EXP_DIR"/R-fake.o
+echo "Total Timesteps : 9" > "$EXP_DIR"/clayL.out.log
+printf "Timer,Time (s)\\nTotal Runtime,1.0\\n" > "$EXP_DIR"/clayL.out.timing.csv
+"""
+
+
+def load_sweep():
+    spec = importlib.util.spec_from_file_location("sweep", SWEEP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_sweep(sweep, tmp_path):
+    argv = [
+        str(tmp_path / "grid.json"),
+        "--backend", "fake",
+        "--scripts-dir", str(tmp_path / "code" / "scripts" / "run" / "fake"),
+        "--workdir", str(tmp_path / "work"),
+        "--state", str(tmp_path / "sweep-state.json"),
+        "--max-walltime", "20",
+        "--run-cmd", "bash {script} {xsplit} {ysplit} {nodes} {cells} {config_id}",
+        "--max-attempts", "1",
+        "--wait",
+        "--poll", "0.2",
+    ]
+    return sweep.main(argv)
+
+
+def test_sweep_packs_resumes_and_skips_valid_results(tmp_path):
+    sweep = load_sweep()
+    scripts_dir = tmp_path / "code" / "scripts" / "run" / "fake"
+    scripts_dir.mkdir(parents=True)
+    (scripts_dir / "start_multinode_doreisa.sh").write_text(FAKE_RUN)
+    (tmp_path / "work").mkdir()
+    grid = {"app": "doreisa", "xsplit": [2, 4], "ysplit": 2, "nodes": [1, 4], "cells": 24, "repetitions": 2,
+            "walltime_per_run": 10}
+    (tmp_path / "grid.json").write_text(json.dumps(grid))
+    # configuration 3 (xsplit 4, 4 nodes) fails
+    (tmp_path / "code" / "fail-3").write_text("")
+
+    assert run_sweep(sweep, tmp_path) == 1
+
+    with open(tmp_path / "sweep-state.json") as f:
+        state = json.load(f)
+    statuses = {key: run["status"] for key, run in state["runs"].items()}
+    assert statuses == {
+        "doreisa_0_2_2_1_24_r0": "completed",
+        "doreisa_0_2_2_1_24_r1": "completed",
+        "doreisa_0_2_2_4_24_r0": "completed",
+        "doreisa_0_2_2_4_24_r1": "completed",
+        "doreisa_0_4_2_1_24_r0": "completed",
+        "doreisa_0_4_2_1_24_r1": "completed",
+        "doreisa_0_4_2_4_24_r0": "failed",
+        "doreisa_0_4_2_4_24_r1": "failed",
+    }
+    # 20 minutes fit 2 runs of 10: 4 runs on 2 nodes and 4 runs on 5 nodes -> 4 jobs
+    assert len(state["jobs"]) == 4
+    assert len(os.listdir(tmp_path / "work" / "experiments-doreisa")) == 6
+
+    # resuming runs only the failed configuration, once it is fixed
+    os.remove(tmp_path / "code" / "fail-3")
+    with open(tmp_path / "sweep-state.json", "w") as f:
+        for run in state["runs"].values():
+            if run["status"] == "failed":
+                run["attempts"] = 0
+        json.dump(state, f)
+    assert run_sweep(sweep, tmp_path) == 0
+
+    with open(tmp_path / "sweep-state.json") as f:
+        state = json.load(f)
+    assert all(run["status"] == "completed" for run in state["runs"].values())
+    assert len(state["jobs"]) == 5
+    assert len(os.listdir(tmp_path / "work" / "experiments-doreisa")) == 8
+    # every experiment was moved out of the directory of the run scripts
+    assert os.listdir(tmp_path / "code") == ["scripts"]
+
+    # a fresh sweep without state finds the existing results and submits nothing
+    os.remove(tmp_path / "sweep-state.json")
+    assert run_sweep(sweep, tmp_path) == 0
+    with open(tmp_path / "sweep-state.json") as f:
+        assert json.load(f)["jobs"] == {}
@@ -0,0 +1,329 @@
+"""
+Analytics Kernel Microbenchmark
+
+Times the analytics expressions of analytics/ (see analytics/kernels.py) without
+ParFlow, on Dask arrays chunked like clayL: one (cells x cells x NZ) float64 chunk
+per rank on a P x Q process grid. For every step, new chunks are published to the
+backend (not timed, like the simulation does), then the time to build the graph
+(timings_graph) and to compute it (timings_compute) is measured on the window.
+
+Sweeps kernels, rank counts (chunk count), chunk sizes, worker counts and scheduler
+backends:
+  - threads:      Dask threaded scheduler, chunks are NumPy arrays in the graph
+  - distributed:  Dask LocalCluster, chunks are scattered to the workers first (Deisa)
+  - ray:          Dask-on-Ray, chunks are Ray objects (Doreisa)
+
+Results are written as experiment-timings.csv files, with the columns read by
+timings-plotter.py, in one directory per kernel, backend and worker count:
+
+    python3 utils/analytics-bench.py --kernels avg derivative --backends threads ray \\
+        --ranks 16 64 100 --cells 24 --workers 1 4
+    # then plot e.g. experiments-kernels/avg_ray_4w/experiment-timings.csv
+"""
+
+import argparse
+import csv
+import os
+import statistics
+import sys
+import time
+
+import dask
+import dask.array as da
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analytics"))
+from kernels import KERNELS  # noqa: E402
+from consolidate import consolidated  # noqa: E402
+from graph_cache import GraphCache  # noqa: E402
+from graph_opt import optimize  # noqa: E402
+from quantities import batched  # noqa: E402
+from reductions import measure_task_overhead, tree_reduction  # noqa: E402
+
+BACKENDS = ["threads", "distributed", "ray"]
+
+# array_optimize setting: Dask's default pass, none (the Deisa scripts before) or analytics/graph_opt.py
+ARRAY_OPTIMIZE = {"default": dask.array.optimization.optimize, "none": None, "graph-opt": optimize}
+
+HEADERS = [
+    "experiment_name",
+    "experiment_id",
+    "num_ranks",
+    "num_steps",
+    "avg_graph_formation_time",
+    "stdev_graph_formation_time",
+    "avg_graph_compute_time",
+    "stdev_graph_compute_time",
+    "total_analytics_time",
+    "chunk_mb",
+]
+
+
+def process_grid(ranks):
+    """The most square P x Q grid with P * Q = ranks (P >= Q)."""
+    q = max(d for d in range(1, int(ranks**0.5) + 1) if ranks % d == 0)
+    return ranks // q, q
+
+
+class ThreadsBackend:
+    def __init__(self, workers):
+        self.workers = workers
+
+    def publish(self, chunks):
+        return chunks
+
+    def compute(self, exprs, optimize_graph=True):
+        return dask.compute(*exprs, scheduler="threads", num_workers=self.workers, optimize_graph=optimize_graph)
+
+    def close(self):
+        pass
+
+
+class DistributedBackend:
+    def __init__(self, workers):
+        from distributed import Client, LocalCluster
+
+        self.cluster = LocalCluster(n_workers=workers, threads_per_worker=1, dashboard_address=None)
+        self.client = Client(self.cluster)
+
+    def publish(self, chunks):
+        # spread the chunks over the workers as the Deisa bridges do
+        return self.client.scatter(chunks)
+
+    def compute(self, exprs, optimize_graph=True):
+        return self.client.compute(list(exprs), sync=True, optimize_graph=optimize_graph)
+
+    def close(self):
+        self.client.close()
+        self.cluster.close()
+
+
+class RayBackend:
+    def __init__(self, workers):
+        import ray
+        from ray.util.dask import ray_dask_get
+
+        self.ray = ray
+        self.get = ray_dask_get
+        ray.init(num_cpus=workers, include_dashboard=False, logging_level="ERROR")
+
+    def publish(self, chunks):
+        return [self.ray.put(c) for c in chunks]
+
+    def compute(self, exprs, optimize_graph=True):
+        return dask.compute(*exprs, scheduler=self.get, optimize_graph=optimize_graph)
+
+    def close(self):
+        self.ray.shutdown()
+
+
+def make_backend(name, workers):
+    return {"threads": ThreadsBackend, "distributed": DistributedBackend, "ray": RayBackend}[name](workers)
+
+
+def step_array(name, leaves, P, Q, cells, nz):
+    """Global array of one step whose chunk (i, j) is the leaf published by rank i * Q + j."""
+    dsk = {(name, i, j, 0): leaves[i * Q + j] for i in range(P) for j in range(Q)}
+    return da.Array(dsk, name, chunks=((cells,) * P, (cells,) * Q, (nz,)), dtype=np.float64)
+
+
+def bench_kernel(
+    kernel,
+    window_size,
+    backend,
+    ranks,
+    cells,
+    nz=240,
+    steps=5,
+    seed=0,
+    graph_cache=False,
+    consolidate_to=None,
+    reduction_plan=None,
+    quantities=1,
+):
+    """
+    Graph formation and compute times of every step with a full window. With graph_cache,
+    the graph is built once and reused (analytics/graph_cache.py), as in the Doreisa scripts.
+    With consolidate_to, the chunks are merged into about that many blocks first (analytics/consolidate.py).
+    reduction_plan=(workers, axes) sets the reduction trees with analytics/reductions.py.
+    With several quantities, each step publishes that many arrays, analyzed in one graph
+    (analytics/quantities.py).
+    """
+    P, Q = process_grid(ranks)
+    if reduction_plan:
+        workers, axes = reduction_plan
+        overhead = measure_task_overhead(compute=lambda tasks: backend.compute(tasks))
+        kernel = tree_reduction(kernel, workers, task_overhead=overhead, axes=axes)
+    if quantities > 1:
+        kernel = batched(kernel, quantities)
+    if consolidate_to:
+        kernel = consolidated(kernel, consolidate_to)
+    if graph_cache:
+        kernel = GraphCache(kernel)
+    rng = np.random.default_rng(seed)
+    # the same values are published at every step, only the keys change
+    chunks = [rng.uniform(-6.5, -5.5, (cells, cells, nz)) for _ in range(ranks)]
+
+    windows = [[] for _ in range(quantities)]
+    timings_graph, timings_compute = [], []
+    for step in range(steps + window_size - 1):
+        for q, window in enumerate(windows):
+            leaves = backend.publish(chunks)
+            window.append(step_array(f"quantity{q}-{seed}-{step}", leaves, P, Q, cells, nz))
+            del window[:-window_size]
+        if len(windows[0]) < window_size:
+            continue
+
+        start_g = time.perf_counter()
+        exprs = kernel([array for window in windows for array in window])
+        end_g = time.perf_counter()
+        exprs = exprs if isinstance(exprs, tuple) else (exprs,)
+
+        start_c = time.perf_counter()
+        backend.compute(exprs, optimize_graph=not graph_cache)
+        end_c = time.perf_counter()
+
+        timings_graph.append(end_g - start_g)
+        timings_compute.append(end_c - start_c)
+    return timings_graph, timings_compute
+
+
+def stacked_axes(kernel_name):
+    """x, y, z axes of the arrays reduced by a kernel: the deisa-* kernels stack the window along time first."""
+    return (1, 2, 3) if kernel_name.startswith("deisa-") else (0, 1, 2)
+
+
+def result_row(name, experiment_id, ranks, cells, nz, timings_graph, timings_compute):
+    stdev = lambda x: statistics.stdev(x) if len(x) > 1 else 0.0
+    return {
+        "experiment_name": name,
+        "experiment_id": experiment_id,
+        "num_ranks": ranks,
+        "num_steps": len(timings_graph),
+        "avg_graph_formation_time": statistics.mean(timings_graph),
+        "stdev_graph_formation_time": stdev(timings_graph),
+        "avg_graph_compute_time": statistics.mean(timings_compute),
+        "stdev_graph_compute_time": stdev(timings_compute),
+        "total_analytics_time": sum(timings_graph) + sum(timings_compute),
+        "chunk_mb": cells * cells * nz * 8 / 1e6,
+    }
+
+
+def run_sweep(
+    kernels,
+    backends,
+    workers_list,
+    ranks_list,
+    cells_list,
+    nz=240,
+    steps=5,
+    runs=3,
+    output_dir=None,
+    graph_cache=False,
+    consolidate=False,
+    reduction_plan=False,
+    quantities=1,
+):
+    """Run the whole sweep, return {(kernel, backend, workers): rows} and write the CSVs if output_dir is set."""
+    results = {}
+    for backend_name in backends:
+        for workers in workers_list:
+            backend = make_backend(backend_name, workers)
+            try:
+                for kernel_name in kernels:
+                    kernel, window_size = KERNELS[kernel_name]
+                    rows = results.setdefault((kernel_name, backend_name, workers), [])
+                    configs = [(r, c) for r in ranks_list for c in cells_list]
+                    for experiment_id, (ranks, cells) in enumerate(configs):
+                        P, Q = process_grid(ranks)
+                        for run in range(runs):
+                            graph, compute = bench_kernel(
+                                kernel,
+                                window_size,
+                                backend,
+                                ranks,
+                                cells,
+                                nz,
+                                steps,
+                                seed=run,
+                                graph_cache=graph_cache,
+                                consolidate_to=workers if consolidate else None,
+                                reduction_plan=(workers, stacked_axes(kernel_name)) if reduction_plan else None,
+                                quantities=quantities,
+                            )
+                            name = f"{kernel_name}_{backend_name}_{workers}w_{P}x{Q}_{cells}_{run}"
+                            rows.append(result_row(name, experiment_id, ranks, cells, nz, graph, compute))
+                        last = rows[-1]
+                        print(
+                            f"  {kernel_name:16s} {backend_name:11s} workers={workers:<3d} ranks={ranks:<5d} "
+                            f"chunk={cells}x{cells}x{nz} graph={last['avg_graph_formation_time']:.4f}s "
+                            f"compute={last['avg_graph_compute_time']:.4f}s"
+                        )
+            finally:
+                backend.close()
+
+    if output_dir:
+        for (kernel_name, backend_name, workers), rows in results.items():
+            exp_dir = os.path.join(output_dir, f"{kernel_name}_{backend_name}_{workers}w")
+            os.makedirs(exp_dir, exist_ok=True)
+            with open(os.path.join(exp_dir, "experiment-timings.csv"), "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=HEADERS)
+                writer.writeheader()
+                writer.writerows(rows)
+        print(f"💾 Results saved to {output_dir}/<kernel>_<backend>_<workers>w/experiment-timings.csv")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analytics kernels on clayL-like Dask arrays")
+    parser.add_argument("--kernels", nargs="+", default=list(KERNELS), choices=list(KERNELS), help="Kernels to run")
+    parser.add_argument("--backends", nargs="+", default=["threads"], choices=BACKENDS, help="Scheduler backends")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="Worker counts (default: 1 4)")
+    parser.add_argument("--ranks", type=int, nargs="+", default=[16, 64, 100], help="Number of chunks (ranks)")
+    parser.add_argument("--cells", type=int, nargs="+", default=[24], help="Chunk side along x and y (default: 24)")
+    parser.add_argument("--nz", type=int, default=240, help="Chunk size along z (default: 240)")
+    parser.add_argument("--steps", type=int, default=5, help="Measured steps per run (default: 5)")
+    parser.add_argument("--runs", type=int, default=3, help="Runs of every configuration (default: 3)")
+    parser.add_argument(
+        "--array-optimize", default="default", choices=list(ARRAY_OPTIMIZE), help="Graph optimization pass"
+    )
+    parser.add_argument("--graph-cache", action="store_true", help="Reuse the graph of the first step (not distributed)")
+    parser.add_argument(
+        "--consolidate", action="store_true", help="Merge the rank chunks into one block per worker before the kernel"
+    )
+    parser.add_argument(
+        "--reduction-plan", action="store_true", help="Pick the reduction tree fan-in (analytics/reductions.py)"
+    )
+    parser.add_argument(
+        "--quantities", type=int, default=1, help="Arrays published per step, analyzed in one graph (default: 1)"
+    )
+    parser.add_argument("--output-dir", default="./experiments-kernels", help="Where the CSVs are written")
+    args = parser.parse_args()
+    if args.graph_cache and "distributed" in args.backends:
+        # the template keeps its task keys, the distributed scheduler would reuse the previous results
+        parser.error("--graph-cache cannot be used with the distributed backend")
+    if args.quantities > 1 and any(name.startswith("deisa-") for name in args.kernels):
+        parser.error("--quantities is only supported by the Doreisa kernels")
+
+    print(f"🚀 Benchmarking {len(args.kernels)} kernels on {', '.join(args.backends)} ({args.array_optimize} optimization)")
+    with dask.config.set(array_optimize=ARRAY_OPTIMIZE[args.array_optimize]):
+        run_sweep(
+            args.kernels,
+            args.backends,
+            args.workers,
+            args.ranks,
+            args.cells,
+            args.nz,
+            args.steps,
+            args.runs,
+            args.output_dir,
+            args.graph_cache,
+            args.consolidate,
+            args.reduction_plan,
+            args.quantities,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
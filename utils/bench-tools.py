@@ -0,0 +1,359 @@
+"""
+Post-Processing Toolchain Benchmark
+
+Generates synthetic experiment trees at production scale (N ranks, S steps, H hosts)
+with the files the tools read:
+  - R-*.o:            [PDI, SETUP/AVAILABLE], [SIM, ...], [DOREISA, i] lines and TIMINGS
+  - *.out.timing.csv: ParFlow timers
+  - *.out.log:        total number of time steps
+  - memlog_*.csv:     memory samples of every host (memory-logger.py format)
+
+then times the phases of process-timings.py, timeline-plotter.py and memory-plotter.py
+(parse, aggregate, plot) and their peak Python memory (tracemalloc), and appends the
+results to a CSV tagged with the current git commit so that runs can be compared:
+
+    python3 utils/bench-tools.py --ranks 100 1000 10000 --steps 10 --hosts 16
+    python3 utils/bench-tools.py --ranks 10000 --compare <commit or label>
+"""
+
+import argparse
+import contextlib
+import csv
+import importlib.util
+import io
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RESULT_COLUMNS = [
+    "timestamp",
+    "commit",
+    "label",
+    "tool",
+    "phase",
+    "ranks",
+    "steps",
+    "hosts",
+    "mem_samples",
+    "seconds",
+    "stdev_seconds",
+    "peak_mb",
+]
+
+
+def load_tool(name):
+    """Load a utils/ script (not importable by name because of the dashes)."""
+    path = os.path.join(UTILS_DIR, f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def current_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=UTILS_DIR, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# --------------------------------------------------------
+# 			SYNTHETIC EXPERIMENTS
+# --------------------------------------------------------
+
+
+def generate_experiment(root, ranks, steps, hosts, mem_samples=1000, config_id=0, seed=0):
+    """
+    Write one synthetic Doreisa experiment directory under root and return its path.
+    Ranks are spread evenly on the hosts, one memory sample per second on every host.
+    """
+    rng = random.Random(seed)
+    side = max(1, int(ranks**0.5))
+    exp_dir = Path(root) / f"clayL_{side}_{max(1, ranks // side)}_{hosts}_240_doreisa_{1000 + config_id}_20250101_000000_{config_id}"
+    exp_dir.mkdir(parents=True, exist_ok=True)
+    t0 = 1.7e9 + config_id * 10000
+
+    step_time = 2.0
+    with open(exp_dir / f"R-doreisa-{1000 + config_id}.o", "w") as f:
+        f.write(f"CONFIG_ID : {config_id}\nRUNNING: DOREISA\n")
+        for rank in range(ranks):
+            lines = []
+            start = t0 + rng.uniform(0, 1)
+            diff = rng.uniform(0.2, 1.5)
+            lines.append(f"[PDI, SETUP, {rank}] START: {start} END: {start + diff} DIFF: {diff}")
+            for step in range(steps):
+                t = t0 + 5 + step * step_time
+                solve = rng.uniform(1.0, 1.8)
+                lines.append(f"[SIM, SOLVE, {rank}] START : {t} END : {t + solve}, DIFF: {solve} ITER: {step}")
+                pub = rng.uniform(0.001, 0.05)
+                t += solve
+                lines.append(
+                    f"[PDI, AVAILABLE, {rank}] START: {t} END: {t + pub} DIFF: {pub} ITER: {step} QUANT: pressure"
+                )
+                if rank % 100 == 0:
+                    lines.append(f"Node {rank}: Unable to add metadata for \"precipitation\"; Unhandled CLM Met forcing 0.")
+            f.write("\n".join(lines) + "\n")
+
+        graph, compute = [], []
+        for step in range(steps):
+            start = t0 + 5 + step * step_time + 1.9
+            g, c = rng.uniform(0.01, 0.05), rng.uniform(0.1, 0.5)
+            graph.append((start, start + g, g))
+            compute.append((start + g, start + g + c, c))
+            f.write(f"[DOREISA, {step}] START : {start} END : {start + g + c} DIFF : {g + c}\n")
+        f.write(f"[DOREISA, LAST STEP]\nTIMINGS GRAPH: {graph}\nTIMINGS COMPUTE: {compute}\n")
+
+    runtime = 5 + steps * step_time
+    with open(exp_dir / "clayL.out.timing.csv", "w") as f:
+        f.write("Timer,Time (s),MFLOPS (mops/s),FLOP (op)\n")
+        f.write(f"Solver Setup,{rng.uniform(1, 3)},0,0\n")
+        f.write(f"Richards Exclude 1st Time Step,{runtime - step_time},0,0\n")
+        f.write(f"Total Runtime,{runtime},0,0\n")
+    with open(exp_dir / "clayL.out.log", "w") as f:
+        f.write(f"Total Timesteps : {steps - 1}\n")
+
+    total = 512e9
+    for host in range(hosts):
+        hostname = f"node{host:04d}"
+        with open(exp_dir / f"memlog_{1000 + config_id}_{hostname}.csv", "w") as f:
+            f.write("timestamp,hostname,job_id,used_bytes,available_bytes,free_bytes,total_bytes\n")
+            used = 20e9
+            rows = []
+            for i in range(mem_samples):
+                used = min(total * 0.9, max(10e9, used + rng.gauss(0, 0.5e9)))
+                rows.append(
+                    f"{t0 + i + rng.uniform(0, 0.01)},{hostname},{1000 + config_id},"
+                    f"{int(used)},{int(total - used)},{int(total - used * 1.1)},{int(total)}"
+                )
+            f.write("\n".join(rows) + "\n")
+    return exp_dir
+
+
+# --------------------------------------------------------
+# 			MEASUREMENTS
+# --------------------------------------------------------
+
+
+def measure(fn, repeat=3, memory=True):
+    """
+    Median and stdev of the wall time of fn over `repeat` calls, and its peak
+    traced memory in MB (measured in a separate call, tracemalloc slows it down).
+    Returns (median_seconds, stdev_seconds, peak_mb, result of the last call).
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+
+    stdev = statistics.stdev(times) if len(times) > 1 else 0.0
+    return statistics.median(times), stdev, peak_mb, result
+
+
+def bench_process_timings(exp_dir, repeat, memory):
+    tool = load_tool("process-timings")
+    processor = tool.BatchExperimentProcessor(str(exp_dir.parent))
+    r_file, csv_file, log_file = processor.find_files_in_experiment(exp_dir)
+
+    def parse():
+        parser = tool.TimingParser()
+        parser.parse_csv_file(csv_file)
+        parser.parse_output_file(r_file)
+        parser.parse_log_file(log_file)
+        return parser
+
+    results = {}
+    results["parse"] = measure(parse, repeat, memory)
+    parser = results["parse"][3]
+    results["aggregate"] = measure(parser.calculate_metrics, repeat, memory)
+    return results
+
+
+def bench_timeline_plotter(exp_dir, repeat, memory, workdir):
+    tool = load_tool("timeline-plotter")
+    log_file = tool.find_log_file(str(exp_dir))
+
+    def parse():
+        parser = tool.EventParser(0)
+        parser.parse_log_file(log_file)
+        return parser
+
+    results = {}
+    results["parse"] = measure(parse, repeat, memory)
+    parser = results["parse"][3]
+    output = os.path.join(workdir, "timeline.html")
+    results["plot"] = measure(lambda: tool.create_timeline_plot(parser, output), repeat, memory)
+    return results
+
+
+def bench_memory_plotter(exp_dirs, repeat, memory):
+    tool = load_tool("memory-plotter")
+    config = tool.parse_config_from_dirname(exp_dirs[0].name)
+
+    results = {}
+    results["parse"] = measure(lambda: [tool.load_experiment_data(str(d)) for d in exp_dirs], repeat, memory)
+    exp_dfs = results["parse"][3]
+    results["aggregate"] = measure(lambda: tool.aggregate_experiments(exp_dfs), repeat, memory)
+    aggregated = results["aggregate"][3]
+    results["plot"] = measure(lambda: tool.create_memory_plot(aggregated, config), repeat, memory)
+    return results
+
+
+def run_benchmarks(ranks, steps, hosts, mem_samples=1000, runs=3, repeat=3, memory=True, workdir=None):
+    """Generate `runs` repetitions of one configuration and benchmark every tool on them."""
+    rows = []
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="bench-tools-")
+    try:
+        start = time.perf_counter()
+        exp_dirs = [
+            generate_experiment(os.path.join(workdir, "experiments"), ranks, steps, hosts, mem_samples, config_id=i, seed=i)
+            for i in range(runs)
+        ]
+        print(f"  🧪 Generated {runs} x ({ranks} ranks, {steps} steps, {hosts} hosts) in {time.perf_counter() - start:.1f}s")
+
+        benches = {
+            "process-timings": lambda: bench_process_timings(exp_dirs[0], repeat, memory),
+            "timeline-plotter": lambda: bench_timeline_plotter(exp_dirs[0], repeat, memory, workdir),
+            "memory-plotter": lambda: bench_memory_plotter(exp_dirs, repeat, memory),
+        }
+        for tool, bench in benches.items():
+            for phase, (seconds, stdev, peak_mb, _) in bench().items():
+                rows.append(
+                    {
+                        "tool": tool,
+                        "phase": phase,
+                        "ranks": ranks,
+                        "steps": steps,
+                        "hosts": hosts,
+                        "mem_samples": mem_samples,
+                        "seconds": seconds,
+                        "stdev_seconds": stdev,
+                        "peak_mb": peak_mb,
+                    }
+                )
+                peak = f"{peak_mb:9.1f} MB" if peak_mb is not None else ""
+                print(f"    {tool:17s} {phase:10s} {seconds:9.4f}s ± {stdev:.4f} {peak}")
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+# --------------------------------------------------------
+# 			RESULTS
+# --------------------------------------------------------
+
+
+def save_results(rows, path, commit, label):
+    new_file = not os.path.exists(path)
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        if new_file:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow({"timestamp": timestamp, "commit": commit, "label": label, **row})
+
+
+def load_results(path):
+    with open(path, "r", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def compare_results(rows, previous, reference, threshold=0.2):
+    """Print the ratio of every measurement to the latest one of `reference` (commit or label)."""
+    key = lambda r: (r["tool"], r["phase"], int(r["ranks"]), int(r["steps"]), int(r["hosts"]))
+    baseline = {}
+    for r in previous:
+        if r["commit"].startswith(reference) or r["label"] == reference:
+            baseline[key(r)] = r
+
+    if not baseline:
+        print(f"❌ No results for {reference}")
+        return False
+
+    print(f"\n📊 Compared to {reference} (regression if slower by more than {threshold:.0%}):")
+    ok = True
+    compared = 0
+    for r in rows:
+        base = baseline.get(key(r))
+        if base is None:
+            continue
+        compared += 1
+        ratio = float(r["seconds"]) / float(base["seconds"]) if float(base["seconds"]) > 0 else float("inf")
+        status = "⚠️ " if ratio > 1 + threshold else "✅"
+        ok = ok and ratio <= 1 + threshold
+        print(
+            f"{status} {r['tool']:17s} {r['phase']:10s} ranks={r['ranks']:<6} "
+            f"{float(base['seconds']):9.4f}s -> {float(r['seconds']):9.4f}s (x{ratio:.2f})"
+        )
+    if not compared:
+        print("[!] No measurement with the same ranks, steps and hosts to compare with")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the post-processing tools on synthetic experiments")
+    parser.add_argument("--ranks", type=int, nargs="+", default=[100, 1000], help="Rank counts to benchmark")
+    parser.add_argument("--steps", type=int, default=10, help="Number of time steps (default: 10)")
+    parser.add_argument("--hosts", type=int, default=4, help="Number of hosts with a memory log (default: 4)")
+    parser.add_argument("--mem-samples", type=int, default=1000, help="Memory samples per host (default: 1000)")
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions of each experiment (default: 3)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed calls of each phase (default: 3)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurement")
+    parser.add_argument("--keep", default=None, help="Generate the experiments in this directory and keep them")
+    parser.add_argument("--label", default="", help="Label stored with the results")
+    parser.add_argument("-o", "--output", default="bench-tools-results.csv", help="Results CSV (appended)")
+    parser.add_argument("--compare", default=None, help="Commit or label to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.steps < 2:
+        parser.error("--steps must be at least 2 (process-timings computes standard deviations over steps)")
+
+    commit = current_commit()
+    print(f"🚀 Benchmarking post-processing tools at commit {commit}")
+    previous = load_results(args.output) if args.compare and os.path.exists(args.output) else []
+
+    rows = []
+    for ranks in args.ranks:
+        workdir = os.path.join(args.keep, f"ranks_{ranks}") if args.keep else None
+        rows += run_benchmarks(
+            ranks, args.steps, args.hosts, args.mem_samples, args.runs, args.repeat, not args.no_memory, workdir
+        )
+
+    save_results(rows, args.output, commit, args.label)
+    print(f"💾 Results appended to {args.output}")
+
+    if args.compare:
+        return 0 if compare_results(rows, previous, args.compare, args.threshold) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,189 @@
+import psutil
+import time
+import socket
+import os
+import argparse
+from collections import defaultdict
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Log per-core utilization, per-process CPU migrations, context switches "
+        "and cpuset oversubscription periodically."
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=5,
+        help="Interval in seconds between samples (default: 5)",
+    )
+    parser.add_argument(
+        "--min-cpu",
+        type=float,
+        default=1.0,
+        help="Only log processes using at least this CPU percent or with runnable threads (default: 1.0)",
+    )
+    parser.add_argument(
+        "--all-users",
+        action="store_true",
+        help="Monitor the processes of every user (default: only the current user)",
+    )
+    return parser.parse_args()
+
+
+def read_threads(pid, proc_root="/proc"):
+    """
+    Read the state, last CPU and migration counter of every thread of a process
+    from /proc. The migration counter (se.nr_migrations) needs CONFIG_SCHED_DEBUG,
+    it is None when unavailable.
+    """
+    threads = {}
+    task_dir = f"{proc_root}/{pid}/task"
+    for tid in os.listdir(task_dir):
+        try:
+            with open(f"{task_dir}/{tid}/stat") as f:
+                # fields after the command name, which may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+            state, processor = fields[0], int(fields[36])
+        except (OSError, IndexError, ValueError):
+            continue
+
+        migrations = None
+        try:
+            with open(f"{task_dir}/{tid}/sched") as f:
+                for line in f:
+                    if line.startswith("se.nr_migrations"):
+                        migrations = int(line.split(":")[1])
+                        break
+        except (OSError, ValueError):
+            pass
+
+        threads[int(tid)] = (state, processor, migrations)
+    return threads
+
+
+class ProcessTracker:
+    """Keeps the counters of the previous sample to report per-interval deltas"""
+
+    def __init__(self, proc_root="/proc"):
+        self.proc_root = proc_root
+        self.prev_ctx = {}
+        self.prev_threads = {}
+
+    def sample(self, proc):
+        """
+        Return (migrations, voluntary, involuntary, runnable) for the last interval.
+        Migrations come from the kernel counter when available, otherwise they are
+        counted as threads whose last CPU changed since the previous sample.
+        """
+        pid = proc.pid
+        threads = read_threads(pid, self.proc_root)
+        ctx = proc.num_ctx_switches()
+
+        prev_threads = self.prev_threads.get(pid, {})
+        migrations = 0
+        for tid, (_, processor, counter) in threads.items():
+            if tid not in prev_threads:
+                continue
+            _, prev_processor, prev_counter = prev_threads[tid]
+            if counter is not None and prev_counter is not None:
+                migrations += counter - prev_counter
+            elif processor != prev_processor:
+                migrations += 1
+
+        prev_ctx = self.prev_ctx.get(pid, ctx)
+        voluntary = ctx.voluntary - prev_ctx.voluntary
+        involuntary = ctx.involuntary - prev_ctx.involuntary
+
+        self.prev_threads[pid] = threads
+        self.prev_ctx[pid] = ctx
+
+        runnable = sum(1 for state, _, _ in threads.values() if state == "R")
+        return migrations, voluntary, involuntary, runnable
+
+    def forget(self, alive_pids):
+        """Drop the counters of processes that exited"""
+        for pid in list(self.prev_threads):
+            if pid not in alive_pids:
+                self.prev_threads.pop(pid, None)
+                self.prev_ctx.pop(pid, None)
+
+
+def oversubscribed(runnable_by_cpuset):
+    """(cpuset, runnable) of the cpusets with more runnable threads than CPUs they are allowed to run on"""
+    return [(cpuset, runnable) for cpuset, runnable in runnable_by_cpuset.items() if runnable > len(cpuset)]
+
+
+def format_cpuset(cpus):
+    return " ".join(str(c) for c in sorted(cpus))
+
+
+def main():
+    args = parse_args()
+    hostname = socket.gethostname()
+    job_id = os.environ.get("SLURM_JOB_ID", "nojob")
+    log_file = f"./cpulog_{job_id}_{hostname}.csv"
+    user = None if args.all_users else psutil.Process().username()
+    own_pid = os.getpid()
+
+    print(f"[cpu_monitor] Logging to {log_file} every {args.interval}s")
+
+    tracker = ProcessTracker()
+    procs = {}
+    # prime the counters: the first cpu_percent calls always return 0
+    psutil.cpu_percent(percpu=True)
+
+    with open(log_file, "a") as f:
+        # kind: core (id = cpu), proc (id = pid), oversub (id = cpuset)
+        f.write(
+            "timestamp,hostname,job_id,kind,id,name,cpu_percent,migrations,"
+            "ctx_voluntary,ctx_involuntary,runnable,allowed_cpus\n"
+        )  # CSV header
+        while True:
+            time.sleep(args.interval)
+            timestamp = time.time()
+            lines = []
+
+            for cpu, util in enumerate(psutil.cpu_percent(percpu=True)):
+                lines.append(f"{timestamp},{hostname},{job_id},core,{cpu},,{util},,,,,")
+
+            runnable_by_cpuset = defaultdict(int)
+            alive = set()
+            for proc in psutil.process_iter(["pid", "name", "username"]):
+                if proc.pid == own_pid or (user is not None and proc.info["username"] != user):
+                    continue
+                # keep the Process objects so that cpu_percent measures the whole interval
+                proc = procs.setdefault(proc.pid, proc)
+                alive.add(proc.pid)
+                try:
+                    cpu_percent = proc.cpu_percent()
+                    affinity = proc.cpu_affinity()
+                    migrations, voluntary, involuntary, runnable = tracker.sample(proc)
+                except (psutil.NoSuchProcess, psutil.AccessDenied, FileNotFoundError):
+                    continue
+
+                runnable_by_cpuset[frozenset(affinity)] += runnable
+                if cpu_percent >= args.min_cpu or runnable > 0:
+                    name = proc.info["name"].replace(",", "_")
+                    lines.append(
+                        f"{timestamp},{hostname},{job_id},proc,{proc.pid},{name},{cpu_percent},"
+                        f"{migrations},{voluntary},{involuntary},{runnable},{len(affinity)}"
+                    )
+
+            for cpuset, runnable in oversubscribed(runnable_by_cpuset):
+                lines.append(
+                    f"{timestamp},{hostname},{job_id},oversub,{format_cpuset(cpuset)},,,,,,"
+                    f"{runnable},{len(cpuset)}"
+                )
+
+            for pid in list(procs):
+                if pid not in alive:
+                    del procs[pid]
+            tracker.forget(alive)
+
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+CPU Partition Planner
+
+Reads the socket, NUMA, L3 and SMT topology of the node from /sys/devices/system
+and splits its CPUs between the components of a run:
+  - head node: memory logger, Ray head (or Dask scheduler), analytics driver
+  - sim node:  memory logger, Ray worker (or Dask worker), ParFlow ranks
+
+Components are packed in order on contiguous L3/NUMA domains and, whenever there
+are enough spare cores, a component starts on a fresh domain so that the simulation
+and the analytics do not share caches or memory controllers.
+
+The plan is printed as shell assignments that the run scripts can evaluate:
+
+    eval "$(python3 utils/cpu-planner.py sim --ray-worker 11)"
+    srun --cpu-bind=verbose,$PARFLOW_CPU_BIND ...
+    $RAY_WORKER_TASKSET ray start ...
+
+With --verify, test-cpu-bind.py workers are pinned with the plan and their live
+placement is checked against it.
+"""
+
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+SYSFS_ROOT = "/sys/devices/system"
+
+# Default splits of the run scripts on 112-core nodes (see scripts/run/leonardo/)
+DEFAULT_COMPONENTS = {
+    "head": [("memory_logger", 1), ("ray_head", 55), ("analytics", 56)],
+    "sim": [("memory_logger", 1), ("ray_worker", 11), ("parflow", None)],
+}
+
+
+class Cpu(NamedTuple):
+    """A logical CPU and the domains it belongs to."""
+
+    cpu: int
+    socket: int
+    numa: int
+    l3: int
+    core: int
+    # index among the SMT siblings of the core (0 for the first hardware thread)
+    thread: int
+
+
+def parse_cpu_list(text: str) -> List[int]:
+    """Parse a sysfs CPU list such as '0-3,8,10-11'."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpu_list(cpus: List[int]) -> str:
+    """Format CPUs as a compact list such as '0-3,8,10-11' (taskset -c syntax)."""
+    cpus = sorted(cpus)
+    ranges = []
+    start = prev = None
+    for cpu in cpus:
+        if start is None:
+            start = prev = cpu
+        elif cpu == prev + 1:
+            prev = cpu
+        else:
+            ranges.append((start, prev))
+            start = prev = cpu
+    if start is not None:
+        ranges.append((start, prev))
+    return ",".join(f"{a}" if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def format_cpu_mask(cpus: List[int]) -> str:
+    """Format CPUs as a hexadecimal mask (srun --cpu-bind=mask_cpu syntax)."""
+    mask = 0
+    for cpu in cpus:
+        mask |= 1 << cpu
+    return hex(mask)
+
+
+def _read(path: str, default: Optional[str] = None) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def read_topology(root: str = SYSFS_ROOT, allowed: Optional[List[int]] = None) -> List[Cpu]:
+    """Read the topology of the online (and allowed) CPUs from sysfs."""
+    online = parse_cpu_list(_read(os.path.join(root, "cpu", "online"), "") or "")
+    if not online:
+        online = sorted(
+            int(os.path.basename(p)[3:]) for p in glob.glob(os.path.join(root, "cpu", "cpu[0-9]*"))
+        )
+    if allowed is not None:
+        online = [c for c in online if c in set(allowed)]
+
+    numa_of = {}
+    for node_dir in glob.glob(os.path.join(root, "node", "node[0-9]*")):
+        node = int(os.path.basename(node_dir)[4:])
+        for cpu in parse_cpu_list(_read(os.path.join(node_dir, "cpulist"), "") or ""):
+            numa_of[cpu] = node
+
+    cpus = []
+    for cpu in online:
+        base = os.path.join(root, "cpu", f"cpu{cpu}")
+        socket = int(_read(os.path.join(base, "topology", "physical_package_id"), "0"))
+        core = int(_read(os.path.join(base, "topology", "core_id"), str(cpu)))
+        siblings = parse_cpu_list(_read(os.path.join(base, "topology", "thread_siblings_list"), str(cpu)))
+        # the L3 domain is identified by its lowest CPU, fall back to the socket
+        l3_cpus = _read(os.path.join(base, "cache", "index3", "shared_cpu_list"))
+        l3 = min(parse_cpu_list(l3_cpus)) if l3_cpus else socket
+        cpus.append(
+            Cpu(
+                cpu=cpu,
+                socket=socket,
+                numa=numa_of.get(cpu, socket),
+                l3=l3,
+                core=core,
+                thread=sorted(siblings).index(cpu) if cpu in siblings else 0,
+            )
+        )
+    return cpus
+
+
+def plan_partition(
+    cpus: List[Cpu], components: List[Tuple[str, Optional[int]]], use_smt: bool = False
+) -> Dict[str, List[int]]:
+    """Assign CPUs to components, packing them on contiguous L3/NUMA domains.
+
+    A component with a count of None receives all the CPUs left by the others.
+    Raises ValueError if the node does not have enough CPUs.
+    """
+    usable = [c for c in cpus if use_smt or c.thread == 0]
+    # SMT siblings are placed after all the first threads so that they are only used last
+    usable.sort(key=lambda c: (c.thread, c.socket, c.numa, c.l3, c.core, c.cpu))
+
+    fixed = sum(n for _, n in components if n is not None)
+    if fixed > len(usable):
+        raise ValueError(f"Requested {fixed} CPUs but only {len(usable)} are usable")
+    counts = [(name, n if n is not None else len(usable) - fixed) for name, n in components]
+    if sum(n for _, n in counts) > len(usable):
+        raise ValueError(f"Requested more CPUs than the {len(usable)} usable ones")
+
+    domain = [(c.numa, c.l3) for c in usable]
+    # first index of every domain change (domain boundaries)
+    boundaries = [i for i in range(1, len(usable)) if domain[i] != domain[i - 1]]
+
+    plan = {}
+    pos = 0
+    for i, (name, n) in enumerate(counts):
+        remaining = sum(m for _, m in counts[i:])
+        if 0 < pos < len(usable) and domain[pos] == domain[pos - 1]:
+            # start the component on the next domain if there is enough slack
+            next_boundary = next((b for b in boundaries if b > pos), None)
+            if next_boundary is not None and len(usable) - next_boundary >= remaining:
+                pos = next_boundary
+        plan[name] = sorted(c.cpu for c in usable[pos : pos + n])
+        pos += n
+    return plan
+
+
+def plan_to_shell(plan: Dict[str, List[int]]) -> str:
+    """Shell assignments with the CPU count, list, srun binding and taskset prefix of every component."""
+    lines = []
+    for name, cpus in plan.items():
+        var = name.upper()
+        lines.append(f"{var}_CPUS={len(cpus)}")
+        lines.append(f'{var}_CPU_LIST="{format_cpu_list(cpus)}"')
+        lines.append(f'{var}_CPU_MASK="{format_cpu_mask(cpus)}"')
+        lines.append(f'{var}_TASKSET="taskset -c {format_cpu_list(cpus)}"')
+        # one CPU per task: rank i is bound to the i-th CPU of the list
+        lines.append(f'{var}_CPU_BIND="map_cpu:{",".join(str(c) for c in cpus)}"')
+    return "\n".join(lines)
+
+
+def load_cpu_bind_test():
+    """Load test-cpu-bind.py (not importable by name because of the dashes)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-cpu-bind.py")
+    spec = importlib.util.spec_from_file_location("test_cpu_bind", path)
+    module = importlib.util.module_from_spec(spec)
+    # registered so that its worker function can be pickled for the process pool
+    sys.modules["test_cpu_bind"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def verify_plan(plan: Dict[str, List[int]]) -> bool:
+    """Pin one test-cpu-bind.py worker per planned CPU and check where they actually ran."""
+    cpu_bind = load_cpu_bind_test()
+
+    worker_args = []
+    owners = []
+    for name, cpus in plan.items():
+        for i in range(len(cpus)):
+            worker_args.append((i, len(cpus), cpus))
+            owners.append(name)
+
+    print(f"🔍 Verifying plan with {len(worker_args)} pinned workers...")
+    with ProcessPoolExecutor(max_workers=len(worker_args)) as executor:
+        results = list(executor.map(cpu_bind.worker, worker_args))
+
+    ok = True
+    for name, cpus in plan.items():
+        allowed = set(cpus)
+        mine = [r for r, owner in zip(results, owners) if owner == name]
+        escaped = [r for r in mine if r["final_cpu"] not in allowed or not set(r["available_cpus"]) <= allowed]
+        migrations = sum(r["migrations"] for r in mine)
+        used = {r["final_cpu"] for r in mine}
+        status = "✅" if not escaped else "⚠️ "
+        print(
+            f"{status} {name:15s} cpus={format_cpu_list(cpus):20s} "
+            f"workers={len(mine):3d} distinct_cpus={len(used):3d} escaped={len(escaped)} migrations={migrations}"
+        )
+        ok = ok and not escaped
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan CPU partitions of head/simulation nodes from the topology")
+    parser.add_argument("role", choices=sorted(DEFAULT_COMPONENTS), help="Role of the node")
+    parser.add_argument(
+        "--component",
+        action="append",
+        default=None,
+        metavar="NAME=COUNT",
+        help="Component and CPU count, in placement order (COUNT 'rest' takes the remaining CPUs). "
+        "Replaces the role defaults when given.",
+    )
+    parser.add_argument("--ray-worker", type=int, default=None, help="CPUs of the Ray worker (sim role)")
+    parser.add_argument("--parflow", type=int, default=None, help="Number of ParFlow ranks (sim role)")
+    parser.add_argument("--use-smt", action="store_true", help="Also use the SMT siblings of the cores")
+    parser.add_argument("--all-cpus", action="store_true", help="Ignore the affinity of the current process")
+    parser.add_argument("--sysfs", default=SYSFS_ROOT, help=f"sysfs root (default: {SYSFS_ROOT})")
+    parser.add_argument("--format", choices=["shell", "json"], default="shell", help="Output format")
+    parser.add_argument("--verify", action="store_true", help="Verify the live placement with test-cpu-bind.py")
+    args = parser.parse_args()
+
+    if args.component:
+        components = []
+        for spec in args.component:
+            name, _, count = spec.partition("=")
+            components.append((name, None if count == "rest" else int(count)))
+    else:
+        components = list(DEFAULT_COMPONENTS[args.role])
+        overrides = {"ray_worker": args.ray_worker, "parflow": args.parflow}
+        components = [(n, overrides[n] if overrides.get(n) is not None else c) for n, c in components]
+
+    allowed = None if args.all_cpus else sorted(os.sched_getaffinity(0))
+    cpus = read_topology(args.sysfs, allowed)
+
+    try:
+        plan = plan_partition(cpus, components, use_smt=args.use_smt)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.format == "json":
+        print(json.dumps(plan))
+    else:
+        print(plan_to_shell(plan))
+
+    if args.verify:
+        return 0 if verify_plan(plan) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
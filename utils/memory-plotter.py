@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import glob
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -7,6 +8,7 @@ import os
 import plotly.express as px
 import itertools
 import re
+import warnings
 from collections import defaultdict
 
 # Line styles and thicknesses
@@ -70,32 +72,99 @@ def load_experiment_data(exp_dir):
     
     return df
 
-def aggregate_experiments(exp_dfs):
-    """Aggregate multiple experiment dataframes by taking the mean"""
-    if len(exp_dfs) == 1:
-        return exp_dfs[0]
-    
-    # Combine all dataframes
-    combined_df = pd.concat(exp_dfs, ignore_index=True)
-    
-    # Group by relative timestamp and hostname, then take mean of metrics
+def lttb_indices(x, y, threshold):
+    """Pick the indices of a Largest-Triangle-Three-Buckets downsampling of (x, y)"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # First and last points are always kept, the rest is split into equal buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket is the third vertex of the triangle
+        next_start, next_end = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+def common_time_grid(exp_dfs):
+    """Build a regular time grid covering all experiments, spaced by the median sampling interval"""
+    intervals = []
+    t_end = 0.0
+    for df in exp_dfs:
+        for _, host_data in df.groupby("hostname", sort=False):
+            diffs = np.diff(host_data["relative_timestamp"].to_numpy())
+            intervals.append(diffs[diffs > 0])
+        t_end = max(t_end, df["relative_timestamp"].max())
+
+    intervals = np.concatenate(intervals) if intervals else np.array([])
+    step = float(np.median(intervals)) if len(intervals) else 1.0
+    return np.arange(0.0, t_end + step / 2, step)
+
+def aggregate_experiments(exp_dfs, confidence_z=1.96):
+    """Aggregate repeated experiments by interpolating every run onto a common time grid.
+
+    Each host of each run is resampled with linear interpolation (no extrapolation
+    outside of the run's own time span), then the mean and a normal-approximation
+    confidence band ``mean +/- z * std / sqrt(n)`` are computed across repetitions.
+    """
     metrics = ["used_GB", "available_GB", "free_GB", "total_GB"]
-    
-    # Round relative timestamps to nearest second to help with grouping
-    combined_df["relative_timestamp_rounded"] = combined_df["relative_timestamp"].round(0)
-    
-    # Group and aggregate
-    agg_dict = {metric: "mean" for metric in metrics}
-    agg_dict["relative_timestamp"] = "first"  # Keep original relative timestamp
-    
-    aggregated = combined_df.groupby(["relative_timestamp_rounded", "hostname"]).agg(agg_dict).reset_index()
-    aggregated = aggregated.drop("relative_timestamp_rounded", axis=1)
-    aggregated.sort_values("relative_timestamp", inplace=True)
-    
+    grid = common_time_grid(exp_dfs)
+
+    # host -> list of (n_metrics, n_grid) arrays, one per repetition
+    resampled = defaultdict(list)
+    for df in exp_dfs:
+        for host, host_data in df.groupby("hostname", sort=False):
+            t = host_data["relative_timestamp"].to_numpy()
+            values = host_data[metrics].to_numpy().T
+            run = np.full((len(metrics), len(grid)), np.nan)
+            inside = (grid >= t[0]) & (grid <= t[-1])
+            for m in range(len(metrics)):
+                run[m, inside] = np.interp(grid[inside], t, values[m])
+            resampled[host].append(run)
+
+    frames = []
+    for host, runs in resampled.items():
+        stacked = np.stack(runs)  # (n_runs, n_metrics, n_grid)
+        n = np.sum(~np.isnan(stacked), axis=0)
+        valid = n[0] > 0
+        # Grid points covered by a single run have no spread, silence the ddof warnings
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nanmean(stacked[:, :, valid], axis=0)
+            std = np.nanstd(stacked[:, :, valid], axis=0, ddof=1) if len(runs) > 1 else np.zeros_like(mean)
+            half_width = confidence_z * np.nan_to_num(std) / np.sqrt(n[:, valid])
+
+        frame = {"relative_timestamp": grid[valid], "hostname": host, "n_runs": n[0, valid]}
+        for m, metric in enumerate(metrics):
+            frame[metric] = mean[m]
+            frame[f"{metric}_lo"] = mean[m] - half_width[m]
+            frame[f"{metric}_hi"] = mean[m] + half_width[m]
+        frames.append(pd.DataFrame(frame))
+
+    aggregated = pd.concat(frames, ignore_index=True)
+    aggregated.sort_values(["hostname", "relative_timestamp"], inplace=True)
     return aggregated
 
-def create_memory_plot(df, config):
-    """Create the memory usage plot for a given configuration"""
+def create_memory_plot(df, config, max_points=1000):
+    """Create the memory usage plot for a given configuration.
+
+    Every series is downsampled with LTTB to at most ``max_points`` points so that
+    large node counts and long runs still produce a responsive report.
+    """
     hostnames = df["hostname"].unique()
     style_map = generate_host_styles(hostnames)
     
@@ -115,19 +184,26 @@ def create_memory_plot(df, config):
         ("total_GB", 2, 2),
     ]
     
-    for metric, row, col in plots:
-        # Sort by shortname
-        sorted_hosts = sorted(hostnames, key=lambda h: style_map[h]["shortname"])
-        for i, host in enumerate(sorted_hosts):
-            host_data = df[df["hostname"] == host]
+    # Single pass over the hosts, sorted by shortname
+    host_groups = dict(list(df.groupby("hostname", sort=False)))
+    sorted_hosts = sorted(hostnames, key=lambda h: style_map[h]["shortname"])
+    for host in sorted_hosts:
+        host_data = host_groups[host]
+        shortname = style_map[host]["shortname"]
+        x = host_data["relative_timestamp"].to_numpy()
+        has_band = "n_runs" in host_data and host_data["n_runs"].max() > 1
+
+        for metric, row, col in plots:
+            y = host_data[metric].to_numpy()
+            idx = lttb_indices(x, y, max_points)
             show_legend = (row == 1 and col == 1)  # show legend only in top-left
-            shortname = style_map[host]["shortname"]
             fig.add_trace(
                 go.Scatter(
-                    x=host_data["relative_timestamp"],
-                    y=host_data[metric],
+                    x=x[idx],
+                    y=y[idx],
                     mode="lines",
                     name=shortname if show_legend else None,
+                    legendgroup=shortname,
                     line=dict(
                         color=style_map[host]["color"],
                         dash=style_map[host]["dash"],
@@ -138,6 +214,24 @@ def create_memory_plot(df, config):
                 ),
                 row=row, col=col
             )
+
+            if has_band:
+                lo = host_data[f"{metric}_lo"].to_numpy()[idx]
+                hi = host_data[f"{metric}_hi"].to_numpy()[idx]
+                fig.add_trace(
+                    go.Scatter(
+                        x=np.concatenate([x[idx], x[idx][::-1]]),
+                        y=np.concatenate([hi, lo[::-1]]),
+                        fill="toself",
+                        fillcolor=style_map[host]["color"],
+                        opacity=0.2,
+                        line=dict(color="rgba(255,255,255,0)"),
+                        legendgroup=shortname,
+                        hoverinfo="skip",
+                        showlegend=False,
+                    ),
+                    row=row, col=col
+                )
     
     ranksx, ranksy, numnodes = config
     fig.update_layout(
@@ -159,6 +253,8 @@ def main():
     parser = argparse.ArgumentParser(description="Generate memory usage reports from experiment directories.")
     parser.add_argument("parent_dir", nargs="?", default=".", 
                        help="Parent directory containing experiment subdirectories (default: current directory)")
+    parser.add_argument("--max-points", type=int, default=1000,
+                       help="Maximum number of points per series after LTTB downsampling (default: 1000)")
     args = parser.parse_args()
     
     parent_dir = args.parent_dir
@@ -204,12 +300,12 @@ def main():
             print(f"[!] No valid data found for configuration {config}")
             continue
         
-        # Aggregate the experiments (take mean)
+        # Aggregate the experiments (mean and confidence band on a common time grid)
         aggregated_df = aggregate_experiments(exp_dfs)
         print(f"    Aggregated {len(exp_dfs)} experiments")
         
         # Create the plot
-        fig = create_memory_plot(aggregated_df, config)
+        fig = create_memory_plot(aggregated_df, config, max_points=args.max_points)
         
         # Save the plot with parent directory name included
         parent_name = os.path.basename(os.path.abspath(parent_dir))
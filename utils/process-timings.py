@@ -9,7 +9,9 @@ Supports both regular experiments and DEISA experiments with different output fo
 # TODO : ADD EXP ID
 # TODO : ADD ABSOLUTE TIMING?
 
+import os
 import re
+import sys
 import csv
 import statistics
 import argparse
@@ -17,6 +19,8 @@ import glob
 from pathlib import Path
 from typing import List, Tuple, Dict, Optional, NamedTuple
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analytics"))
+
 
 class ExperimentResult(NamedTuple):
     """Container for experiment results."""
@@ -53,6 +57,104 @@ class ExperimentResult(NamedTuple):
     stdev_graph_compute_time: Optional[float]
     # total time of analytics
     total_analytics_time: Optional[float]
+    # columns computed from dask-metrics.npz (Deisa runs with analytics/dask_metrics.py), overall and per step
+    task_metrics: Dict[str, Optional[float]] = {}
+    # reduction tree chosen by analytics/reductions.py ([REDUCTION, PLAN] line) and its
+    # measured time ([REDUCTION, EXECUTED] lines)
+    reduction_plan: Dict[str, object] = {}
+    # degradation of the Doreisa callbacks by analytics/shedding.py ([SHEDDING, <step>] lines)
+    shedding: Dict[str, object] = {}
+
+
+# file written by analytics/dask_metrics.py
+METRICS_FILE_GLOB = "dask-metrics*.npz"
+# file written by analytics/results_store.py (Doreisa scripts), takes precedence over the TIMINGS lists
+RESULTS_FILE_GLOB = "analytics-results*.bin"
+TASK_METRICS = ["avg_scheduler_overhead", "locality_hit_rate", "transfer_bytes", "spill_bytes"]
+REDUCTION_PLAN = [
+    "reduction_split_every",
+    "reduction_levels",
+    "reduction_tasks",
+    "reduction_predicted_time",
+    "reduction_task_overhead",
+    "reduction_plan_time",
+    "reduction_executed_steps",
+    "reduction_executed_time",
+]
+SHEDDING = [
+    "shedding_skipped_steps",
+    "shedding_sampled_steps",
+    "shedding_no_optional_steps",
+    "shedding_max_level",
+    "shedding_max_backlog",
+]
+
+
+def task_metrics(columns: Dict) -> Dict[str, Optional[float]]:
+    """
+    Aggregate the task events recorded by dask_metrics.TaskMetricsPlugin, overall and by timestep:
+      - avg_scheduler_overhead: mean time between the assignment of a task and the start of its
+        compute, minus the time spent fetching its dependencies
+      - locality_hit_rate: bytes of the dependencies already on the worker / all the dependency bytes
+      - transfer_bytes: bytes fetched from other workers
+      - spill_bytes: bytes written to disk by the workers
+    """
+    tasks = {}
+    for key, step, action, start, stop, nbytes, local, remote in zip(
+        columns["key"],
+        columns["timestep"],
+        columns["action"],
+        columns["start"],
+        columns["stop"],
+        columns["nbytes"],
+        columns["local_nbytes"],
+        columns["remote_nbytes"],
+    ):
+        task = tasks.setdefault(
+            str(key),
+            {
+                "step": int(step),
+                "assign": None,
+                "compute": None,
+                "transfer": 0.0,
+                "local": 0,
+                "remote": 0,
+                "transferred": 0,
+                "spilled": 0,
+            },
+        )
+        if action == "assign":
+            task["assign"] = float(start)
+            task["local"] += int(local)
+            task["remote"] += int(remote)
+        elif action == "compute":
+            task["compute"] = float(start)
+        elif action == "transfer":
+            task["transfer"] += float(stop) - float(start)
+            task["transferred"] += int(nbytes)
+        elif action == "disk-write":
+            task["spilled"] += int(nbytes)
+
+    def aggregate(group: List[Dict]) -> Dict[str, Optional[float]]:
+        overheads = [
+            max(t["compute"] - t["assign"] - t["transfer"], 0.0)
+            for t in group
+            if t["assign"] is not None and t["compute"] is not None
+        ]
+        local = sum(t["local"] for t in group)
+        remote = sum(t["remote"] for t in group)
+        return {
+            "avg_scheduler_overhead": statistics.mean(overheads) if overheads else None,
+            "locality_hit_rate": local / (local + remote) if local + remote > 0 else None,
+            "transfer_bytes": sum(t["transferred"] for t in group),
+            "spill_bytes": sum(t["spilled"] for t in group),
+        }
+
+    metrics = aggregate(list(tasks.values()))
+    for step in sorted({t["step"] for t in tasks.values() if t["step"] >= 0}):
+        for name, value in aggregate([t for t in tasks.values() if t["step"] == step]).items():
+            metrics[f"{name}_step_{step}"] = value
+    return metrics
 
 
 class TimingParser:
@@ -82,6 +184,10 @@ class TimingParser:
         self.timings_compute_end = []
         self.timings_compute = []
 
+        self.task_metrics = {}
+        self.reduction_plan = {}
+        self.shedding = {}
+
     def parse_csv_file(self, csv_file_path: str) -> None:
         """Parse the *.out.timing.csv file to extract Total Runtime."""
         try:
@@ -115,6 +221,38 @@ class TimingParser:
         except Exception as e:
             print(f"    ❌ Error parsing log file: {e}")
 
+    def parse_metrics_file(self, metrics_file_path: str) -> None:
+        """Parse the dask-metrics.npz file of analytics/dask_metrics.py."""
+        try:
+            import numpy as np
+
+            with np.load(metrics_file_path, allow_pickle=False) as data:
+                columns = {column: data[column] for column in data.files}
+            self.task_metrics = task_metrics(columns)
+        except FileNotFoundError:
+            print(f"    ❌ Metrics file not found: {metrics_file_path}")
+        except Exception as e:
+            print(f"    ❌ Error parsing metrics file: {e}")
+
+    def parse_results_file(self, results_file_path: str) -> None:
+        """Parse the timings of the analytics-results.bin store of analytics/results_store.py."""
+        try:
+            from results_store import COMPUTE, GRAPH, read_store, timings
+
+            records, names = read_store(results_file_path)
+            timings_graph = timings(records, names, GRAPH)
+            timings_compute = timings(records, names, COMPUTE)
+            self.timings_graph_start = [elem[0] for elem in timings_graph]
+            self.timings_graph_end = [elem[1] for elem in timings_graph]
+            self.timings_graph = [elem[2] for elem in timings_graph]
+            self.timings_compute_start = [elem[0] for elem in timings_compute]
+            self.timings_compute_end = [elem[1] for elem in timings_compute]
+            self.timings_compute = [elem[2] for elem in timings_compute]
+        except FileNotFoundError:
+            print(f"    ❌ Results file not found: {results_file_path}")
+        except Exception as e:
+            print(f"    ❌ Error parsing results file: {e}")
+
     def parse_output_file(self, log_file_path: str) -> None:
         """Parse the R-.o log file to extract timing information."""
         try:
@@ -170,6 +308,40 @@ class TimingParser:
                 self.timings_compute_end = []
                 self.timings_compute = []
 
+        # Extract the reduction tree of the analytics (the last plan if there are several)
+        plan_pattern = (
+            r"\[REDUCTION, PLAN\] START: \S+ END: \S+ DIFF: (\S+) SPLIT_EVERY: (\S+) "
+            r"LEVELS: (\d+) TASKS: (\d+) PREDICTED: (\S+) OVERHEAD: (\S+)"
+        )
+        for diff, split_every, levels, tasks, predicted, overhead in re.findall(plan_pattern, content):
+            self.reduction_plan = {
+                "reduction_split_every": split_every,
+                "reduction_levels": int(levels),
+                "reduction_tasks": int(tasks),
+                "reduction_predicted_time": float(predicted),
+                "reduction_task_overhead": float(overhead),
+                "reduction_plan_time": float(diff),
+            }
+        # mean time of the executed reductions, against the predicted time of the plan
+        executed_pattern = r"\[REDUCTION, EXECUTED\] STEP: \d+ START: \S+ END: \S+ DIFF: (\S+)"
+        executed = [float(diff) for diff in re.findall(executed_pattern, content)]
+        if self.reduction_plan:
+            self.reduction_plan["reduction_executed_steps"] = len(executed)
+            self.reduction_plan["reduction_executed_time"] = statistics.mean(executed) if executed else None
+
+        # Extract the shedding decisions, one per step
+        shedding_pattern = r"\[SHEDDING, (\d+)\] START: \S+ LEVEL: (\d+) ACTION: (\S+) STRIDE: \d+ BACKLOG: (\d+)"
+        decisions = re.findall(shedding_pattern, content)
+        if decisions:
+            actions = [action for _, _, action, _ in decisions]
+            self.shedding = {
+                "shedding_skipped_steps": actions.count("skip"),
+                "shedding_sampled_steps": sum("sample:" in action for action in actions),
+                "shedding_no_optional_steps": sum("no-optional" in action for action in actions),
+                "shedding_max_level": max(int(level) for _, level, _, _ in decisions),
+                "shedding_max_backlog": max(int(backlog) for _, _, _, backlog in decisions),
+            }
+
         # Extract initialization times
         init_pattern = r"\[PDI, SETUP, (\d+)\] START: (\d+(?:\.\d+)?) END: (\d+(?:\.\d+)?) DIFF: (\d+(?:\.\d+)?)"
         init_matches = re.findall(init_pattern, content)
@@ -419,6 +591,16 @@ class BatchExperimentProcessor:
         parser.parse_output_file(r_file)
         parser.parse_log_file(log_file)
 
+        metrics_files = list(experiment_dir.glob(METRICS_FILE_GLOB))
+        if metrics_files:
+            print(f"    📄 Found metrics file: {metrics_files[0].name}")
+            parser.parse_metrics_file(str(metrics_files[0]))
+
+        results_files = list(experiment_dir.glob(RESULTS_FILE_GLOB))
+        if results_files:
+            print(f"    📄 Found results file: {results_files[0].name}")
+            parser.parse_results_file(str(results_files[0]))
+
         # Calculate metrics
         metrics = parser.calculate_metrics()
 
@@ -465,6 +647,9 @@ class BatchExperimentProcessor:
             avg_graph_compute_time=metrics["avg_graph_compute_time"],
             stdev_graph_compute_time=metrics["stdev_graph_compute_time"],
             total_analytics_time=metrics["total_analytics_time"],
+            task_metrics=parser.task_metrics,
+            reduction_plan=parser.reduction_plan,
+            shedding=parser.shedding,
         )
 
         print(f"    ✅ Processed {metrics['num_ranks']} ranks successfully")
@@ -528,6 +713,26 @@ class BatchExperimentProcessor:
             ]
         )
 
+        # Add the task metrics if any experiment recorded them
+        task_metric_headers = []
+        if any(result.task_metrics for result in self.results):
+            task_metric_headers = list(TASK_METRICS)
+            for step in range(max_steps):
+                task_metric_headers.extend(f"{name}_step_{step}" for name in TASK_METRICS)
+            headers.extend(task_metric_headers)
+
+        # Add the reduction tree if any experiment printed one
+        reduction_headers = []
+        if any(result.reduction_plan for result in self.results):
+            reduction_headers = list(REDUCTION_PLAN)
+            headers.extend(reduction_headers)
+
+        # Add the shedding decisions if any experiment ran with analytics/shedding.py
+        shedding_headers = []
+        if any(result.shedding for result in self.results):
+            shedding_headers = list(SHEDDING)
+            headers.extend(shedding_headers)
+
         try:
             with open(output_file, "w", newline="") as csvfile:
                 writer = csv.writer(csvfile)
@@ -565,6 +770,9 @@ class BatchExperimentProcessor:
                             result.total_analytics_time,
                         ]
                     )
+                    row.extend(result.task_metrics.get(name) for name in task_metric_headers)
+                    row.extend(result.reduction_plan.get(name) for name in reduction_headers)
+                    row.extend(result.shedding.get(name) for name in shedding_headers)
 
                     writer.writerow(row)
 
@@ -0,0 +1,240 @@
+"""
+Ray Telemetry Collector
+
+Started next to the Ray head of a Doreisa run, periodically snapshots every node of
+the cluster and writes one time series per node, with the timestamp convention of
+memory-logger.py (time.time() seconds, hostname, job_id):
+
+  raylog_<job_id>_<hostname>.csv    object store usage, spilled/restored bytes,
+                                    tasks and actors by state on the node
+  raytasks_<job_id>_<hostname>.csv  one line per finished or failed task that ran on
+                                    the node: start, end and duration
+
+Object store figures come from the raylet of each node (the data of `ray memory`),
+tasks and actors from the Ray state API, which needs the dashboard (ray[default]).
+Without it only the object store columns are filled.
+
+    python3 utils/ray-telemetry.py --address $HEAD_ADDRESS --interval 5
+
+It waits for the head to come up (--connect-timeout), so it can be launched with it,
+and exits once the cluster is stopped.
+"""
+
+import argparse
+import os
+import socket
+import sys
+import time
+from collections import Counter, defaultdict
+
+NODE_HEADER = [
+    "timestamp",
+    "hostname",
+    "job_id",
+    "node_id",
+    "object_store_used_bytes",
+    "object_store_avail_bytes",
+    "primary_copy_bytes",
+    "spilled_bytes",
+    "restored_bytes",
+    "num_local_objects",
+    "tasks_pending",
+    "tasks_running",
+    "tasks_finished",
+    "tasks_failed",
+    "actors_alive",
+    "actors_pending",
+    "actors_dead",
+]
+
+TASK_HEADER = ["timestamp", "hostname", "job_id", "task_id", "name", "type", "state", "start", "end", "duration"]
+
+PENDING_TASK_STATES = {
+    "PENDING_ARGS_AVAIL",
+    "PENDING_NODE_ASSIGNMENT",
+    "PENDING_OBJ_STORE_MEM_AVAIL",
+    "PENDING_ARGS_FETCH",
+    "SUBMITTED_TO_WORKER",
+}
+PENDING_ACTOR_STATES = {"DEPENDENCIES_UNREADY", "PENDING_CREATION", "RESTARTING"}
+
+
+def store_stats(node):
+    """Object store statistics of one node (entry of ray.nodes()), from its raylet."""
+    from ray._private import internal_api
+
+    reply = internal_api.node_stats(node["NodeManagerAddress"], node["NodeManagerPort"], include_memory_info=False)
+    stats = reply.store_stats
+    return {
+        "object_store_used_bytes": stats.object_store_bytes_used,
+        "object_store_avail_bytes": stats.object_store_bytes_avail,
+        "primary_copy_bytes": stats.object_store_bytes_primary_copy,
+        "spilled_bytes": stats.spilled_bytes_total,
+        "restored_bytes": stats.restored_bytes_total,
+        "num_local_objects": stats.num_local_objects,
+    }
+
+
+def state_counts(tasks, actors):
+    """Tasks and actors by state, per node id."""
+    counts = defaultdict(Counter)
+    for task in tasks:
+        if task.state in PENDING_TASK_STATES:
+            counts[task.node_id]["tasks_pending"] += 1
+        elif task.state == "RUNNING":
+            counts[task.node_id]["tasks_running"] += 1
+        elif task.state == "FINISHED":
+            counts[task.node_id]["tasks_finished"] += 1
+        elif task.state == "FAILED":
+            counts[task.node_id]["tasks_failed"] += 1
+    for actor in actors:
+        if actor.state == "ALIVE":
+            counts[actor.node_id]["actors_alive"] += 1
+        elif actor.state in PENDING_ACTOR_STATES:
+            counts[actor.node_id]["actors_pending"] += 1
+        elif actor.state == "DEAD":
+            counts[actor.node_id]["actors_dead"] += 1
+    return counts
+
+
+class TelemetryWriter:
+    """Appends the rows of every node to its own raylog_/raytasks_ file."""
+
+    def __init__(self, output_dir, job_id):
+        self.output_dir = output_dir
+        self.job_id = job_id
+        self.files = {}
+
+    def path(self, prefix, hostname):
+        return os.path.join(self.output_dir, f"{prefix}_{self.job_id}_{hostname}.csv")
+
+    def write(self, prefix, header, hostname, values):
+        key = (prefix, hostname)
+        if key not in self.files:
+            path = self.path(prefix, hostname)
+            new = not os.path.exists(path)
+            self.files[key] = open(path, "a")
+            if new:
+                self.files[key].write(",".join(header) + "\n")
+        f = self.files[key]
+        f.write(",".join("" if v is None else str(v) for v in values) + "\n")
+        f.flush()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+
+class Collector:
+    def __init__(self, writer, task_limit=10000):
+        self.writer = writer
+        self.task_limit = task_limit
+        self.seen_tasks = set()
+        self.state_api = True
+
+    def list_states(self):
+        """Tasks and actors of the cluster, or None when the state API is not available."""
+        if not self.state_api:
+            return None, None
+        from ray.util import state
+
+        try:
+            tasks = state.list_tasks(detail=True, limit=self.task_limit, raise_on_missing_output=False)
+            actors = state.list_actors(limit=self.task_limit, raise_on_missing_output=False)
+        except Exception as e:
+            print(f"[ray_telemetry] State API not available, only the object store is recorded: {e}", flush=True)
+            self.state_api = False
+            return None, None
+        return tasks, actors
+
+    def collect(self):
+        """Take one snapshot of every alive node."""
+        import ray
+
+        timestamp = time.time()
+        nodes = [n for n in ray.nodes() if n["Alive"]]
+        hostnames = {n["NodeID"]: n["NodeManagerHostname"] for n in nodes}
+        tasks, actors = self.list_states()
+        counts = state_counts(tasks, actors) if tasks is not None else None
+
+        for node in nodes:
+            try:
+                stats = store_stats(node)
+            except Exception as e:
+                print(f"[ray_telemetry] No object store stats for {node['NodeManagerHostname']}: {e}", flush=True)
+                stats = {}
+            node_counts = counts.get(node["NodeID"], Counter()) if counts is not None else None
+            values = [timestamp, node["NodeManagerHostname"], self.writer.job_id, node["NodeID"]]
+            values += [stats.get(column) for column in NODE_HEADER[4:10]]
+            values += [node_counts[column] if node_counts is not None else None for column in NODE_HEADER[10:]]
+            self.writer.write("raylog", NODE_HEADER, node["NodeManagerHostname"], values)
+
+        for task in tasks or []:
+            if task.state not in ("FINISHED", "FAILED") or (task.task_id, task.attempt_number) in self.seen_tasks:
+                continue
+            if task.start_time_ms is None or task.end_time_ms is None:
+                continue
+            self.seen_tasks.add((task.task_id, task.attempt_number))
+            start, end = task.start_time_ms / 1000, task.end_time_ms / 1000
+            hostname = hostnames.get(task.node_id, task.node_id)
+            values = [end, hostname, self.writer.job_id, task.task_id, task.name, task.type, task.state, start, end]
+            self.writer.write("raytasks", TASK_HEADER, hostname, values + [end - start])
+        return timestamp
+
+
+def connect(address, timeout):
+    """Connect to the cluster, waiting up to timeout seconds for the head to come up."""
+    import ray
+
+    deadline = time.time() + timeout
+    while True:
+        try:
+            ray.init(address=address, logging_level="ERROR", log_to_driver=False)
+            return
+        except ConnectionError:
+            if time.time() > deadline:
+                raise
+            time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record Ray object store, task and actor telemetry per node")
+    parser.add_argument("--address", default="auto", help="Address of the Ray head (default: auto)")
+    parser.add_argument("--interval", type=float, default=5, help="Interval in seconds between snapshots (default: 5)")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds (default: never)")
+    parser.add_argument("--output-dir", default=".", help="Where the files are written (default: .)")
+    parser.add_argument("--task-limit", type=int, default=10000, help="Maximum tasks listed per snapshot")
+    parser.add_argument(
+        "--connect-timeout", type=float, default=300, help="Time to wait for the Ray head to come up (default: 300)"
+    )
+    args = parser.parse_args()
+
+    import ray
+
+    connect(args.address, args.connect_timeout)
+    job_id = os.environ.get("SLURM_JOB_ID", "nojob")
+    writer = TelemetryWriter(args.output_dir, job_id)
+    collector = Collector(writer, args.task_limit)
+    print(f"[ray_telemetry] Logging {socket.gethostname()} cluster to {args.output_dir} every {args.interval}s")
+
+    end = time.time() + args.duration if args.duration is not None else None
+    try:
+        while end is None or time.time() < end:
+            try:
+                collector.collect()
+            except Exception as e:
+                # the cluster is stopped at the end of the run
+                print(f"[ray_telemetry] Lost the cluster: {e}", flush=True)
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        ray.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""
+Scaling Model Fitter
+
+Fits analytical scaling models to the metrics produced by process-timings.py
+(experiment-timings.csv) and uses them to report parallel efficiency, predict
+untested configurations and suggest the cheapest node count meeting a target
+step time.
+
+Models (W = global number of cells, p = number of MPI ranks, n = number of nodes):
+  - amdahl:     T = a + b * W/p
+  - gustafson:  W/T = c0 + c1 * p        (scaled speedup S(p) = p - alpha * (p - 1))
+  - loglinear:  T = a + b * W/p + c * log2(p) [+ d * log2(n)]
+The best model per metric is chosen with the corrected Akaike criterion (AICc).
+"""
+
+import argparse
+import glob
+import math
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+# number of cells along z, fixed by the clayL deck
+NZ = 240
+
+# metrics (column names of experiment-timings.csv) that are fitted when present
+TIME_METRICS = [
+    "simulation_total_runtime",
+    "step_time",
+    "avg_pdi_publish_time_one_step",
+    "avg_graph_formation_time",
+    "avg_graph_compute_time",
+    "total_analytics_time",
+]
+MEMORY_METRICS = ["peak_memory_GB"]
+
+
+class Config(NamedTuple):
+    """A (possibly untested) run configuration."""
+
+    nodes: int
+    ranks_per_node: int
+    global_cells: int
+
+    @classmethod
+    def from_cells_per_node(cls, nodes: int, ranks_per_node: int, cells: int) -> "Config":
+        # Mirrors clayL.tcl: NX = NY = cells * int(sqrt(nodes))
+        side = cells * math.isqrt(nodes)
+        return cls(nodes, ranks_per_node, side * side * NZ)
+
+    @property
+    def num_ranks(self) -> int:
+        return self.nodes * self.ranks_per_node
+
+
+class FittedModel(NamedTuple):
+    """A fitted model for one metric."""
+
+    metric: str
+    name: str
+    coefficients: np.ndarray
+    # covariance of the coefficients (None if there are not enough points)
+    covariance: Optional[np.ndarray]
+    # residual variance in the metric's unit
+    sigma2: float
+    aicc: float
+    num_points: int
+    # basis columns that were kept (constant ones are dropped)
+    columns: List[str]
+
+
+def parse_config_from_name(name: str) -> Optional[Dict[str, int]]:
+    """Extract xsplit, ysplit, nodes and cells from names like clayL_10_10_4_240_*"""
+    match = re.match(r"clayL_(\d+)_(\d+)_(\d+)_(\d+)", name)
+    if not match:
+        return None
+    xsplit, ysplit, nodes, cells = (int(g) for g in match.groups())
+    return {"xsplit": xsplit, "ysplit": ysplit, "nodes": nodes, "cells": cells}
+
+
+def peak_memory_gb(experiment_dir: str) -> Optional[float]:
+    """Peak used memory (GB) over all nodes of an experiment, from its memlog_*.csv files."""
+    peaks = [
+        pd.read_csv(f, usecols=["used_bytes"])["used_bytes"].max()
+        for f in glob.glob(os.path.join(experiment_dir, "memlog_*.csv"))
+    ]
+    return max(peaks) / 1e9 if peaks else None
+
+
+def load_timings(csv_file: str, experiments_dir: Optional[str] = None) -> pd.DataFrame:
+    """Load experiment-timings.csv and derive the scaling variables of every row."""
+    df = pd.read_csv(csv_file)
+
+    configs = df["experiment_name"].map(parse_config_from_name)
+    valid = configs.notna()
+    if not valid.all():
+        print(f"⚠️  Skipping {int((~valid).sum())} rows with unparsable experiment names")
+    df = df[valid].reset_index(drop=True)
+    configs = pd.DataFrame(list(configs[valid]))
+
+    df["nodes"] = configs["nodes"]
+    df["cells"] = configs["cells"]
+    df["ranks_per_node"] = configs["xsplit"] * configs["ysplit"]
+    df["global_cells"] = [
+        Config.from_cells_per_node(n, r, c).global_cells
+        for n, r, c in zip(df["nodes"], df["ranks_per_node"], df["cells"])
+    ]
+    if "num_steps" in df and "simulation_total_runtime" in df:
+        df["step_time"] = df["simulation_total_runtime"] / df["num_steps"]
+
+    if experiments_dir is not None:
+        df["peak_memory_GB"] = [
+            peak_memory_gb(os.path.join(experiments_dir, name)) for name in df["experiment_name"]
+        ]
+
+    return df
+
+
+def design_matrix(name: str, ranks, nodes, global_cells) -> Dict[str, np.ndarray]:
+    """Basis columns of a linear model (the gustafson model is linear in the work rate)."""
+    p = np.asarray(ranks, dtype=float)
+    n = np.asarray(nodes, dtype=float)
+    w = np.asarray(global_cells, dtype=float)
+
+    if name == "amdahl":
+        return {"serial": np.ones_like(p), "work_per_rank": w / p}
+    if name == "gustafson":
+        return {"rate_serial": np.ones_like(p), "rate_per_rank": p}
+    if name == "loglinear":
+        return {
+            "serial": np.ones_like(p),
+            "work_per_rank": w / p,
+            "log2_ranks": np.log2(p),
+            "log2_nodes": np.log2(n),
+        }
+    if name == "memory":
+        return {
+            "base": np.ones_like(p),
+            "cells_per_node": w / n,
+            "ranks_per_node": p / n,
+        }
+    raise ValueError(f"Unknown model: {name}")
+
+
+def _drop_degenerate(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Drop basis columns that are constant (besides the intercept) or linearly dependent."""
+    kept = {}
+    for key, col in columns.items():
+        candidate = np.column_stack(list(kept.values()) + [col])
+        if np.linalg.matrix_rank(candidate) == candidate.shape[1]:
+            kept[key] = col
+    return kept
+
+
+def fit_model(df: pd.DataFrame, metric: str, name: str) -> Optional[FittedModel]:
+    """Least-squares fit of one model to one metric."""
+    data = df[["num_ranks", "nodes", "global_cells", metric]].dropna()
+    data = data[data[metric] > 0]
+    if len(data) < 2:
+        return None
+
+    columns = _drop_degenerate(
+        design_matrix(name, data["num_ranks"], data["nodes"], data["global_cells"])
+    )
+    X = np.column_stack(list(columns.values()))
+    y = data[metric].to_numpy(dtype=float)
+    target = data["global_cells"].to_numpy(dtype=float) / y if name == "gustafson" else y
+
+    coefficients, _, _, _ = np.linalg.lstsq(X, target, rcond=None)
+    fitted = X @ coefficients
+    n, k = X.shape
+
+    # residuals are always measured on the metric itself so that models are comparable
+    predicted = data["global_cells"].to_numpy(dtype=float) / fitted if name == "gustafson" else fitted
+    sse = float(np.sum((y - predicted) ** 2))
+
+    covariance = None
+    sigma2 = float("nan")
+    if n > k:
+        target_sigma2 = float(np.sum((target - fitted) ** 2)) / (n - k)
+        covariance = target_sigma2 * np.linalg.pinv(X.T @ X)
+        sigma2 = sse / (n - k)
+
+    if n > k + 1:
+        # a perfect fit must not make the criterion undefined
+        aicc = n * math.log(max(sse / n, np.finfo(float).tiny)) + 2 * k + 2 * k * (k + 1) / (n - k - 1)
+    else:
+        aicc = float("inf")
+
+    return FittedModel(metric, name, coefficients, covariance, sigma2, aicc, n, list(columns))
+
+
+def predict(model: FittedModel, configs: List[Config]) -> pd.DataFrame:
+    """Predict a metric for the given configurations, with a one-sigma prediction uncertainty."""
+    ranks = [c.num_ranks for c in configs]
+    nodes = [c.nodes for c in configs]
+    cells = np.array([c.global_cells for c in configs], dtype=float)
+    basis = design_matrix(model.name, ranks, nodes, cells)
+    X = np.column_stack([basis[c] for c in model.columns])
+    value = X @ model.coefficients
+
+    if model.covariance is not None:
+        var_param = np.einsum("ij,jk,ik->i", X, model.covariance, X)
+    else:
+        var_param = np.full(len(configs), np.nan)
+
+    if model.name == "gustafson":
+        # value is a work rate, propagate to time with the delta method
+        time = cells / value
+        var_time = (cells / value**2) ** 2 * var_param
+        mean, var = time, var_time + model.sigma2
+    else:
+        mean, var = value, var_param + model.sigma2
+
+    return pd.DataFrame(
+        {
+            "nodes": nodes,
+            "num_ranks": ranks,
+            "global_cells": cells.astype(int),
+            f"{model.metric}_predicted": mean,
+            f"{model.metric}_uncertainty": np.sqrt(var),
+        }
+    )
+
+
+def fit_all(df: pd.DataFrame) -> Dict[str, FittedModel]:
+    """Fit every applicable model to every available metric and keep the best one (lowest AICc)."""
+    best = {}
+    for metric in TIME_METRICS + MEMORY_METRICS:
+        if metric not in df or df[metric].isna().all():
+            continue
+        names = ["memory"] if metric in MEMORY_METRICS else ["amdahl", "gustafson", "loglinear"]
+        fits = [m for m in (fit_model(df, metric, name) for name in names) if m is not None]
+        if not fits:
+            continue
+        for m in fits:
+            print(f"    {metric:35s} {m.name:10s} AICc={m.aicc:10.3f} points={m.num_points}")
+        best[metric] = min(fits, key=lambda m: (m.aicc, len(m.columns)))
+    return best
+
+
+def parallel_efficiency(df: pd.DataFrame, metric: str = "simulation_total_runtime") -> pd.DataFrame:
+    """Parallel efficiency relative to the smallest rank count: (W/T/p) / (W0/T0/p0)."""
+    grouped = (
+        df.groupby(["nodes", "num_ranks", "global_cells"])[metric].mean().reset_index().sort_values("num_ranks")
+    )
+    rate_per_rank = grouped["global_cells"] / grouped[metric] / grouped["num_ranks"]
+    grouped["parallel_efficiency"] = rate_per_rank / rate_per_rank.iloc[0]
+    return grouped
+
+
+def suggest_nodes(
+    model: FittedModel,
+    target: float,
+    ranks_per_node: int,
+    global_side: int,
+    max_nodes: int,
+    square_only: bool = True,
+) -> Optional[pd.DataFrame]:
+    """Find the node count with the lowest node-seconds whose predicted step time meets the target.
+
+    The global problem (global_side x global_side x NZ) is kept fixed and split over the nodes.
+    """
+    candidates = [
+        n for n in range(1, max_nodes + 1) if not square_only or math.isqrt(n) ** 2 == n
+    ]
+    configs = [Config(n, ranks_per_node, global_side * global_side * NZ) for n in candidates]
+
+    predictions = predict(model, configs)
+    column = f"{model.metric}_predicted"
+    # pessimistic: the prediction plus its uncertainty has to meet the target
+    bound = predictions[column] + predictions[f"{model.metric}_uncertainty"].fillna(0)
+    feasible = predictions[bound <= target].copy()
+    if feasible.empty:
+        return None
+    feasible["node_seconds"] = feasible["nodes"] * feasible[column]
+    return feasible.sort_values("node_seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit scaling models to experiment-timings.csv and predict untested configurations",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Example usage:
+  python scaling-model.py experiments-doreisa/experiment-timings.csv
+  python scaling-model.py experiments-doreisa/experiment-timings.csv --experiments-dir experiments-doreisa/
+  python scaling-model.py experiments-parflow/experiment-timings.csv --predict-nodes 25 36 49
+  python scaling-model.py experiments-parflow/experiment-timings.csv --target-step-time 5 --global-side 1920
+        """,
+    )
+    parser.add_argument("timings_csv", help="experiment-timings.csv produced by process-timings.py")
+    parser.add_argument(
+        "--experiments-dir", default=None, help="Directory with the experiments (adds peak memory from memlog_*.csv)"
+    )
+    parser.add_argument("--predict-nodes", type=int, nargs="*", default=[], help="Node counts to predict")
+    parser.add_argument("--ranks-per-node", type=int, default=None, help="Ranks per node of predicted configs")
+    parser.add_argument("--cells", type=int, default=None, help="Cells per node along x and y of predicted configs")
+    parser.add_argument("--target-step-time", type=float, default=None, help="Target step time (seconds)")
+    parser.add_argument("--global-side", type=int, default=None, help="Global NX = NY used with --target-step-time")
+    parser.add_argument("--max-nodes", type=int, default=256, help="Largest node count considered (default: 256)")
+    parser.add_argument(
+        "--any-node-count", action="store_true", help="Do not restrict suggestions to perfect-square node counts"
+    )
+    parser.add_argument("--output", "-o", default=None, help="Write predictions to this CSV file")
+    args = parser.parse_args()
+
+    df = load_timings(args.timings_csv, args.experiments_dir)
+    if df.empty:
+        print("❌ No usable experiments found")
+        return 1
+    print(f"📂 Loaded {len(df)} experiments, {df['num_ranks'].nunique()} rank counts")
+
+    print("\n🔧 Fitting models")
+    models = fit_all(df)
+
+    print("\n📈 Selected models")
+    for metric, model in models.items():
+        coefficients = ", ".join(f"{c}={v:.4g}" for c, v in zip(model.columns, model.coefficients))
+        print(f"    {metric:35s} {model.name:10s} {coefficients}")
+        if model.name == "gustafson" and len(model.coefficients) == 2:
+            c0, c1 = model.coefficients
+            print(f"    {'':35s} {'':10s} serial fraction alpha={c0 / (c0 + c1):.4f}")
+
+    if "simulation_total_runtime" in df:
+        print("\n⚙️  Parallel efficiency (simulation_total_runtime)")
+        print(parallel_efficiency(df).to_string(index=False))
+
+    ranks_per_node = args.ranks_per_node or int(df["ranks_per_node"].mode().iloc[0])
+    cells = args.cells or int(df["cells"].mode().iloc[0])
+
+    if args.predict_nodes:
+        configs = [Config.from_cells_per_node(n, ranks_per_node, cells) for n in args.predict_nodes]
+        predictions = None
+        for model in models.values():
+            p = predict(model, configs)
+            predictions = p if predictions is None else predictions.merge(p, on=["nodes", "num_ranks", "global_cells"])
+        print("\n🔮 Predictions")
+        print(predictions.to_string(index=False))
+        if args.output:
+            predictions.to_csv(args.output, index=False)
+            print(f"💾 Predictions saved to: {args.output}")
+
+    if args.target_step_time is not None:
+        if "step_time" not in models:
+            print("❌ No step_time model available")
+            return 1
+        if models["step_time"].name != "gustafson" and "work_per_rank" not in models["step_time"].columns:
+            print(
+                "⚠️  The experiments do not vary the work per rank (pure weak scaling), "
+                "suggestions for a fixed global problem ignore the per-rank work"
+            )
+        global_side = args.global_side or cells * math.isqrt(int(df["nodes"].max()))
+        suggestions = suggest_nodes(
+            models["step_time"],
+            args.target_step_time,
+            ranks_per_node,
+            global_side,
+            args.max_nodes,
+            square_only=not args.any_node_count,
+        )
+        if suggestions is None:
+            print(f"\n❌ No node count up to {args.max_nodes} meets {args.target_step_time}s per step")
+        else:
+            best = suggestions.iloc[0]
+            print(
+                f"\n💡 Cheapest configuration meeting {args.target_step_time}s per step: "
+                f"{int(best['nodes'])} nodes ({int(best['num_ranks'])} ranks), "
+                f"predicted {best['step_time_predicted']:.3f}s ± {best['step_time_uncertainty']:.3f}s"
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -6,6 +6,9 @@ import psutil
 import argparse
 from concurrent.futures import ProcessPoolExecutor
 import threading
+import glob
+import json
+import numpy as np
 from typing import Optional, List
 
 def get_current_cpu():
@@ -96,6 +99,176 @@ def worker(args):
 
     return worker_process(worker_id, total_workers)
 
+# STREAM convention: bytes counted per element for each kernel (float64)
+STREAM_BYTES = {"copy": 16, "scale": 16, "add": 24, "triad": 24}
+# elements per block of the triad (128 KiB per array): its two passes run in cache, one pass over memory
+TRIAD_BLOCK = 1 << 14
+
+def triad(a, b, c, scalar, block=TRIAD_BLOCK):
+    """a = b + scalar * c, block by block so that memory is only read and written once (24 B per element)"""
+    for start in range(0, a.size, block):
+        s = slice(start, start + block)
+        np.multiply(c[s], scalar, out=a[s])
+        np.add(a[s], b[s], out=a[s])
+
+def stream_kernels(a, b, c, duration, scalar=3.0):
+    """
+    Run the STREAM copy/scale/add/triad kernels in turn for `duration` seconds
+    and return the best sustained bandwidth of each kernel in GB/s
+    """
+    best = {name: 0.0 for name in STREAM_BYTES}
+    n = a.size
+    end = time.time() + duration
+    # the kernels feed each other: the values grow to inf, the bandwidth does not change
+    with np.errstate(over="ignore", invalid="ignore"):
+        while time.time() < end:
+            for name in STREAM_BYTES:
+                t0 = time.perf_counter()
+                if name == "copy":
+                    np.copyto(c, a)
+                elif name == "scale":
+                    np.multiply(c, scalar, out=b)
+                elif name == "add":
+                    np.add(a, b, out=c)
+                else:
+                    triad(a, b, c, scalar)
+                elapsed = time.perf_counter() - t0
+                best[name] = max(best[name], STREAM_BYTES[name] * n / elapsed / 1e9)
+    return best
+
+def stream_worker(args):
+    """
+    Worker process for the bandwidth benchmarks. Arrays are first touched while
+    pinned to `alloc_cpu` (so they live on its NUMA node), then the kernels run
+    pinned to `run_cpu`. Workers wait for `start_at` so that co-running groups overlap.
+    """
+    worker_id, group, alloc_cpu, run_cpu, elements, duration, start_at = args
+
+    if alloc_cpu is not None:
+        psutil.Process().cpu_affinity([alloc_cpu])
+    a = np.full(elements, 1.0)
+    b = np.full(elements, 2.0)
+    c = np.zeros(elements)
+    if run_cpu is not None:
+        psutil.Process().cpu_affinity([run_cpu])
+
+    time.sleep(max(0.0, start_at - time.time()))
+    bandwidth = stream_kernels(a, b, c, duration)
+
+    return {
+        'worker_id': worker_id,
+        'group': group,
+        'alloc_cpu': alloc_cpu,
+        'run_cpu': run_cpu,
+        'final_cpu': get_current_cpu(),
+        'bandwidth': bandwidth,
+    }
+
+def run_stream_workers(specs, elements, duration):
+    """Run one stream_worker per (group, alloc_cpu, run_cpu) spec concurrently"""
+    start_at = time.time() + 1.0 + 0.05 * len(specs)
+    worker_args = [(i, group, alloc, run, elements, duration, start_at)
+                   for i, (group, alloc, run) in enumerate(specs)]
+    with ProcessPoolExecutor(max_workers=len(specs)) as executor:
+        return list(executor.map(stream_worker, worker_args))
+
+def group_bandwidth(results, group, kernel="triad"):
+    """Aggregate bandwidth (GB/s) of the workers of a group"""
+    return sum(r['bandwidth'][kernel] for r in results if r['group'] == group)
+
+def read_numa_nodes():
+    """Map NUMA node id -> list of CPUs (restricted to the CPUs this process may use)"""
+    allowed = set(get_cpu_affinity())
+    nodes = {}
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")):
+        node = int(os.path.basename(os.path.dirname(path))[4:])
+        with open(path) as f:
+            cpus = []
+            for part in f.read().strip().split(','):
+                if '-' in part:
+                    lo, hi = part.split('-')
+                    cpus.extend(range(int(lo), int(hi) + 1))
+                elif part:
+                    cpus.append(int(part))
+        cpus = [c for c in cpus if c in allowed]
+        if cpus:
+            nodes[node] = cpus
+    return nodes
+
+def print_bandwidth_table(results):
+    """Per-worker bandwidth of every kernel"""
+    print(f"{'worker':>6} {'group':>10} {'alloc':>5} {'run':>5} " +
+          " ".join(f"{k + ' GB/s':>11}" for k in STREAM_BYTES))
+    for r in sorted(results, key=lambda r: r['worker_id']):
+        alloc = '-' if r['alloc_cpu'] is None else r['alloc_cpu']
+        run = '-' if r['run_cpu'] is None else r['run_cpu']
+        print(f"{r['worker_id']:>6} {r['group']:>10} {alloc:>5} {run:>5} " +
+              " ".join(f"{r['bandwidth'][k]:>11.2f}" for k in STREAM_BYTES))
+
+def bench_stream(cpus, n_workers, elements, duration):
+    """Sustained bandwidth of N concurrent workers (pinned round-robin on `cpus` if given)"""
+    specs = [("stream", cpus[i % len(cpus)] if cpus else None, cpus[i % len(cpus)] if cpus else None)
+             for i in range(n_workers)]
+    results = run_stream_workers(specs, elements, duration)
+    print_bandwidth_table(results)
+    print(f"{'='*80}")
+    for kernel in STREAM_BYTES:
+        print(f"Aggregate {kernel:5s}: {group_bandwidth(results, 'stream', kernel):8.2f} GB/s")
+
+def bench_numa(elements, duration):
+    """Bandwidth of one core reading memory first-touched on every NUMA node"""
+    nodes = read_numa_nodes()
+    print(f"NUMA nodes: { {n: len(c) for n, c in nodes.items()} }")
+    print(f"{'run node':>8} {'mem node':>8} {'triad GB/s':>11} {'copy GB/s':>11}")
+    matrix = {}
+    for run_node, run_cpus in nodes.items():
+        for mem_node, mem_cpus in nodes.items():
+            # one measurement at a time so that only the NUMA distance changes
+            result = run_stream_workers([("numa", mem_cpus[0], run_cpus[0])], elements, duration)[0]
+            matrix[(run_node, mem_node)] = result['bandwidth']['triad']
+            print(f"{run_node:>8} {mem_node:>8} {result['bandwidth']['triad']:>11.2f} "
+                  f"{result['bandwidth']['copy']:>11.2f}")
+    for run_node in nodes:
+        local = matrix[(run_node, run_node)]
+        remote = [v for (r, m), v in matrix.items() if r == run_node and m != run_node]
+        if remote:
+            print(f"Node {run_node}: remote/local triad ratio {min(remote) / local:.2f} (worst)")
+
+def bench_corun(sim_cpus, analytics_cpus, elements, duration, steps):
+    """
+    Mimic the simulation/analytics CPU split: measure the simulation group alone, then
+    co-running with an increasing number of analytics cores, and report the slowdown
+    """
+    baseline = run_stream_workers([("sim", c, c) for c in sim_cpus], elements, duration)
+    sim_alone = group_bandwidth(baseline, "sim")
+    print(f"Simulation alone on {len(sim_cpus)} CPUs: {sim_alone:.2f} GB/s (triad)")
+    print(f"{'analytics cpus':>14} {'sim GB/s':>10} {'analytics GB/s':>15} {'sim slowdown':>13}")
+
+    counts = sorted(set(
+        max(1, round(len(analytics_cpus) * (i + 1) / steps)) for i in range(steps)
+    ))
+    rows = []
+    for k in counts:
+        specs = [("sim", c, c) for c in sim_cpus] + [("analytics", c, c) for c in analytics_cpus[:k]]
+        results = run_stream_workers(specs, elements, duration)
+        sim_bw = group_bandwidth(results, "sim")
+        ana_bw = group_bandwidth(results, "analytics")
+        slowdown = sim_alone / sim_bw if sim_bw > 0 else float('inf')
+        rows.append((k, sim_bw, ana_bw, slowdown))
+        print(f"{k:>14} {sim_bw:>10.2f} {ana_bw:>15.2f} {slowdown:>12.3f}x")
+    return rows
+
+def load_plan(path):
+    """
+    Read a cpu-planner.py JSON plan and split it into simulation (parflow)
+    and analytics (every other component but the memory logger) CPUs
+    """
+    with open(path) as f:
+        plan = json.load(f)
+    sim = plan.get("parflow", [])
+    analytics = [c for name, cpus in plan.items() if name not in ("parflow", "memory_logger") for c in cpus]
+    return sim, analytics
+
 def parse_affinity_list(arg):
     """Parse a comma-separated list of ints from the command line"""
     try:
@@ -105,15 +278,53 @@ def parse_affinity_list(arg):
 
 def main():
     parser = argparse.ArgumentParser(description='Test CPU affinity and process spreading')
-    parser.add_argument('N', type=int, help='Number of processes to spawn')
+    parser.add_argument('N', type=int, nargs='?', default=None,
+                       help='Number of processes to spawn (optional for the bandwidth benchmarks)')
     parser.add_argument('--show-initial', action='store_true', 
                        help='Show initial CPU affinity of parent process')
     parser.add_argument('--affinity-list', type=parse_affinity_list, default=None, metavar='LIST',
                        help='Comma-separated list of CPU ids to set affinity for worker processes (e.g. 0,1,2,3)')
 
+    parser.add_argument('--bench', choices=['stream', 'numa', 'corun'], default=None,
+                       help='Run a memory-bandwidth benchmark instead of the affinity test: '
+                            'stream (N concurrent workers), numa (local vs remote NUMA node), '
+                            'corun (simulation vs analytics CPU split)')
+    parser.add_argument('--array-mb', type=int, default=64,
+                       help='Size of each benchmark array in MB (default: 64, well above L3)')
+    parser.add_argument('--duration', type=float, default=5.0,
+                       help='Duration of each bandwidth measurement in seconds (default: 5)')
+    parser.add_argument('--sim-cpus', type=parse_affinity_list, default=None, metavar='LIST',
+                       help='CPUs of the simulation group for --bench corun')
+    parser.add_argument('--analytics-cpus', type=parse_affinity_list, default=None, metavar='LIST',
+                       help='CPUs of the analytics group for --bench corun')
+    parser.add_argument('--plan', default=None, metavar='FILE',
+                       help='JSON plan from cpu-planner.py giving the groups for --bench corun')
+    parser.add_argument('--steps', type=int, default=4,
+                       help='Number of analytics core counts tried by --bench corun (default: 4)')
+
     args = parser.parse_args()
-    
-    if args.N <= 0:
+
+    if args.bench is not None:
+        elements = args.array_mb * 1024 * 1024 // 8
+        print(f"=== Memory Bandwidth Benchmark ({args.bench}) ===")
+        print(f"Array size: {args.array_mb} MB x 3, duration: {args.duration}s per measurement")
+        print(f"{'='*80}")
+        if args.bench == 'stream':
+            n_workers = args.N or (len(args.affinity_list) if args.affinity_list else 1)
+            bench_stream(args.affinity_list, n_workers, elements, args.duration)
+        elif args.bench == 'numa':
+            bench_numa(elements, args.duration)
+        else:
+            sim_cpus, analytics_cpus = args.sim_cpus, args.analytics_cpus
+            if args.plan is not None:
+                sim_cpus, analytics_cpus = load_plan(args.plan)
+            if not sim_cpus or not analytics_cpus:
+                print("Error: --bench corun needs --sim-cpus and --analytics-cpus, or --plan")
+                sys.exit(1)
+            bench_corun(sim_cpus, analytics_cpus, elements, args.duration, args.steps)
+        return
+
+    if args.N is None or args.N <= 0:
         print("Error: N must be positive")
         sys.exit(1)
 
@@ -5,6 +5,7 @@ for SIM, PDI, and DOREISA events.
 """
 
 import argparse
+import csv
 import os
 import re
 import glob
@@ -111,7 +112,67 @@ class EventParser:
             self.doreisa_events.append(event_data)
 
 
-def create_timeline_plot(parser, output_file):
+def load_cpu_log(file_path):
+    """Load a cpulog_*.csv file written by cpu-monitor.py.
+
+    Returns the per-sample mean core utilization and the oversubscription events.
+    """
+    core_utils = {}
+    oversub = []
+    with open(file_path, "r") as f:
+        for row in csv.DictReader(f):
+            timestamp = float(row["timestamp"])
+            if row["kind"] == "core":
+                core_utils.setdefault(timestamp, []).append(float(row["cpu_percent"]))
+            elif row["kind"] == "oversub":
+                oversub.append(
+                    {
+                        "timestamp": timestamp,
+                        "cpuset": row["id"],
+                        "runnable": int(row["runnable"]),
+                        "allowed": int(row["allowed_cpus"]),
+                    }
+                )
+
+    utilization = [(t, sum(u) / len(u)) for t, u in sorted(core_utils.items())]
+    return utilization, oversub
+
+
+def add_cpu_overlay(fig, cpu_log):
+    """Overlay the node CPU utilization and oversubscription events on a secondary axis."""
+    utilization, oversub = load_cpu_log(cpu_log)
+    print(f"CPU log: {len(utilization)} samples, {len(oversub)} oversubscription events")
+
+    fig.add_trace(
+        go.Scatter(
+            x=[t for t, _ in utilization],
+            y=[u for _, u in utilization],
+            mode="lines",
+            line=dict(color="gray", width=1),
+            name="Mean core utilization",
+            yaxis="y2",
+            hovertemplate="Time: %{x:.2f}<br>Utilization: %{y:.1f}%<extra></extra>",
+        )
+    )
+    if oversub:
+        fig.add_trace(
+            go.Scatter(
+                x=[e["timestamp"] for e in oversub],
+                y=[100 * e["runnable"] / e["allowed"] for e in oversub],
+                mode="markers",
+                marker=dict(color="red", symbol="x", size=9),
+                name="Oversubscribed cpuset",
+                yaxis="y2",
+                text=[f"{e['runnable']} runnable on {e['allowed']} CPUs [{e['cpuset']}]" for e in oversub],
+                hovertemplate="Time: %{x:.2f}<br>%{text}<extra></extra>",
+            )
+        )
+    fig.update_layout(
+        yaxis2=dict(title="CPU utilization (%)", overlaying="y", side="right", rangemode="tozero", showgrid=False)
+    )
+
+
+def create_timeline_plot(parser, output_file, cpu_log=None):
     """Create a timeline plot using Plotly."""
     print("Creating timeline plot...")
 
@@ -119,6 +180,7 @@ def create_timeline_plot(parser, output_file):
 
     # Colors for different event types
     colors = {"SIM": "black", "PDI": "black", "DOREISA": "black"}
+    # cycled past the 10th step
     iter_colors = {
         0: "#a6cee3",
         1: "#1f78b4",
@@ -146,7 +208,7 @@ def create_timeline_plot(parser, output_file):
             continue
         if event["iteration"] is not None:
             event_name += f" (Iter {event['iteration']})"
-            color = iter_colors[event["iteration"]]
+            color = iter_colors[event["iteration"] % len(iter_colors)]
             fig.add_vrect(
                 x0=event["start"],
                 x1=event["end"],
@@ -180,7 +242,7 @@ def create_timeline_plot(parser, output_file):
         event_name = f"PDI-{event['type']}"
         if event["iteration"] is not None:
             event_name += f" (Iter {event['iteration']})"
-            color = iter_colors[event["iteration"]]
+            color = iter_colors[event["iteration"] % len(iter_colors)]
         else:
             color = colors["PDI"]
 
@@ -207,7 +269,7 @@ def create_timeline_plot(parser, output_file):
     # Add DOREISA events
     for event in parser.doreisa_events:
         event_name = f"DOREISA (Iter {event['iteration']})"
-        color = iter_colors[event["iteration"]]
+        color = iter_colors[event["iteration"] % len(iter_colors)]
 
         fig.add_trace(
             go.Scatter(
@@ -246,6 +308,9 @@ def create_timeline_plot(parser, output_file):
     fig.update_xaxes(showgrid=True)
     fig.update_yaxes(showgrid=True)
 
+    if cpu_log is not None:
+        add_cpu_overlay(fig, cpu_log)
+
     # Save the plot
     fig.write_html(output_file)
     print(f"Timeline plot saved to: {output_file}")
@@ -289,6 +354,12 @@ def main():
         default=None,
         help="Output HTML file path (default: timeline_rank_<rank>.html)",
     )
+    parser.add_argument(
+        "--cpu-log",
+        type=str,
+        default=None,
+        help="cpulog_*.csv file from cpu-monitor.py to overlay (CPU utilization and oversubscription)",
+    )
 
     args = parser.parse_args()
 
@@ -314,7 +385,7 @@ def main():
     event_parser.parse_log_file(log_file)
 
     # Create visualization
-    create_timeline_plot(event_parser, args.output)
+    create_timeline_plot(event_parser, args.output, cpu_log=args.cpu_log)
 
     return 0
 